@@ -0,0 +1,320 @@
+#!usr/bin/env python3
+
+'''
+    File: acquisition_loop.py
+    Description: The single acquisition loop run by the RPi server. One thread owns
+        the power meters and the switches, takes each sample, writes it to the data
+        files while recording is on, and hands it to every connected client through
+        a bounded queue. Recording doesn't depend on any client being connected.
+    Author: Lucas McDonald
+    Date created: October 18, 2026
+    Date modified: October 18, 2026
+    Python version: 3.6.1
+'''
+
+import collections
+import pickle
+import threading
+import time
+import take_data
+import hf_protocol
+from sample_ring import SampleRing
+from scheduler import DeadlineScheduler
+from data_writer import DataWriter
+
+# number of samples held for a client that isn't keeping up
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# seconds to wait before restarting after an error while recording, doubled after each
+# error up to MAX_RETRY_SECONDS
+RETRY_SECONDS = 1.0
+MAX_RETRY_SECONDS = 60.0
+
+# recording settings, kept so recording resumes when the RPi boots
+SETTINGS_PATH = '/home/pi/hfmon/python/recorder_settings.pckl'
+
+class Subscriber():
+    '''
+    Samples waiting to be sent to one client. When the client falls more than
+    max_samples behind, the oldest samples are dropped so the loop never waits on it.
+    '''
+
+    def __init__(self, max_samples = SUBSCRIBER_QUEUE_SIZE):
+        self.samples = collections.deque(maxlen = max_samples)
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, output_array):
+        with self.condition:
+            if len(self.samples) == self.samples.maxlen:
+                self.dropped += 1
+            self.samples.append(output_array)
+            self.condition.notify()
+
+    def get(self, timeout = None):
+        '''
+        Returns the oldest waiting sample, or None if there was none within the timeout
+        or the subscriber has been closed.
+        '''
+
+        with self.condition:
+            if not self.samples and not self.closed:
+                self.condition.wait(timeout)
+            if self.samples:
+                return self.samples.popleft()
+            return None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+class AcquisitionLoop():
+    '''
+    Runs take_data on a background thread. The loop runs while any client is subscribed
+    or while recording is turned on, so recording carries on with no clients connected.
+    The recording settings are saved to settings_path and loaded again at boot.
+    If binary_log is set (or "binary_log" is set in the saved settings), a .hfsl sample
+    log is written next to each data file.
+    '''
+
+    def __init__(self, settings_path = SETTINGS_PATH, binary_log = False):
+        self.settings_path = settings_path
+        self.binary_log = binary_log
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.config = None
+        self.record = False
+        # incremented whenever the running loop should reopen the meters with a new config
+        self.config_version = 0
+        self.thread = None
+        # recent samples, replayed to clients when they subscribe
+        self.ring = SampleRing()
+
+    def load_settings(self):
+        '''
+        Loads the saved recording settings and starts recording if it was on.
+        '''
+
+        try:
+            with open(self.settings_path, "rb") as f:
+                # data is a dictionary containing settings
+                data = pickle.load(f)
+
+            config = [data["timeout"], data["sample"], data["pins"], data["trans_ip"], \
+                data["ref_ip"], data["trans_en"], data["ref_en"]]
+            record = data["record"]
+            binary_log = data.get("binary_log", self.binary_log)
+
+        except Exception as e:
+            print("No saved recording settings loaded: " + str(e))
+            return
+
+        with self.lock:
+            self.binary_log = binary_log
+
+        if record:
+            print("Resuming recording from saved settings")
+            self.start_recording(config)
+        else:
+            with self.lock:
+                self.config = config
+
+    def save_settings(self):
+        timeout_secs, sample_time, decoder_pins, transmitted_ip, reflected_ip, \
+            trans_enabled, reflect_enabled = self.config
+
+        data = {
+            "record": self.record,
+            "timeout": timeout_secs,
+            "sample": sample_time,
+            "pins": decoder_pins,
+            "trans_ip": transmitted_ip,
+            "ref_ip": reflected_ip,
+            "trans_en": trans_enabled,
+            "ref_en": reflect_enabled,
+            "binary_log": self.binary_log,
+        }
+
+        try:
+            with open(self.settings_path, "wb") as f:
+                pickle.dump(data, f)
+        except Exception as e:
+            print("Error saving recording settings: " + str(e))
+
+    def start_thread(self):
+        # must be called with the lock held
+        if self.thread is None:
+            self.thread = threading.Thread(target = self.run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def set_config(self, config):
+        # must be called with the lock held
+        if list(config) != self.config:
+            self.config = list(config)
+            self.config_version += 1
+
+    def start_recording(self, config):
+        '''
+        Turns recording on with the given settings (see subscribe()) and saves them, so
+        recording resumes after a reboot.
+        '''
+
+        with self.lock:
+            self.set_config(config)
+            self.record = True
+            self.save_settings()
+            self.start_thread()
+
+    def stop_recording(self):
+        with self.lock:
+            self.record = False
+            if self.config is not None:
+                self.save_settings()
+
+    def subscribe(self, config, backfill_secs = 0):
+        '''
+        Adds a client that wants to receive samples. config is [timeout, sample time,
+        decoder pins, transmitted ip, reflected ip, trans enabled, ref enabled], as sent
+        by the client. It is only used if nothing is running yet; otherwise the client
+        watches the loop that is already running.
+
+        Returns (subscriber, backfill), where backfill holds the samples from the last
+        backfill_secs seconds. The next sample the subscriber receives follows the last
+        sample in backfill.
+        '''
+
+        subscriber = Subscriber()
+
+        with self.lock:
+            if self.thread is None:
+                self.set_config(config)
+            elif list(config) != self.config:
+                print("Acquisition already running; ignoring the new client's meter settings")
+
+            backfill = self.recent_samples(backfill_secs)
+            self.subscribers.append(subscriber)
+            self.start_thread()
+
+        return subscriber, backfill
+
+    def recent_samples(self, seconds):
+        '''
+        Returns the samples taken in the last seconds seconds, oldest first, as numbers
+        from hf_protocol.sample_values().
+        '''
+
+        if seconds <= 0:
+            return []
+
+        return self.ring.since(time.monotonic() - seconds)
+
+    def backfill(self, seconds):
+        with self.lock:
+            return self.recent_samples(seconds)
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+        subscriber.close()
+
+        if subscriber.dropped:
+            print("Client was too slow; dropped " + str(subscriber.dropped) + " samples")
+
+    def run(self):
+        '''
+        Reopens the meters each time the config changes, until there is nothing left to do.
+        If the meters, switches or data files fail while recording, waits and tries again
+        (backing off up to MAX_RETRY_SECONDS), so recording doesn't stop until it's turned off.
+        '''
+
+        retry_secs = RETRY_SECONDS
+
+        while True:
+            with self.lock:
+                if not self.subscribers and not self.record:
+                    self.thread = None
+                    return
+                config = self.config
+                config_version = self.config_version
+
+            started = time.monotonic()
+            try:
+                self.run_config(config, config_version)
+                continue
+            except Exception as e:
+                print("Acquisition stopped: " + str(e))
+
+            with self.lock:
+                recording = self.record
+                if not recording:
+                    self.thread = None
+                    subscribers = list(self.subscribers)
+
+            if not recording:
+                for subscriber in subscribers:
+                    subscriber.close()
+                return
+
+            # start the backoff again if it had been running for a while
+            if time.monotonic() - started > MAX_RETRY_SECONDS:
+                retry_secs = RETRY_SECONDS
+            print("Recording is on; retrying in " + str(retry_secs) + " seconds")
+            time.sleep(retry_secs)
+            retry_secs = min(retry_secs * 2, MAX_RETRY_SECONDS)
+
+    def run_config(self, config, config_version):
+        timeout_secs, sample_time, decoder_pins, transmitted_ip, reflected_ip, \
+            trans_enabled, reflect_enabled = config
+
+        engine = take_data.AcquisitionEngine(timeout_secs, decoder_pins, transmitted_ip, \
+            reflected_ip, trans_enabled, reflect_enabled)
+        engine.open()
+
+        writer = None
+        scheduler = DeadlineScheduler(sample_time)
+        scheduler.start()
+
+        try:
+            while True:
+                with self.lock:
+                    # stop once the last client has left and nothing is being recorded
+                    if not self.subscribers and not self.record:
+                        return
+                    if self.config_version != config_version:
+                        return
+                    recording = self.record
+                    binary_log = self.binary_log
+
+                # open or close the data files as recording is turned on and off
+                if recording and writer is None:
+                    writer = DataWriter(binary_log = binary_log)
+                elif not recording and writer is not None:
+                    writer.close()
+                    writer = None
+
+                if writer is not None:
+                    output_array = take_data.record_power(engine, writer)
+                else:
+                    output_array = take_data.monitor_power(engine)
+
+                with self.lock:
+                    self.ring.append(time.monotonic(), hf_protocol.sample_values(output_array))
+                    subscribers = list(self.subscribers)
+
+                for subscriber in subscribers:
+                    subscriber.put(output_array)
+
+                # sleep until the next sample is due
+                missed = scheduler.wait()
+                if missed:
+                    print("Cycle overran the sample period; skipped " + str(missed) + " samples (" + \
+                        str(scheduler.missed) + " total)")
+
+        finally:
+            if writer is not None:
+                writer.close()
+            engine.close()
@@ -0,0 +1,330 @@
+#!usr/bin/env python3
+
+'''
+	File: data_index.py
+	Description: Sparse time index for the daily .data files, used to find the rows in a
+		time range without reading the whole day. The index stores the byte offset of
+		every INDEX_STRIDE-th row and of the first row after each gap in recording. It is
+		saved next to the data file as [todaysdate].idx and extended as the file grows.
+	Author: Lucas McDonald
+	Date created: October 18, 2026
+	Date modified: October 18, 2026
+	Python version: 3.6.1
+'''
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+import mmap
+import os
+import struct
+import threading
+import weakref
+from hf_loader import detect_layout
+from sample_log import seconds_from_str
+
+# number of rows between index entries
+INDEX_STRIDE = 256
+
+# a longer time between two rows than this is a gap in recording
+GAP_SECONDS = 10.0
+
+INDEX_EXTENSION = '.idx'
+
+'''
+Index file: a header (magic, version, stride, offset of the first data row, and the
+column of each channel in Tx1..Tx6, Rx1..Rx6 order) followed by one entry per indexed
+row (time in seconds since midnight, byte offset, row number, and the time of the row
+before it if it starts after a gap, otherwise -1). Entries are only ever appended.
+'''
+INDEX_HEADER_STRUCT = struct.Struct('<4sHHq12B')
+INDEX_ENTRY_STRUCT = struct.Struct('<dqqd')
+INDEX_MAGIC = b'HFIX'
+INDEX_VERSION = 1
+
+def row_seconds(line):
+	'''
+	Returns the time a data row was taken in seconds since midnight, or None if the
+	line isn't a data row.
+	'''
+
+	try:
+		return seconds_from_str(line[0:12].decode('ascii').rstrip(','))
+	except (ValueError, UnicodeDecodeError):
+		return None
+
+def index_path(path):
+	return os.path.splitext(path)[0] + INDEX_EXTENSION
+
+class DayIndex():
+	'''
+	Index of one day's .data file. times[i] is the time of the row that starts at
+	offsets[i]. Only complete lines are indexed, so update() can be called while the
+	file is being written to. If save is set, new entries are appended to the .idx file.
+	'''
+
+	def __init__(self, path, stride = INDEX_STRIDE, save = True):
+		self.path = path
+		self.stride = stride
+		self.save = save
+		# the recorder and the server can update the same index
+		self.lock = threading.Lock()
+		self.reset()
+
+	def reset(self):
+		self.times = array('d')
+		self.offsets = array('q')
+		self.row_numbers = array('q')
+		# (time of the last row before the gap, time of the first row after it)
+		self.gaps = []
+		# column of each channel, in Tx1..Tx6, Rx1..Rx6 order
+		self.columns = list(range(1, 13))
+		# offset of the first data row, and of the first byte not yet indexed
+		self.data_start = 0
+		self.end_offset = 0
+		self.rows = 0
+		self.last_seconds = None
+		self.header_saved = False
+
+	def load(self):
+		'''
+		Loads the saved index, if there is one that matches the data file. The rows after
+		the last saved entry are indexed by the next update().
+		'''
+
+		try:
+			with open(index_path(self.path), 'rb') as f:
+				header = f.read(INDEX_HEADER_STRUCT.size)
+				entries = f.read()
+		except OSError:
+			return
+
+		if len(header) != INDEX_HEADER_STRUCT.size:
+			return
+		fields = INDEX_HEADER_STRUCT.unpack(header)
+		if fields[0] != INDEX_MAGIC or fields[1] != INDEX_VERSION or fields[2] != self.stride:
+			return
+
+		self.reset()
+		self.data_start = fields[3]
+		self.columns = list(fields[4:16])
+		self.header_saved = True
+
+		# a partly written entry; build the index again
+		if len(entries) % INDEX_ENTRY_STRUCT.size:
+			self.reset()
+			return
+
+		for seconds, offset, row, gap_start in INDEX_ENTRY_STRUCT.iter_unpack(entries):
+			if gap_start >= 0:
+				self.gaps.append((gap_start, seconds))
+			self.times.append(seconds)
+			self.offsets.append(offset)
+			self.row_numbers.append(row)
+
+		if not self.times:
+			self.end_offset = self.data_start
+			return
+
+		# carry on from the end of the last saved row, if the file still has it
+		try:
+			with open(self.path, 'rb') as f:
+				f.seek(self.offsets[-1])
+				line = f.readline()
+		except OSError:
+			line = b''
+
+		if not line.endswith(b'\n') or row_seconds(line) != self.times[-1]:
+			self.reset()
+			return
+
+		self.end_offset = self.offsets[-1] + len(line)
+		self.rows = self.row_numbers[-1] + 1
+		self.last_seconds = self.times[-1]
+
+	def update(self):
+		'''
+		Indexes any rows added to the file since the last update.
+		'''
+
+		with self.lock:
+			self.update_locked()
+
+	def update_locked(self):
+		size = os.path.getsize(self.path)
+
+		# the file was replaced; start again
+		if size < self.end_offset:
+			self.reset()
+
+		if size == self.end_offset:
+			return
+
+		# skip the header
+		if self.end_offset == 0:
+			layout = detect_layout(self.path)
+			if layout is None:
+				return
+			self.columns = layout.columns
+			self.data_start = self.end_offset = layout.data_start
+
+		new_entries = []
+
+		with open(self.path, 'rb') as f:
+			f.seek(self.end_offset)
+			offset = self.end_offset
+
+			for line in f:
+				if not line.endswith(b'\n'):
+					break
+
+				seconds = row_seconds(line)
+				if seconds is not None:
+					gap_start = -1.0
+					if self.last_seconds is not None and seconds - self.last_seconds > GAP_SECONDS:
+						gap_start = self.last_seconds
+						self.gaps.append((gap_start, seconds))
+
+					if gap_start >= 0 or self.rows % self.stride == 0:
+						self.times.append(seconds)
+						self.offsets.append(offset)
+						self.row_numbers.append(self.rows)
+						new_entries.append(INDEX_ENTRY_STRUCT.pack(seconds, offset, self.rows, gap_start))
+
+					self.last_seconds = seconds
+					self.rows += 1
+
+				offset += len(line)
+
+			self.end_offset = offset
+
+		if self.save and new_entries:
+			self.save_entries(new_entries)
+
+	def save_entries(self, new_entries):
+		try:
+			with open(index_path(self.path), 'ab' if self.header_saved else 'wb') as f:
+				if not self.header_saved:
+					f.write(INDEX_HEADER_STRUCT.pack(INDEX_MAGIC, INDEX_VERSION, self.stride, \
+						self.data_start, *self.columns))
+					self.header_saved = True
+				f.write(b''.join(new_entries))
+		except OSError as e:
+			# the index still works from memory
+			print("Unable to save index " + index_path(self.path) + ": " + str(e))
+			self.save = False
+
+	def seek_offset(self, start_secs):
+		'''
+		Returns the offset of an indexed row at or before the first row taken at or after start_secs.
+		'''
+
+		i = bisect_right(self.times, start_secs) - 1
+		if i < 0:
+			return self.data_start
+		return self.offsets[i]
+
+	def end_offset_after(self, end_secs):
+		'''
+		Returns an offset at or after the end of the last row taken at or before end_secs.
+		'''
+
+		i = bisect_right(self.times, end_secs)
+		if i < len(self.offsets):
+			return self.offsets[i]
+		return None
+
+	def read_rows(self, start_secs, end_secs):
+		'''
+		Yields (time in seconds since midnight, line) for each row taken between
+		start_secs and end_secs, inclusive. Only the part of the file between the
+		surrounding index entries is mapped into memory.
+		'''
+
+		start = self.seek_offset(start_secs)
+		end = self.end_offset_after(end_secs)
+
+		with open(self.path, 'rb') as f:
+			size = os.fstat(f.fileno()).st_size
+			if end is None or end > size:
+				end = size
+			if start >= end:
+				return
+
+			# mmap offsets have to be a multiple of the allocation granularity
+			map_start = start - start % mmap.ALLOCATIONGRANULARITY
+			data = mmap.mmap(f.fileno(), end - map_start, access = mmap.ACCESS_READ, offset = map_start)
+
+			try:
+				pos = start - map_start
+				length = end - map_start
+				while pos < length:
+					line_end = data.find(b'\n', pos, length)
+					if line_end == -1:
+						line_end = length
+					line = data[pos:line_end + 1]
+					pos = line_end + 1
+
+					seconds = row_seconds(line)
+					if seconds is None or seconds < start_secs:
+						continue
+					if seconds > end_secs:
+						return
+					yield seconds, line
+			finally:
+				data.close()
+
+	def gaps_between(self, start_secs, end_secs):
+		'''
+		Returns the gaps in recording that overlap the given range.
+		'''
+
+		i = bisect_left([gap[1] for gap in self.gaps], start_secs)
+		return [gap for gap in self.gaps[i:] if gap[0] <= end_secs]
+
+def row_values(line, columns):
+	'''
+	Returns the powers in a data row in Tx1..Tx6, Rx1..Rx6 order, with NaN for timeouts.
+	'''
+
+	fields = line.split(b',')
+	values = []
+
+	for col in columns:
+		try:
+			values.append(float(fields[col]))
+		except (ValueError, IndexError):
+			values.append(float('nan'))
+
+	return values
+
+# number of indexes kept in memory after they were last used
+INDEX_CACHE_SIZE = 8
+
+# every index still in use (e.g. by the DataWriter), by path, so there is only ever one
+# per file writing to its .idx; and the ones used most recently, kept in memory
+day_indexes = weakref.WeakValueDictionary()
+recent_indexes = OrderedDict()
+day_indexes_lock = threading.Lock()
+
+def get_index(path, save = True):
+	'''
+	Returns the index for a .data file, loaded from its .idx file if there is one and
+	brought up to date with the file. Safe to call from several threads; they all get
+	the same DayIndex for a file.
+	'''
+
+	with day_indexes_lock:
+		index = day_indexes.get(path)
+		if index is None:
+			index = DayIndex(path, save = save)
+			index.load()
+			day_indexes[path] = index
+
+		recent_indexes[path] = index
+		recent_indexes.move_to_end(path)
+		while len(recent_indexes) > INDEX_CACHE_SIZE:
+			recent_indexes.popitem(last = False)
+
+	index.update()
+	return index
@@ -0,0 +1,141 @@
+#!usr/bin/env python3
+
+'''
+    File: data_sync.py
+    Description: Copies the data files from the Raspberry Pi to this computer. Only the
+        bytes added since the last sync are transferred, compressed, so a sync only costs
+        what was recorded since the previous one. An interrupted sync carries on from
+        where it stopped the next time.
+    Author: Lucas McDonald
+    Date created: October 18, 2026
+    Date modified: October 18, 2026
+    Python version: 3.6.1
+'''
+
+import os
+import pickle
+import socket
+import zlib
+import hf_protocol
+
+# only day files are copied; they are only ever appended to, so a copy can carry on
+# from its own size
+SYNC_SUFFIX = '.data'
+
+# remembers the size and modification time of each file at the last sync
+STATE_FILE = '.sync_state.pckl'
+
+def send_command(rpi_ip, args):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(10)
+    sock.connect((rpi_ip, 12345))
+    sock.sendall(hf_protocol.encode_command(args))
+    return sock
+
+def load_state(local_dir):
+    try:
+        with open(os.path.join(local_dir, STATE_FILE), "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        return {}
+
+def save_state(local_dir, state):
+    with open(os.path.join(local_dir, STATE_FILE), "wb") as f:
+        pickle.dump(state, f)
+
+def sync_data(rpi_ip, local_dir):
+    '''
+    Brings local_dir up to date with /home/pi/hfmon/data on the Raspberry Pi.
+    Returns (number of files updated, number of bytes received).
+    '''
+
+    if not os.path.isdir(local_dir):
+        os.makedirs(local_dir)
+
+    state = load_state(local_dir)
+
+    # get the list of files on the RPi
+    sock = send_command(rpi_ip, ['sync_list'])
+    frame = hf_protocol.recv_frame(sock, hf_protocol.FrameDecoder())
+    sock.close()
+    if frame is None or frame[0] != hf_protocol.FRAME_FILE_LIST:
+        raise ConnectionError("no file list received from the Raspberry Pi")
+
+    remote_files = {}
+    requests = []
+    for name, size, mtime in hf_protocol.decode_file_list(frame[1]):
+        # older servers list every file, including ones that can be rewritten
+        if not name.endswith(SYNC_SUFFIX):
+            continue
+        remote_files[name] = (size, mtime)
+
+        path = os.path.join(local_dir, name)
+        local_size = os.path.getsize(path) if os.path.isfile(path) else 0
+
+        if local_size == size and state.get(name, (None, None))[1] == mtime:
+            continue
+
+        # the file was replaced on the RPi; copy it again from the start
+        if local_size > size:
+            local_size = 0
+            open(path, 'wb').close()
+
+        if local_size < size:
+            requests.append([name, local_size])
+        else:
+            state[name] = (size, mtime)
+
+    files_updated = 0
+    bytes_received = 0
+
+    if requests:
+        sock = send_command(rpi_ip, ['sync_fetch', requests])
+        decoder = hf_protocol.FrameDecoder()
+
+        current_name = None
+        local_file = None
+
+        try:
+            while True:
+                frame = hf_protocol.recv_frame(sock, decoder)
+                if frame is None:
+                    raise ConnectionError("the Raspberry Pi closed the connection during the sync")
+                if frame[0] == hf_protocol.FRAME_STATUS:
+                    break
+                if frame[0] != hf_protocol.FRAME_FILE_CHUNK:
+                    continue
+
+                name, offset, compressed = hf_protocol.decode_file_chunk(frame[1])
+                if name not in remote_files or os.path.basename(name) != name:
+                    continue
+
+                if name != current_name:
+                    if local_file is not None:
+                        local_file.close()
+                        files_updated += 1
+                    current_name = name
+                    path = os.path.join(local_dir, name)
+                    local_file = open(path, 'r+b' if os.path.isfile(path) else 'wb')
+
+                data = zlib.decompress(compressed)
+                local_file.seek(offset)
+                local_file.write(data)
+                # flushed chunk by chunk so an interrupted sync can resume from the file size
+                local_file.flush()
+                bytes_received += len(data)
+
+            if local_file is not None:
+                local_file.close()
+                files_updated += 1
+
+        finally:
+            if local_file is not None and not local_file.closed:
+                local_file.close()
+            sock.close()
+
+        for name, offset in requests:
+            state[name] = remote_files[name]
+
+    save_state(local_dir, state)
+
+    return files_updated, bytes_received
@@ -0,0 +1,161 @@
+#!usr/bin/env python3
+
+'''
+	File: data_writer.py
+	Description: Writes recorded samples to the daily data files on the RPi.
+		Keeps one file open, batches rows in memory, and starts a new file at
+		midnight. Can also write a binary sample log next to each text file. The
+		time index of the current file is updated each time rows are written.
+	Author: Lucas McDonald
+	Date created: October 18, 2026
+	Date modified: October 18, 2026
+	Python version: 3.6.1
+'''
+
+import os
+import time
+import data_index
+from sample_log import SampleLogWriter, LOG_EXTENSION, TEXT_HEADER, TIMEOUT_STR, format_cycle_time
+
+DATA_DIR = '/home/pi/hfmon/data/'
+
+def format_row(output):
+	'''
+	Converts an output array from take_data into a line of the data file, with each
+	power in watts padded to six digits and '      ' for readings that errored. The
+	time to take the sample is always the same width, so the rows can be seeked by
+	offset.
+	'''
+
+	fields = [output[0]]
+
+	for element in output[1:13]:
+		try:
+			power_watts = int(pow(10, float(element) / 10) / 1000)
+			fields.append(str(power_watts).zfill(6))
+		except:
+			fields.append(TIMEOUT_STR)
+
+	fields.append(format_cycle_time(output[-1]))
+
+	return ','.join(fields) + '\n'
+
+class DataWriter():
+	'''
+	Appends rows to [data_dir]/[todaysdate].data. Rows are held in memory and written
+	every flush_interval seconds, and the file is synced to the SD card every
+	fsync_interval seconds. The header is only written when a file is created.
+	If binary_log is set, each sample is also written to [todaysdate].hfsl.
+	'''
+
+	def __init__(self, data_dir = DATA_DIR, flush_interval = 5.0, fsync_interval = 60.0, binary_log = False):
+		self.data_dir = data_dir
+		self.flush_interval = float(flush_interval)
+		self.fsync_interval = float(fsync_interval)
+		self.binary_log = binary_log
+
+		self.data_file = None
+		self.log_writer = None
+		self.index = None
+		self.todays_date = None
+		self.rows = []
+		self.last_flush = time.monotonic()
+		self.last_fsync = self.last_flush
+
+	def file_path(self, todays_date):
+		return os.path.join(self.data_dir, todays_date + '.data')
+
+	def open_file(self, cycle_start_time, cycle_start):
+		'''
+		Opens the data file for the date of cycle_start_time, creating it with a header
+		if it doesn't exist yet.
+		'''
+
+		# YMD format for dating
+		self.todays_date = str(cycle_start_time).split(' ')[0].replace('-', '')
+		path = self.file_path(self.todays_date)
+
+		self.data_file = open(path, 'a')
+
+		if self.data_file.tell() == 0:
+			# write some header info
+			self.data_file.write('#HF transmitted power data for ' + str(cycle_start_time).split(' ')[0] + '\n')
+			self.data_file.write(TEXT_HEADER)
+			self.data_file.write('\n')
+		else:
+			# files from older versions don't end with a newline
+			with open(path, 'rb') as f:
+				f.seek(-1, os.SEEK_END)
+				if f.read(1) != b'\n':
+					self.data_file.write('\n')
+
+		self.index = data_index.get_index(path)
+
+		if self.binary_log:
+			self.log_writer = SampleLogWriter(os.path.join(self.data_dir, self.todays_date + LOG_EXTENSION), \
+				self.todays_date, cycle_start_time, cycle_start)
+
+	def write_sample(self, cycle_start_time, cycle_start, output):
+		'''
+		Adds a sample to the current day's file, switching files if the date has changed.
+		cycle_start is the time.monotonic() value at the start of the cycle.
+		'''
+
+		todays_date = str(cycle_start_time).split(' ')[0].replace('-', '')
+		if todays_date != self.todays_date:
+			self.close()
+			self.open_file(cycle_start_time, cycle_start)
+
+		self.rows.append(format_row(output))
+		if self.log_writer is not None:
+			self.log_writer.add_sample(cycle_start, output)
+
+		if time.monotonic() - self.last_flush >= self.flush_interval:
+			self.flush()
+
+	def flush(self):
+		'''
+		Writes the pending rows to the file, and syncs the file if it is due.
+		'''
+
+		if self.data_file is None:
+			return
+
+		now = time.monotonic()
+
+		if self.rows:
+			self.data_file.write(''.join(self.rows))
+			self.rows = []
+		self.data_file.flush()
+		if self.log_writer is not None:
+			self.log_writer.flush()
+		self.index.update()
+		self.last_flush = now
+
+		if now - self.last_fsync >= self.fsync_interval:
+			self.sync()
+			self.last_fsync = now
+
+	def sync(self):
+		os.fsync(self.data_file.fileno())
+		if self.log_writer is not None:
+			os.fsync(self.log_writer.fileno())
+
+	def close(self):
+		'''
+		Writes anything pending, syncs and closes the current file.
+		'''
+
+		if self.data_file is None:
+			return
+
+		self.flush()
+		self.sync()
+		self.data_file.close()
+		self.data_file = None
+		self.index = None
+
+		if self.log_writer is not None:
+			self.log_writer.close()
+			self.log_writer = None
+		self.todays_date = None
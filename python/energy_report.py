@@ -0,0 +1,207 @@
+#!usr/bin/env python3
+
+'''
+	File: energy_report.py
+	Description: Reports the energy each transmitter delivered over a range of days,
+		along with how long it was on, its peak power, the reflected energy and its mean
+		VSWR. Power is integrated over the time between rows, holding each reading until
+		the next row, so rows that are further apart than data_index.GAP_SECONDS (the
+		recorder was stopped) don't count towards the energy. A timeout is filled with the
+		channel's previous reading, the way error_filter.py fills it, but never across a
+		gap; a timeout with no reading before it in the same run counts as 0 W. The days
+		are read in parallel, one per core.
+			python3 energy_report.py
+			python3 energy_report.py 20170701 20170731 --csv july.csv
+	Author: Lucas McDonald
+	Date created: October 18, 2026
+	Date modified: October 18, 2026
+	Python version: 3.6.1
+'''
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import glob
+import os
+import numpy
+import error_filter
+from data_index import GAP_SECONDS
+from hf_loader import load_channels
+
+# a transmitter is counted as on when its forward power is above this many watts
+ON_THRESHOLD = 1.0
+
+NUM_TRANSMITTERS = 6
+
+class EnergyTotals():
+	'''
+	Totals for one day or a range of days, one entry per transmitter.
+		energy_kwh: forward energy
+		reflected_kwh: reflected energy
+		on_secs: time the forward power was above the threshold
+		peak_watts: highest forward power
+		vswr_sum, vswr_count: sum and number of VSWR readings taken while on
+		recorded_secs: time covered by the rows, not counting gaps
+	'''
+
+	def __init__(self):
+		self.energy_kwh = numpy.zeros(NUM_TRANSMITTERS)
+		self.reflected_kwh = numpy.zeros(NUM_TRANSMITTERS)
+		self.on_secs = numpy.zeros(NUM_TRANSMITTERS)
+		self.peak_watts = numpy.zeros(NUM_TRANSMITTERS)
+		self.vswr_sum = numpy.zeros(NUM_TRANSMITTERS)
+		self.vswr_count = numpy.zeros(NUM_TRANSMITTERS, dtype = numpy.int64)
+		self.recorded_secs = 0.0
+
+	def add(self, other):
+		self.energy_kwh += other.energy_kwh
+		self.reflected_kwh += other.reflected_kwh
+		self.on_secs += other.on_secs
+		self.peak_watts = numpy.maximum(self.peak_watts, other.peak_watts)
+		self.vswr_sum += other.vswr_sum
+		self.vswr_count += other.vswr_count
+		self.recorded_secs += other.recorded_secs
+
+	def mean_vswr(self):
+		with numpy.errstate(invalid = 'ignore', divide = 'ignore'):
+			return self.vswr_sum / self.vswr_count
+
+def vswr(forward, reflected):
+	'''
+	Returns the VSWR for each pair of forward and reflected powers in watts, NaN where
+	it isn't defined (no forward power, or as much reflected as forward power).
+	'''
+
+	with numpy.errstate(invalid = 'ignore', divide = 'ignore'):
+		gamma = numpy.sqrt(reflected / forward)
+		result = (1 + gamma) / (1 - gamma)
+	result[~(gamma < 1)] = numpy.nan
+	return result
+
+def fill_timeouts(values, run_starts):
+	'''
+	Returns values (rows x channels) with each timeout (NaN) replaced by the last reading
+	before it in the same channel, without looking back past a row where run_starts is
+	True (the first row, and each row after a gap). Timeouts with no reading before them
+	in their run are left as NaN.
+	'''
+
+	rows = numpy.arange(len(values)).reshape(-1, 1)
+	keep = ~numpy.isnan(values) | run_starts.reshape(-1, 1)
+	previous = numpy.maximum.accumulate(numpy.where(keep, rows, 0), axis = 0)
+	return values[previous, numpy.arange(values.shape[1])]
+
+def day_totals(data_path, threshold = ON_THRESHOLD):
+	'''
+	Returns the EnergyTotals of one .data file, or None if it can't be read.
+	'''
+
+	loaded = load_channels(data_path)
+	if loaded is None:
+		return None
+	times, values = loaded
+
+	# each reading holds until the next row, unless the next row is after a gap
+	held = numpy.diff(times)
+	gaps = (held < 0) | (held > GAP_SECONDS)
+	held[gaps] = 0
+	held = numpy.r_[held, 0].reshape(-1, 1)
+
+	values = fill_timeouts(values, numpy.r_[True, gaps][:len(times)])
+	forward = values[:, :NUM_TRANSMITTERS]
+	reflected = values[:, NUM_TRANSMITTERS:]
+
+	totals = EnergyTotals()
+	totals.recorded_secs = float(held.sum())
+	totals.energy_kwh = numpy.nansum(forward * held, axis = 0) / 3.6e6
+	totals.reflected_kwh = numpy.nansum(reflected * held, axis = 0) / 3.6e6
+
+	with numpy.errstate(invalid = 'ignore'):
+		on = forward > threshold
+	totals.on_secs = (on * held).sum(axis = 0)
+	if len(forward):
+		totals.peak_watts = numpy.where(numpy.isnan(forward), 0, forward).max(axis = 0)
+
+	ratios = vswr(forward, reflected)
+	counted = on & ~numpy.isnan(ratios)
+	totals.vswr_sum = numpy.where(counted, ratios, 0).sum(axis = 0)
+	totals.vswr_count = counted.sum(axis = 0)
+
+	return totals
+
+def report(file_list, threshold = ON_THRESHOLD, jobs = None):
+	'''
+	Returns a list of (date, EnergyTotals) for each file that could be read, in the
+	order given, and the EnergyTotals of all of them.
+	'''
+
+	with ProcessPoolExecutor(max_workers = jobs) as executor:
+		results = list(executor.map(day_totals, file_list, [threshold] * len(file_list)))
+
+	days = []
+	overall = EnergyTotals()
+	for file_path, totals in zip(file_list, results):
+		if totals is None:
+			print("Unable to read " + error_filter.file_name(file_path))
+			continue
+		days.append((error_filter.file_name(file_path), totals))
+		overall.add(totals)
+
+	return days, overall
+
+def report_rows(label, totals):
+	'''
+	Returns a row for each transmitter: label, transmitter, forward kWh, hours on,
+	peak watts, reflected kWh and mean VSWR.
+	'''
+
+	mean_vswr = totals.mean_vswr()
+	return [[label, "Tx" + str(num + 1), "%.3f" % totals.energy_kwh[num], "%.2f" % (totals.on_secs[num] / 3600), \
+		"%.0f" % totals.peak_watts[num], "%.3f" % totals.reflected_kwh[num], \
+		"%.3f" % mean_vswr[num] if totals.vswr_count[num] else "-"] for num in range(NUM_TRANSMITTERS)]
+
+def select_files(data_dir, start_date = None, end_date = None):
+	file_list = sorted(glob.glob(os.path.join(data_dir, '*.data')))
+	return [file_path for file_path in file_list \
+		if (start_date is None or error_filter.file_name(file_path) >= start_date) and \
+			(end_date is None or error_filter.file_name(file_path) <= end_date)]
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Reports the energy delivered by each transmitter per day " + \
+		"and over the whole range.")
+	parser.add_argument("start", nargs = "?", help = "first day, e.g. 20170701 (default: the first file)")
+	parser.add_argument("end", nargs = "?", help = "last day, e.g. 20170731 (default: the same as start, or the last file if no start is given)")
+	parser.add_argument("--data-dir", default = error_filter.DATA_DIR, help = "folder of .data files")
+	parser.add_argument("--threshold", type = float, default = ON_THRESHOLD, \
+		help = "forward power in watts above which a transmitter is on (default: %(default)s)")
+	parser.add_argument("-j", "--jobs", type = int, default = None, help = "number of days to read at once (default: one per core)")
+	parser.add_argument("--csv", help = "also write the report to this CSV file")
+	args = parser.parse_args()
+
+	if args.jobs is not None and args.jobs < 1:
+		parser.error("--jobs must be at least 1")
+
+	file_list = select_files(args.data_dir, args.start, args.end if args.end is not None else args.start)
+	if not file_list:
+		print("No data files found")
+		raise SystemExit(1)
+
+	days, overall = report(file_list, args.threshold, args.jobs)
+
+	header = ["date", "tx", "energy (kWh)", "on (h)", "peak (W)", "reflected (kWh)", "mean VSWR"]
+	rows = []
+	for date, totals in days:
+		rows += report_rows(date, totals)
+	if len(days) > 1:
+		rows += report_rows(days[0][0] + "-" + days[-1][0], overall)
+
+	widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+	for row in [header] + rows:
+		print("  ".join(field.rjust(width) for field, width in zip(row, widths)))
+	print("recorded %.2f h over %d days" % (overall.recorded_secs / 3600, len(days)))
+
+	if args.csv is not None:
+		with open(args.csv, 'w', newline = '') as csv_file:
+			writer = csv.writer(csv_file)
+			writer.writerow(header)
+			writer.writerows(rows)
@@ -1,111 +1,388 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import csv
-import sys
 import glob
+import os
+import pickle
+import sys
+import tempfile
+import time
+from hf_loader import TIMEOUT_STR, detect_layout
 
-def filter_file(input_file):
-	# import data into array
-	data = csv.reader(input_file, delimiter=',')
-	table = [row for row in data]
+DATA_DIR = "../data/"
+FILTERED_DIR = "../data/filtered/"
 
-	spike_ct = 0
-	timeout_ct = 0
+# number of lines take_data writes before the first data row, for files without any data rows yet
+HEADER_ROWS = 3
 
-	print("filtering " + str(str(input_file).split("/")[2].split('\'')[0].split('.')[0]) + "... ")
+# size of the output file's write buffer
+WRITE_BUFFER_SIZE = 1 << 20
 
-	# open output file
-	output_file = open("../data/filtered/" + str(str(input_file).split("/")[2].split('\'')[0].split('.')[0]) + "_filtered.data", 'w')
+# extension of the file next to each filtered file that records how far it was filtered
+CHECKPOINT_EXTENSION = ".ckpt"
 
-	# write the header rows
-	line1_str = str(table[0]).replace("[", "").replace("\'", "").replace("]","").replace(", ", ",")
-	line2_str = str(table[1]).replace("[", "").replace("\'", "").replace("]","").replace(", ", ",")
-	line3_str = str(table[2]).replace("[", "").replace("\'", "").replace("]","").replace(", ", ",")
+def file_name(input_path):
+	'''
+	Returns the name of a data file without its directory or extension, e.g. 20170715.
+	'''
 
-	output_file.write(line1_str + "\n")
-	output_file.write(line2_str + "\n")
-	output_file.write(line3_str + "\n")
+	return os.path.splitext(os.path.basename(input_path))[0]
 
-	# write the first data row
-	try:
-		prev_row = table[3]
-		cur_row = table[4]
-		next_row = table[5]
+def filtered_path(input_path):
+	return os.path.join(FILTERED_DIR, file_name(input_path) + "_filtered.data")
 
-		out_str = "%s\n" % prev_row
-		out_str = out_str.replace("[", "").replace("\'", "").replace("]","").replace(", ", ",")
+def checkpoint_path(input_path):
+	return os.path.join(FILTERED_DIR, "." + file_name(input_path) + "_filtered" + CHECKPOINT_EXTENSION)
 
-		output_file.write(out_str)
-	except:
-		print(str(str(input_file).split("/")[2].split('\'')[0].split('.')[0]) + " needs more data points")
-		quit()
+def header_rows(input_path):
+	'''
+	Returns the number of header lines at the top of a data file.
+	'''
 
-	# write the middle rows
-	for row in range (5, len(table) - 1):
+	layout = detect_layout(input_path)
+	return layout.header_rows if layout is not None else HEADER_ROWS
 
-		try:
+def sliding_window(rows, prev_row = None):
+	'''
+	Yields (prev_row, cur_row, next_row) for each row, with None past either end, or
+	prev_row for the first row if given. Only three rows are held at a time.
+	'''
+
+	cur_row = next(rows, None)
+
+	while cur_row is not None:
+		next_row = next(rows, None)
+		yield prev_row, cur_row, next_row
+		prev_row = cur_row
+		cur_row = next_row
+
+class FilterCounts():
+	'''
+	Number of power spikes and timeouts removed from a file.
+	'''
+
+	def __init__(self):
+		self.spike_ct = 0
+		self.timeout_ct = 0
+
+def filter_rows(rows, counts, verbose = True, prev_row = None, first_row_num = 0, header_row_ct = HEADER_ROWS):
+	'''
+	Yields the filtered version of each row of a data file as a line of text. The
+	header rows and the first data row are passed through, and after that each
+	timed out reading is replaced by the previous row's reading. header_row_ct is the
+	number of header lines. To carry on from part way through a file, pass the last
+	filtered row and the number of rows before the first one in rows.
+	'''
+
+	for row_num, (prev_row, cur_row, next_row) in enumerate(sliding_window(rows, prev_row), first_row_num):
+
+		if row_num > header_row_ct:
 			for col in range (1, 13):
+				if col >= len(cur_row) or col >= len(prev_row):
+					if verbose:
+						print("not enough data in row at time " + (cur_row[0] if cur_row else "") + \
+							" to filter. skipping this row")
+					break
+
 				# check for random power spikes -- commented out as a change in software fixed most of these.
 				# uncomment if you wish to check for power spikes again
 				'''
-				if prev_row[col] == "000000" and next_row[col] == "000000" and cur_row[col] != "000000":
+				if next_row is not None and prev_row[col] == "000000" and next_row[col] == "000000" and \
+					cur_row[col] != "000000":
 					try:
 						# vast majority of observed error values were in this range
-						if float(cur_row[col]) >= 1270 and float(cur_row[col <= 1320]):
-							spike_ct += 1
-							print("power spike removed at " + cur_row[0])
+						if float(cur_row[col]) >= 1270 and float(cur_row[col]) <= 1320:
+							counts.spike_ct += 1
+							if verbose:
+								print("power spike removed at " + cur_row[0])
 							cur_row[col] = "000000"
 					except:
 						pass
 				'''
 				# check for power meter timeouts
-				if cur_row[col] == "      ":
-					print("timeout removed at " + cur_row[0])
-					timeout_ct += 1
+				if cur_row[col] == TIMEOUT_STR:
+					if verbose:
+						print("timeout removed at " + cur_row[0])
+					counts.timeout_ct += 1
 					cur_row[col] = prev_row[col]
-		except:
-			print("not enough data in row at time " + cur_row[0] + " to filter. skipping this row")
 
-		# write the modified string
-		out_str = "%s\n" % cur_row
-		out_str = out_str.replace("[", "").replace("\'", "").replace("]","").replace(", ", ",")
+		yield ",".join(cur_row) + "\n"
 
-		output_file.write(out_str)
+def filter_file(input_path, output_path = None, verbose = True):
+	'''
+	Filters a data file into [name]_filtered.data in FILTERED_DIR, or output_path if
+	given. The file is read and written a row at a time, so any size of file can be
+	filtered in constant memory. Returns (spike_ct, timeout_ct).
+	'''
 
-		# increment rows
-		prev_row = cur_row
-		cur_row = next_row
-		next_row = table[row]
+	name = file_name(input_path)
+	if output_path is None:
+		output_path = filtered_path(input_path)
+
+	if verbose:
+		print("filtering " + name + "... ")
+
+	counts = FilterCounts()
+	rows_written = 0
+
+	os.makedirs(os.path.dirname(output_path) or ".", exist_ok = True)
+
+	with open(input_path, 'r', newline = '') as input_file, \
+		open(output_path, 'w', buffering = WRITE_BUFFER_SIZE) as output_file:
+
+		header_row_ct = header_rows(input_path)
+		for line in filter_rows(csv.reader(input_file, delimiter=','), counts, verbose, header_row_ct = header_row_ct):
+			output_file.write(line)
+			rows_written += 1
+
+	if rows_written <= header_row_ct:
+		print(name + " needs more data points")
+
+	if verbose:
+		print("filtered. number of power spikes removed: " + str(counts.spike_ct) + ", number of timeouts removed: " + \
+			str(counts.timeout_ct) + "\n")
+
+	return counts.spike_ct, counts.timeout_ct
+
+def load_checkpoint(input_path, output_path):
+	'''
+	Returns the checkpoint saved the last time the file was filtered, or None if
+	there isn't one or either file has been replaced since.
+	'''
+
+	try:
+		with open(checkpoint_path(input_path), "rb") as f:
+			checkpoint = pickle.load(f)
+
+		if checkpoint["output_path"] != os.path.abspath(output_path) or \
+			os.path.getsize(output_path) != checkpoint["output_size"] or \
+			os.path.getsize(input_path) < checkpoint["offset"]:
+			return None
+
+		# the file must still start with the same header
+		with open(input_path, "rb") as f:
+			if f.read(len(checkpoint["first_line"])) != checkpoint["first_line"]:
+				return None
+
+		return checkpoint
+	except Exception:
+		return None
+
+def save_checkpoint(input_path, checkpoint):
+	path = checkpoint_path(input_path)
+	with open(path + ".tmp", "wb") as f:
+		pickle.dump(checkpoint, f)
+	os.replace(path + ".tmp", path)
+
+def filter_file_incremental(input_path, output_path = None, verbose = True):
+	'''
+	Filters the rows added to a data file since the last time it was filtered this
+	way, and appends them to the filtered file. The first time, or if either file has
+	been replaced, the whole file is filtered. The offset of the last complete row and
+	that row after filtering are saved in a checkpoint file next to the filtered file.
+	A row still being written is filtered too, but is filtered again on the next run.
+	Returns (spike_ct, timeout_ct) for the rows filtered.
+	'''
+
+	name = file_name(input_path)
+	if output_path is None:
+		output_path = filtered_path(input_path)
+
+	os.makedirs(os.path.dirname(output_path) or ".", exist_ok = True)
+
+	checkpoint = load_checkpoint(input_path, output_path)
+	if checkpoint is None:
+		with open(input_path, "rb") as f:
+			first_line = f.readline()
+		checkpoint = {"output_path": os.path.abspath(output_path), "first_line": first_line, \
+			"offset": 0, "output_offset": 0, "row_num": 0, "prev_row": None}
+	elif os.path.getsize(input_path) == checkpoint["offset"]:
+		if verbose:
+			print(name + " has no new rows")
+		return 0, 0
+
+	if verbose:
+		print("filtering " + name + " from row " + str(checkpoint["row_num"]) + "... ")
+
+	counts = FilterCounts()
+	# how far the input has been read, and whether the last row read was incomplete
+	position = {"offset": checkpoint["offset"], "partial": False}
+
+	def input_lines(input_file):
+		for line in input_file:
+			if line.endswith(b"\n"):
+				position["offset"] += len(line)
+			else:
+				position["partial"] = True
+			yield line.decode("ascii", "replace")
+
+	with open(input_path, "rb") as input_file, \
+		open(output_path, "r+b" if checkpoint["output_offset"] else "wb", buffering = WRITE_BUFFER_SIZE) as output_file:
+
+		# drop the row that was still being written last time
+		output_file.seek(checkpoint["output_offset"])
+		output_file.truncate()
+
+		input_file.seek(checkpoint["offset"])
+		output_offset = checkpoint["output_offset"]
+		row_num = checkpoint["row_num"]
+		last_line = None
+		before_last = (output_offset, row_num, last_line)
+
+		for line in filter_rows(csv.reader(input_lines(input_file), delimiter=','), counts, verbose, \
+			checkpoint["prev_row"], checkpoint["row_num"], header_rows(input_path)):
+
+			before_last = (output_offset, row_num, last_line)
+			output_file.write(line.encode("ascii", "replace"))
+			output_offset += len(line)
+			row_num += 1
+			last_line = line
+
+		output_size = output_offset
+
+	# stop the checkpoint before a row that is still being written
+	if position["partial"]:
+		output_offset, row_num, last_line = before_last
+
+	checkpoint["offset"] = position["offset"]
+	checkpoint["output_offset"] = output_offset
+	checkpoint["output_size"] = output_size
+	checkpoint["row_num"] = row_num
+	if last_line is not None:
+		checkpoint["prev_row"] = next(csv.reader([last_line], delimiter=','), [])
+	save_checkpoint(input_path, checkpoint)
+
+	if verbose:
+		print("filtered. number of power spikes removed: " + str(counts.spike_ct) + ", number of timeouts removed: " + \
+			str(counts.timeout_ct) + "\n")
+
+	return counts.spike_ct, counts.timeout_ct
+
+def input_path(name):
+	'''
+	Returns the path of a data file in DATA_DIR given its name, with or without .data.
+	'''
+
+	if ".data" not in name:
+		name = name + ".data"
+	return os.path.join(DATA_DIR, name)
+
+def needs_filtering(input_path):
+	'''
+	Returns whether a data file has changed since it was last filtered.
+	'''
+
+	try:
+		return os.path.getmtime(filtered_path(input_path)) < os.path.getmtime(input_path)
+	except OSError:
+		return True
+
+def filter_files(file_list, jobs = None, force = False, incremental = False):
+	'''
+	Filters each file in file_list with a pool of jobs worker processes (one per core
+	by default), skipping files whose filtered output is newer than the file unless
+	force is set. If incremental is set, only the rows added since the last
+	incremental run are filtered. Returns (files_filtered, failed, spike_ct, timeout_ct),
+	where files_filtered counts only the files filtered without an error and failed is
+	the list of files that couldn't be filtered.
+	'''
+
+	if not force:
+		skipped = [file_path for file_path in file_list if not needs_filtering(file_path)]
+		for file_path in skipped:
+			print(file_name(file_path) + " is already filtered")
+		file_list = [file_path for file_path in file_list if file_path not in skipped]
+
+	files_filtered = 0
+	failed = []
+	spike_ct = 0
+	timeout_ct = 0
+
+	with ProcessPoolExecutor(max_workers = jobs) as executor:
+		futures = {executor.submit(filter_file_incremental if incremental else filter_file, file_path, None, False): \
+			file_path for file_path in file_list}
+
+		for future in as_completed(futures):
+			name = file_name(futures[future])
+			try:
+				file_spikes, file_timeouts = future.result()
+			except Exception as e:
+				print("Unable to filter " + name + ": " + str(e))
+				failed.append(futures[future])
+				continue
+
+			files_filtered += 1
+			spike_ct += file_spikes
+			timeout_ct += file_timeouts
+			print("filtered " + name + ". power spikes removed: " + str(file_spikes) + ", timeouts removed: " + \
+				str(file_timeouts))
+
+	return files_filtered, sorted(failed), spike_ct, timeout_ct
+
+def benchmark(file_list):
+	'''
+	Filters each file into a temporary directory and prints the throughput.
+	'''
+
+	total_bytes = 0
+	total_rows = 0
+	total_secs = 0.0
+
+	with tempfile.TemporaryDirectory() as output_dir:
+		for file_path in file_list:
+			output_path = os.path.join(output_dir, file_name(file_path) + "_filtered.data")
 
-	# write the last few rows
-	out_str = "%s\n" % cur_row
-	out_str = out_str.replace("[", "").replace("\'", "").replace("]","").replace(", ", ",")
+			start = time.perf_counter()
+			filter_file(file_path, output_path, verbose = False)
+			secs = time.perf_counter() - start
 
-	output_file.write(out_str)
+			size = os.path.getsize(file_path)
+			with open(file_path, 'rb') as f:
+				rows = sum(1 for line in f)
 
-	out_str = "%s\n" % next_row
-	out_str = out_str.replace("[", "").replace("\'", "").replace("]","").replace(", ", ",")
+			total_bytes += size
+			total_rows += rows
+			total_secs += secs
 
-	output_file.write(out_str)
+			print("%s: %d rows, %.1f MB/s, %.0f rows/s" % (file_name(file_path), rows, \
+				size / secs / 1e6, rows / secs))
 
-	out_str = "%s\n" % table[row + 1]
-	out_str = out_str.replace("[", "").replace("\'", "").replace("]","").replace(", ", ",")
+	if total_secs > 0:
+		print("total: %d rows in %.3f s, %.1f MB/s, %.0f rows/s" % (total_rows, total_secs, \
+			total_bytes / total_secs / 1e6, total_rows / total_secs))
 
-	output_file.write(out_str)
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Removes power meter timeouts from HF power data files. " + \
+		"Filters every file in " + DATA_DIR + " that has changed since it was last filtered if no file is given.")
+	parser.add_argument("file", nargs = "?", help = "data file to filter, e.g. 20170715 or 20170715.data")
+	parser.add_argument("-q", "--quiet", action = "store_true", help = "don't print each timeout removed when filtering one file")
+	parser.add_argument("-j", "--jobs", type = int, default = None, \
+		help = "number of files to filter at once when filtering every file (default: one per core)")
+	parser.add_argument("-f", "--force", action = "store_true", help = "filter files even if they are already filtered")
+	parser.add_argument("-c", "--checkpoint", action = "store_true", \
+		help = "only filter the rows added since the last run with -c, and append them to the filtered file")
+	parser.add_argument("--benchmark", action = "store_true", \
+		help = "measure filtering throughput on the files in " + DATA_DIR + " without writing output")
+	args = parser.parse_args()
 
-	print("filtered. number of power spikes removed: " + str(spike_ct) + ", number of timeouts removed: " + \
-		str(timeout_ct) + "\n")
+	if args.jobs is not None and args.jobs < 1:
+		parser.error("--jobs must be at least 1")
 
-# open input file
-try:
-	if ".data" not in sys.argv[1]:
-		try:
-			input_file = open("../data/" + sys.argv[1] + ".data", 'r')
-		except:
+	if args.benchmark:
+		benchmark(sorted(glob.glob(os.path.join(DATA_DIR, '*.data'))))
+	elif args.file is not None:
+		if not os.path.isfile(input_path(args.file)):
 			print("Could not locate file")
+			sys.exit(1)
+		if args.checkpoint:
+			filter_file_incremental(input_path(args.file), verbose = not args.quiet)
+		else:
+			filter_file(input_path(args.file), verbose = not args.quiet)
 	else:
-		input_file = open("../data/" + sys.argv[1], 'r')
-	filter_file(input_file)
-except:
-	file_list = glob.glob('../data/*.data')
-	for file_name in file_list:
-		input_file = open(file_name)
-		filter_file(input_file)
+		files_filtered, failed, spike_ct, timeout_ct = filter_files(sorted(glob.glob(os.path.join(DATA_DIR, '*.data'))), \
+			args.jobs, args.force, args.checkpoint)
+		print("filtered " + str(files_filtered) + " files. number of power spikes removed: " + str(spike_ct) + \
+			", number of timeouts removed: " + str(timeout_ct))
+		if failed:
+			print("unable to filter " + str(len(failed)) + " files: " + ", ".join(file_name(file_path) for file_path in failed))
+			sys.exit(1)
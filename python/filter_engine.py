@@ -0,0 +1,208 @@
+#!usr/bin/env python3
+
+'''
+	File: filter_engine.py
+	Description: NumPy version of error_filter.py. Loads a whole day into an array and
+		applies the filter rules to every row at once. The rules can be set per channel:
+		timeouts are filled with the previous reading, isolated spikes between zero
+		readings are zeroed, and readings outside a valid range are treated as timeouts.
+		In compatibility mode the output is byte-identical to error_filter.py.
+			python3 filter_engine.py 20170715 --compat
+			python3 filter_engine.py 20170715 --spike-band 1270 1320 --channels Tx1,Tx2
+	Author: Lucas McDonald
+	Date created: October 18, 2026
+	Date modified: October 18, 2026
+	Python version: 3.6.1
+'''
+
+import argparse
+import glob
+import os
+import sys
+import numpy
+import error_filter
+from hf_loader import CHANNEL_NAMES, load_day
+
+class ChannelRules():
+	'''
+	Filter rules for one channel.
+		fill_timeouts: replace timeouts with the previous reading
+		spike_band: (low, high) watts; a reading in this band with a zero reading on
+			both sides of it is set to zero. None to leave spikes alone.
+		valid_range: (low, high) watts; readings outside it are treated as timeouts.
+			None to accept any reading.
+	'''
+
+	def __init__(self, fill_timeouts = True, spike_band = None, valid_range = None):
+		self.fill_timeouts = fill_timeouts
+		self.spike_band = spike_band
+		self.valid_range = valid_range
+
+def default_rules():
+	'''
+	Returns the rules error_filter.py applies, by channel name.
+	'''
+
+	return {name: ChannelRules() for name in CHANNEL_NAMES}
+
+def write_day(day, output_path):
+	'''
+	Writes a DayData to output_path, with the header lines as they were.
+	'''
+
+	os.makedirs(os.path.dirname(output_path) or ".", exist_ok = True)
+	with open(output_path, 'wb', buffering = error_filter.WRITE_BUFFER_SIZE) as output_file:
+		for row in day.header:
+			output_file.write((",".join(row) + "\n").encode('ascii', 'replace'))
+		if day.block is not None:
+			output_file.write(day.block.tobytes())
+		else:
+			output_file.write("".join(",".join(row) + "\n" for row in day.fields.tolist()).encode('ascii', 'replace'))
+
+def previous_index(missing):
+	'''
+	For each cell, returns the row of the last cell at or above it in the same column
+	that isn't missing, or 0 if there isn't one. This is a forward fill done with
+	numpy.maximum.accumulate instead of a loop.
+	'''
+
+	rows = numpy.arange(len(missing))
+	return numpy.maximum.accumulate(numpy.where(missing, 0, rows))
+
+def filter_compat(day):
+	'''
+	Filters the rows exactly the way error_filter.py does: timeouts after the first
+	data row are replaced with the last reading before them. Returns the number of
+	timeouts replaced.
+	'''
+
+	timeout_ct = 0
+
+	for col in range(1, 13):
+		missing = day.timeouts[:, col - 1].copy()
+		missing[0] = False
+		if missing.any():
+			cells = day.cells(col)
+			cells[:] = cells[previous_index(missing)]
+			timeout_ct += int(missing.sum())
+
+	return timeout_ct
+
+def filter_values(day, rules):
+	'''
+	Applies the rules for each channel to the powers. Returns the filtered values (NaN
+	where a timeout couldn't be filled), the number of spikes removed and the number of
+	timeouts filled.
+	'''
+
+	values = day.load_values().copy()
+	spike_ct = 0
+	timeout_ct = 0
+
+	for channel, col in zip(CHANNEL_NAMES, day.columns):
+		channel_rules = rules.get(channel)
+		if channel_rules is None:
+			continue
+		column = values[:, col - 1]
+
+		if channel_rules.valid_range is not None:
+			low, high = channel_rules.valid_range
+			with numpy.errstate(invalid = 'ignore'):
+				column[(column < low) | (column > high)] = numpy.nan
+
+		if channel_rules.fill_timeouts:
+			missing = numpy.isnan(column)
+			missing[0] = False
+			timeout_ct += int(missing.sum())
+			column[:] = column[previous_index(missing)]
+
+		if channel_rules.spike_band is not None and len(column) > 2:
+			low, high = channel_rules.spike_band
+			cur = column[1:-1]
+			with numpy.errstate(invalid = 'ignore'):
+				spikes = (column[:-2] == 0) & (column[2:] == 0) & (cur >= low) & (cur <= high)
+			spike_ct += int(spikes.sum())
+			cur[spikes] = 0
+
+	return values, spike_ct, timeout_ct
+
+def filter_file(input_path, output_path = None, rules = None, compat = False):
+	'''
+	Filters a data file into [name]_filtered.data in error_filter.FILTERED_DIR, or
+	output_path if given. If compat is set, the output is what error_filter.py would
+	write; otherwise rules (by channel name, default_rules() if not given) are applied.
+	If the rows are uneven (e.g. a row cut short by a power failure), compat mode passes
+	the file to error_filter.py; otherwise the short rows are left out and the rules are
+	applied to the rest. Returns (spike_ct, timeout_ct).
+	'''
+
+	if output_path is None:
+		output_path = error_filter.filtered_path(input_path)
+
+	day = load_day(input_path)
+	if day is None and compat:
+		return error_filter.filter_file(input_path, output_path, verbose = False)
+
+	if day is None:
+		day = load_day(input_path, drop_short_rows = True)
+		if day is None:
+			raise ValueError(error_filter.file_name(input_path) + " has no data rows that can be filtered")
+		print(error_filter.file_name(input_path) + " has uneven rows; the short rows are left out")
+
+	if compat:
+		spike_ct = 0
+		timeout_ct = filter_compat(day)
+	else:
+		values, spike_ct, timeout_ct = filter_values(day, default_rules() if rules is None else rules)
+		for col in range(1, 13):
+			changed = (values[:, col - 1] != day.values[:, col - 1]) & \
+				~(numpy.isnan(values[:, col - 1]) & numpy.isnan(day.values[:, col - 1]))
+			if changed.any():
+				day.set_values(col, values[:, col - 1])
+
+	write_day(day, output_path)
+
+	return spike_ct, timeout_ct
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Filters HF power data files with NumPy. " + \
+		"Filters every file in " + error_filter.DATA_DIR + " if no file is given.")
+	parser.add_argument("file", nargs = "?", help = "data file to filter, e.g. 20170715 or 20170715.data")
+	parser.add_argument("--compat", action = "store_true", help = "write exactly what error_filter.py writes")
+	parser.add_argument("--channels", default = ",".join(CHANNEL_NAMES), \
+		help = "comma-separated channels to filter (default: all)")
+	parser.add_argument("--no-fill", action = "store_true", help = "leave timeouts in place")
+	parser.add_argument("--spike-band", nargs = 2, type = float, metavar = ("LOW", "HIGH"), \
+		help = "zero isolated readings in this band of watts (the old filter used 1270 1320)")
+	parser.add_argument("--range", nargs = 2, type = float, metavar = ("LOW", "HIGH"), \
+		help = "treat readings outside this range of watts as timeouts")
+	args = parser.parse_args()
+
+	channels = [name.strip() for name in args.channels.split(",")]
+	for name in channels:
+		if name not in CHANNEL_NAMES:
+			parser.error("unknown channel " + name)
+
+	rules = {name: ChannelRules(not args.no_fill, args.spike_band, args.range) for name in channels}
+
+	if args.file is not None:
+		file_list = [error_filter.input_path(args.file)]
+		if not os.path.isfile(file_list[0]):
+			print("Could not locate file")
+			sys.exit(1)
+	else:
+		file_list = sorted(glob.glob(os.path.join(error_filter.DATA_DIR, '*.data')))
+
+	failed = []
+	for file_path in file_list:
+		try:
+			spike_ct, timeout_ct = filter_file(file_path, rules = rules, compat = args.compat)
+		except Exception as e:
+			print("Unable to filter " + error_filter.file_name(file_path) + ": " + str(e))
+			failed.append(file_path)
+			continue
+		print("filtered " + error_filter.file_name(file_path) + ". power spikes removed: " + str(spike_ct) + \
+			", timeouts removed: " + str(timeout_ct))
+
+	if failed:
+		sys.exit(1)
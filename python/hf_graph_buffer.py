@@ -0,0 +1,203 @@
+#!usr/bin/env python3
+
+'''
+    File: hf_graph_buffer.py
+    Description: Ring buffers of recent samples for the graph window. Each channel
+        and the sample times are kept in preallocated NumPy arrays, so adding a sample
+        and dropping old ones costs the same however long the graph window is.
+    Author: Lucas McDonald
+    Date created: October 18, 2026
+    Date modified: October 18, 2026
+    Python version: 3.6.1
+'''
+
+import threading
+import numpy
+from sample_log import seconds_from_str
+
+# samples held before the buffer first grows
+INITIAL_CAPACITY = 4096
+
+# Tx1..Tx6, Rx1..Rx6
+NUM_CHANNELS = 12
+
+class GraphBuffer():
+    '''
+    Holds the samples taken in the last length_shown seconds: their times in seconds
+    (since midnight of the first day seen, so they keep increasing past midnight) and
+    the power of each channel, as floats.
+
+    Each array is twice the capacity and every sample is written to both halves, so the
+    samples held are always one contiguous slice. views() returns those slices without
+    copying them, ready to hand to matplotlib. The capacity doubles when the buffer is
+    full of samples that are all still inside the window, so memory only depends on the
+    window length and the sample rate.
+    '''
+
+    def __init__(self, length_shown, capacity = INITIAL_CAPACITY):
+        self.length_shown = float(length_shown)
+        self.lock = threading.Lock()
+        self.allocate(capacity)
+        # added to times of day once they wrap around midnight
+        self.day_offset = 0.0
+
+    def allocate(self, capacity):
+        self.capacity = capacity
+        self.times = numpy.zeros(2 * capacity)
+        self.values = numpy.zeros((NUM_CHANNELS, 2 * capacity))
+        # slot of the oldest sample, and number of samples held
+        self.start = 0
+        self.count = 0
+
+    def clear(self):
+        with self.lock:
+            self.start = 0
+            self.count = 0
+            self.day_offset = 0.0
+
+    def sample_time(self, time_str):
+        '''
+        Converts the HH:MM:SS.SSS time of a sample into seconds that keep increasing
+        past midnight.
+        '''
+
+        seconds = seconds_from_str(time_str) + self.day_offset
+        if self.count and seconds < self.times[self.start + self.count - 1] - 43200:
+            self.day_offset += 86400
+            seconds += 86400
+        return seconds
+
+    def sample_powers(self, output_array):
+        '''
+        Returns the powers in an output array as floats. A reading that isn't a number
+        (e.g. a timeout) is set to the channel's previous reading, or 0 if there isn't one.
+        '''
+
+        powers = numpy.zeros(NUM_CHANNELS)
+        for i in range(NUM_CHANNELS):
+            try:
+                powers[i] = float(output_array[i + 1])
+            except:
+                if self.count:
+                    powers[i] = self.values[i, self.start + self.count - 1]
+        return powers
+
+    def append(self, output_array):
+        '''
+        Adds a sample (an output array already in the graph's units) and drops the samples
+        that are now older than length_shown seconds.
+        '''
+
+        with self.lock:
+            seconds = self.sample_time(output_array[0])
+            powers = self.sample_powers(output_array)
+
+            self.trim(seconds - self.length_shown)
+            if self.count == self.capacity:
+                self.grow()
+
+            slot = (self.start + self.count) % self.capacity
+            self.times[slot] = self.times[slot + self.capacity] = seconds
+            self.values[:, slot] = self.values[:, slot + self.capacity] = powers
+            self.count += 1
+
+    def trim(self, oldest):
+        '''
+        Drops every sample taken before oldest. The times are in order, so this is a
+        binary search rather than one sample at a time.
+        '''
+
+        dropped = numpy.searchsorted(self.times[self.start:self.start + self.count], oldest)
+        self.start = (self.start + dropped) % self.capacity
+        self.count -= dropped
+
+    def grow(self):
+        times, values = self.copies()
+        self.allocate(2 * self.capacity)
+        self.load(times, values)
+
+    def copies(self):
+        return self.times[self.start:self.start + self.count].copy(), \
+            self.values[:, self.start:self.start + self.count].copy()
+
+    def load(self, times, values):
+        # times and values must fit in the buffer
+        count = len(times)
+        self.times[:count] = self.times[self.capacity:self.capacity + count] = times
+        self.values[:, :count] = self.values[:, self.capacity:self.capacity + count] = values
+        self.start = 0
+        self.count = count
+
+    def prepend(self, output_arrays):
+        '''
+        Puts samples taken before the oldest one held in front of it. output_arrays are
+        oldest first and already in the graph's units.
+        '''
+
+        with self.lock:
+            times, values = self.copies()
+
+            first_time = times[0] if self.count else None
+            older_times = []
+            older_values = []
+            prev_powers = numpy.zeros(NUM_CHANNELS)
+            day_offset = self.day_offset
+
+            for output_array in output_arrays:
+                try:
+                    seconds = seconds_from_str(output_array[0]) + day_offset
+                except ValueError:
+                    continue
+
+                if older_times and seconds < older_times[-1] - 43200:
+                    # the backfill goes past midnight
+                    day_offset += 86400
+                    seconds += 86400
+                elif not older_times and first_time is not None and seconds > first_time + 43200:
+                    # the backfill is from before midnight and the samples held are from after it
+                    day_offset -= 86400
+                    seconds -= 86400
+
+                if first_time is not None and seconds >= first_time:
+                    break
+
+                powers = prev_powers.copy()
+                for i in range(NUM_CHANNELS):
+                    try:
+                        powers[i] = float(output_array[i + 1])
+                    except:
+                        pass
+                older_times.append(seconds)
+                older_values.append(powers)
+                prev_powers = powers
+
+            if not older_times:
+                return
+
+            times = numpy.concatenate([older_times, times])
+            values = numpy.concatenate([numpy.array(older_values).T, values], axis = 1)
+
+            # keep only what the window can show
+            keep = times >= times[-1] - self.length_shown
+            times = times[keep]
+            values = values[:, keep]
+
+            capacity = self.capacity
+            while capacity < len(times):
+                capacity *= 2
+            if capacity != self.capacity:
+                self.allocate(capacity)
+            self.load(times, values)
+
+    def views(self):
+        '''
+        Returns (times, values) of the samples held, oldest first, as views into the
+        buffer rather than copies. values[i] is channel i in Tx1..Tx6, Rx1..Rx6 order.
+        '''
+
+        with self.lock:
+            return self.times[self.start:self.start + self.count], \
+                self.values[:, self.start:self.start + self.count]
+
+    def __len__(self):
+        return self.count
@@ -0,0 +1,233 @@
+#!usr/bin/env python3
+
+'''
+    File: hf_graph_plot.py
+    Description: Draws the lines of one live power plot. The axes, grid, labels and legend
+        are drawn once and kept as a background image; each update only puts the background
+        back and draws the lines over it (blitting). The axes are only rescaled, and the
+        whole figure redrawn, when the data leaves the current limits. Long windows are
+        reduced to the min and max of each pixel's worth of samples before drawing.
+    Author: Lucas McDonald
+    Date created: October 18, 2026
+    Date modified: October 18, 2026
+    Python version: 3.6.1
+'''
+
+import numpy
+
+# when the newest sample passes the right edge, the x axis moves on by this fraction of
+# the time shown, so the figure is redrawn once every step rather than every sample
+X_STEP = 0.1
+
+# space left above and below the data when the y axis is rescaled, as a fraction of its range
+Y_MARGIN = 0.1
+
+# number of labelled times along the x axis
+X_TICK_CT = 4
+
+# colour of the line of each transmitter, the same for Tx and Rx
+CHANNEL_COLORS = ['r', '#FF8C00', 'y', 'g', 'b', 'm']
+
+def bin_min_max(times, values, bin_secs):
+    '''
+    Groups samples (times in order, values as channels x samples) into bins of bin_secs
+    seconds. Returns the index of each bin that has samples, the time of its first
+    sample, and the min and max of each channel in it (channels x bins). Missing
+    readings (NaN) are skipped.
+    '''
+
+    bins = numpy.floor(times / bin_secs).astype(numpy.int64)
+    starts = numpy.flatnonzero(numpy.r_[True, bins[1:] != bins[:-1]])
+    return bins[starts], times[starts], numpy.fmin.reduceat(values, starts, axis = 1), \
+        numpy.fmax.reduceat(values, starts, axis = 1)
+
+def min_max_points(starts, bin_secs, minimum, maximum):
+    '''
+    Returns (times, values) to plot for bins starting at starts (seconds) with the given
+    min and max of each channel (channels x bins): two points per bin, the min at the
+    start of the bin and the max halfway through it.
+    '''
+
+    point_times = numpy.empty(2 * len(starts))
+    point_times[0::2] = starts
+    point_times[1::2] = point_times[0::2] + bin_secs / 2
+    point_values = numpy.empty((len(minimum), 2 * len(starts)))
+    point_values[:, 0::2] = minimum
+    point_values[:, 1::2] = maximum
+    return point_times, point_values
+
+class MinMaxDecimator():
+    '''
+    Reduces samples to the lowest and highest reading of each channel in each bin of
+    bin_secs seconds, so a line has two points per bin however many samples there are,
+    and a spike lasting a single sample still shows. The bins are kept between updates;
+    only the newest bin (which may have had samples added), the bins after it and the
+    oldest bin (which may have lost samples) are worked out again.
+    '''
+
+    def __init__(self, bin_secs):
+        self.bin_secs = float(bin_secs)
+        self.clear()
+
+    def clear(self):
+        self.bins = numpy.zeros(0, dtype = numpy.int64)
+        self.first_times = numpy.zeros(0)
+        self.minimum = None
+        self.maximum = None
+
+    def update(self, times, values):
+        '''
+        Brings the bins up to date with the samples held (e.g. the views of a GraphBuffer)
+        and returns (times, values) of the points to plot, two per bin.
+        '''
+
+        if self.minimum is None or len(self.minimum) != len(values) or not len(self.bins) or \
+            times[0] < self.first_times[0] or times[-1] < self.first_times[-1]:
+            # nothing to build on, or older samples were added
+            self.clear()
+            keep = 0
+            start = 0
+        else:
+            keep = len(self.bins) - 1
+            start = numpy.searchsorted(times, self.first_times[-1])
+
+        bins, first_times, minimum, maximum = bin_min_max(times[start:], values[:, start:], self.bin_secs)
+        if keep:
+            bins = numpy.concatenate([self.bins[:keep], bins])
+            first_times = numpy.concatenate([self.first_times[:keep], first_times])
+            minimum = numpy.concatenate([self.minimum[:, :keep], minimum], axis = 1)
+            maximum = numpy.concatenate([self.maximum[:, :keep], maximum], axis = 1)
+
+        # drop the bins the window has moved past
+        dropped = numpy.searchsorted(first_times, times[0], side = 'right') - 1
+        if dropped > 0:
+            bins = bins[dropped:]
+            first_times = first_times[dropped:]
+            minimum = minimum[:, dropped:]
+            maximum = maximum[:, dropped:]
+
+        # samples may have been trimmed from the oldest bin
+        if first_times[0] != times[0]:
+            first_times[0] = times[0]
+            end = numpy.searchsorted(times, first_times[1]) if len(first_times) > 1 else len(times)
+            minimum[:, 0] = values[:, :end].min(axis = 1)
+            maximum[:, 0] = values[:, :end].max(axis = 1)
+
+        self.bins = bins
+        self.first_times = first_times
+        self.minimum = minimum
+        self.maximum = maximum
+
+        return self.points()
+
+    def points(self):
+        return min_max_points(self.bins * self.bin_secs, self.bin_secs, self.minimum, self.maximum)
+
+class LivePlot():
+    '''
+    One axes of a live graph.
+        axes, canvas: the matplotlib axes and the FigureCanvasTkAgg it is drawn on
+        lines: list of (channel, line) where channel is the row of values the line plots
+        length_shown: seconds of data shown
+        blit: draw only the lines on each update; if False, or the canvas can't blit,
+            the whole figure is drawn every time as before
+    '''
+
+    def __init__(self, axes, canvas, lines, length_shown, blit = True):
+        self.axes = axes
+        self.canvas = canvas
+        self.lines = lines
+        self.length_shown = float(length_shown)
+        self.blit = blit and getattr(canvas, 'supports_blit', False)
+        self.background = None
+        self.decimator = None
+
+        # the legend is part of the background, so it's only made once
+        if self.lines:
+            self.axes.legend(loc='center left', bbox_to_anchor=(1, 0.5), fancybox=True)
+
+        if self.blit:
+            # animated lines are left out of full draws and drawn over the background
+            for channel, line in self.lines:
+                line.set_animated(True)
+            # also called when the window is resized or uncovered
+            self.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.axes.bbox)
+        self.draw_lines()
+
+    def draw_lines(self):
+        for channel, line in self.lines:
+            self.axes.draw_artist(line)
+
+    def update(self, times, values):
+        '''
+        Plots times against values[channel] for each line. times and values can be views
+        of a GraphBuffer; the lines keep a reference to them until the next update.
+        '''
+
+        if not len(times):
+            return
+
+        times, values = self.decimate(times, values)
+
+        for channel, line in self.lines:
+            line.set_data(times, values[channel])
+
+        if self.rescale(times, values) or not self.blit or self.background is None:
+            # on_draw saves the new background and draws the lines
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self.draw_lines()
+            self.canvas.blit(self.axes.bbox)
+
+        self.canvas.flush_events()
+
+    def decimate(self, times, values):
+        '''
+        Returns the samples to plot: all of them if there are no more than two per pixel
+        across the axes, otherwise the min and max over each pixel from a MinMaxDecimator.
+        '''
+
+        pixels = max(int(self.axes.bbox.width), 1)
+        if len(times) <= 2 * pixels:
+            self.decimator = None
+            return times, values
+
+        # one bin per pixel of the time shown; a resized window needs new bins
+        bin_secs = self.length_shown * (1 + X_STEP) / pixels
+        if self.decimator is None or self.decimator.bin_secs != bin_secs:
+            self.decimator = MinMaxDecimator(bin_secs)
+        return self.decimator.update(times, values)
+
+    def rescale(self, times, values):
+        '''
+        Moves the limits if the data has left them. Returns True if they were changed.
+        '''
+
+        left, right = self.axes.get_xlim()
+        bottom, top = self.axes.get_ylim()
+        step = self.length_shown * X_STEP
+
+        shown = values[[channel for channel, line in self.lines]]
+        low = shown.min() if shown.size else 0.0
+        high = shown.max() if shown.size else 0.0
+
+        # the x axis moves on a step at a time, or jumps back if the graph was reset
+        new_x = times[-1] > right or times[-1] < right - step or times[0] < left
+        # the y axis grows when the data leaves it, and fits the data again as the x axis moves
+        new_y = new_x or low < bottom or high > top
+
+        if new_x:
+            right = times[-1] + step
+            left = right - self.length_shown - step
+            self.axes.set_xlim(left, right)
+            self.axes.set_xticks(numpy.linspace(left, right, X_TICK_CT))
+
+        if new_y:
+            margin = (high - low) * Y_MARGIN or max(abs(high) * Y_MARGIN, 1.0)
+            self.axes.set_ylim(low - margin, high + margin)
+
+        return new_x or new_y
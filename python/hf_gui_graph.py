@@ -6,7 +6,7 @@
         for the HF transmitters.
     Author: Lucas McDonald
     Date created: June 26, 2017
-    Date modified: August 2, 2017
+    Date modified: October 18, 2026
     Python version: 3.6.1
 '''
 
@@ -18,12 +18,24 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolb
 from matplotlib.figure import Figure
 from matplotlib.animation import FuncAnimation
 from matplotlib.dates import DateFormatter
+from matplotlib.ticker import FuncFormatter
 from hf_gui_graph_settings import HFGraphSettingsGUI
+from hf_graph_buffer import GraphBuffer
+from hf_graph_plot import LivePlot
+from sample_log import str_from_seconds
 import pickle
-import threading
-from datetime import datetime
 import time
 
+# redraw only the lines on each update instead of the whole figure
+BLIT_GRAPHS = True
+
+def time_label(seconds, position = None):
+    '''
+    Labels an x value of the graph, in seconds, as HH:MM:SS.
+    '''
+
+    return str_from_seconds(seconds % 86400).split('.')[0]
+
 class HFGraphGUI():
 
     def __init__(self, parent):
@@ -94,10 +106,6 @@ class HFGraphGUI():
 
         self.reset_graph()
 
-        self.sample_num = []
-        # data_array holds the output values from monitor_power or record_power
-        self.data_array = [[] for _ in range(14)]
-
         # button to open the settings menu
         self.graph_settings_button = tkinter.Button(self.graph_view, text = "Graph Settings", font = (None,self.parent.font_size), \
             command = self.graph_settings_pressed)
@@ -128,18 +136,30 @@ class HFGraphGUI():
         self.trans_plot.grid(b=True, which='major', color='b', alpha=.3, linestyle='-')
         self.trans_plot.grid(b=True, which='minor', color='b', alpha=.3, linestyle='--')
 
+        # the line of each channel shown, with the channel's index in the buffer
+        self.tx_lines = []
+
         if self.tx1_plot_bool:
             self.tx1_plot, = self.trans_plot.plot([],[],'r', label = 'Tx1')
+            self.tx_lines.append((0, self.tx1_plot))
         if self.tx2_plot_bool:
             self.tx2_plot, = self.trans_plot.plot([],[], color = '#FF8C00', label = 'Tx2')
+            self.tx_lines.append((1, self.tx2_plot))
         if self.tx3_plot_bool:
             self.tx3_plot, = self.trans_plot.plot([],[],'y', label = 'Tx3')
+            self.tx_lines.append((2, self.tx3_plot))
         if self.tx4_plot_bool:
             self.tx4_plot, = self.trans_plot.plot([],[],'g', label = 'Tx4')
+            self.tx_lines.append((3, self.tx4_plot))
         if self.tx5_plot_bool:
             self.tx5_plot, = self.trans_plot.plot([],[],'b', label = 'Tx5')
+            self.tx_lines.append((4, self.tx5_plot))
         if self.tx6_plot_bool:
             self.tx6_plot, = self.trans_plot.plot([],[],'m', label = 'Tx6')
+            self.tx_lines.append((5, self.tx6_plot))
+
+        # the x values are seconds; label them as times of day
+        self.trans_plot.xaxis.set_major_formatter(FuncFormatter(time_label))
 
         self.tx_axes = self.trans_figure.gca()
 
@@ -148,6 +168,8 @@ class HFGraphGUI():
         self.trans_canvas.show()
         self.trans_canvas.get_tk_widget().grid(row = 0, column = 0, padx=0)
 
+        self.tx_live = LivePlot(self.trans_plot, self.trans_canvas, self.tx_lines, self.length_shown, BLIT_GRAPHS)
+
     def create_rx_plot(self):
         self.ref_figure = Figure(facecolor='white')
         
@@ -165,18 +187,28 @@ class HFGraphGUI():
         self.ref_plot.grid(b=True, which='major', color='b', alpha=.3, linestyle='-')
         self.ref_plot.grid(b=True, which='minor', color='b', alpha=.3, linestyle='--')
 
+        self.rx_lines = []
+
         if self.rx1_plot_bool:
             self.rx1_plot, = self.ref_plot.plot([],[],'r', label = 'Rx1')
+            self.rx_lines.append((6, self.rx1_plot))
         if self.rx2_plot_bool:
             self.rx2_plot, = self.ref_plot.plot([],[], color = '#FF8C00', label = 'Rx2')
+            self.rx_lines.append((7, self.rx2_plot))
         if self.rx3_plot_bool:
             self.rx3_plot, = self.ref_plot.plot([],[],'y', label = 'Rx3')
+            self.rx_lines.append((8, self.rx3_plot))
         if self.rx4_plot_bool:
             self.rx4_plot, = self.ref_plot.plot([],[],'g', label = 'Rx4')
+            self.rx_lines.append((9, self.rx4_plot))
         if self.rx5_plot_bool:
             self.rx5_plot, = self.ref_plot.plot([],[],'b', label = 'Rx5')
+            self.rx_lines.append((10, self.rx5_plot))
         if self.rx6_plot_bool:
             self.rx6_plot, = self.ref_plot.plot([],[],'m', label = 'Rx6')
+            self.rx_lines.append((11, self.rx6_plot))
+
+        self.ref_plot.xaxis.set_major_formatter(FuncFormatter(time_label))
 
         self.rx_axes = self.ref_figure.gca()
 
@@ -185,6 +217,8 @@ class HFGraphGUI():
         self.ref_canvas.show()
         self.ref_canvas.get_tk_widget().grid(row = 1, column = 0, padx=10)
 
+        self.rx_live = LivePlot(self.ref_plot, self.ref_canvas, self.rx_lines, self.length_shown, BLIT_GRAPHS)
+
     def reset_graph(self):
         '''
         Resets the graph to initial settings. Called when the graph settings or the
@@ -194,8 +228,7 @@ class HFGraphGUI():
         self.length_shown = float(self.time_shown_variable.get())
 
         # reset data as length has changed
-        self.sample_num = []
-        self.data_array = [[] for _ in range(15)]
+        self.buffer = GraphBuffer(self.length_shown)
 
         # done here as .get() can sometimes take a long time
         self.tx1_plot_bool = self.tx1_plot_enabled.get() == 1
@@ -241,10 +274,12 @@ class HFGraphGUI():
 
         self.create_plots()
 
-    def update_graph(self, output_array):
+    def update_graph(self, output_arrays):
         '''
         Plots a specified number of the last power recordings on a graph.
         The plot is realtime and displays both transmitted and reflected power.
+        output_arrays are the samples received since the last call, oldest first; the
+        graph is drawn at most once for all of them. Called on the Tk thread.
         '''
 
         # if the units changed, reset the graph
@@ -252,131 +287,50 @@ class HFGraphGUI():
             self.prev_units = self.parent.set_units_var.get()
             self.reset_graph()
 
-        # update sample_num arrays
-        try:
-            # set new element to previous element + 1
-            self.sample_num.append(self.sample_num[-1]+1)
-        except:
-            # if the array was just reinitalized, set first element to 0
-            self.sample_num.append(0)                
+        redraw = False
 
-        self.update_data_array(output_array, 0)
+        for output_array in output_arrays:
+            # add the sample; readings that aren't numbers keep the previous reading
+            try:
+                self.buffer.append(output_array)
+            except ValueError:
+                # the time of the sample couldn't be read
+                continue
 
-        # append the most recent output to each dataset
-        for i in range(1, len(output_array)-2):
-            if(self.plot_bool_array[i-1]):
+            if(self.time_between_updates < self.graph_update_interval_int):
                 try:
-                    float(output_array[i])
+                    self.time_between_updates += float(output_array[-1])
                 except:
-                    # if it isn't a number, set power to most recent power reading from transmitter
-                    try:
-                        output_array[i] = self.data_array[i][-1]
-                    # if there's an error with this (e.g. no previous power readings), just set to 0
-                    except:
-                        output_array[i] = "0.000"
-
-                self.update_data_array(output_array, i)
-
-        self.update_data_array(output_array, -1)
-
-        if self.length_shown < (datetime.strptime(self.data_array[0][-1], "%H:%M:%S.%f") - \
-            datetime.strptime(self.data_array[0][0], "%H:%M:%S.%f")).total_seconds():
-            del self.sample_num[0]
-            del self.data_array[0][0] 
-            for i in range(1, len(self.data_array)-2):
-                if(self.plot_bool_array[i-1]):
-                    del self.data_array[i][0] 
-            del self.data_array[-1][0]
-
+                    pass
+            else:
+                self.time_between_updates = 0
+                redraw = True
 
-        if(self.time_between_updates < self.graph_update_interval_int):
-            self.time_between_updates += float(self.data_array[-1][-1])
-        else:
-            self.time_between_updates = 0   
+        if redraw:
+            # update the UI according to the power and units
             if self.tx_graph_bool:
-                # update the UI according to the power and units
-                trans_thread = threading.Thread(target = self.update_tx_graph)
-                trans_thread.start()
+                self.update_tx_graph()
             if self.rx_graph_bool:
-                ref_thread = threading.Thread(target = self.update_rx_graph)
-                ref_thread.start()
-
-    def update_data_array(self, output_array, i):  
-        self.data_array[i].append(output_array[i])
-
-    def update_tx_graph(self):
-
-        if self.tx1_plot_bool:
-            self.tx1_plot.set_xdata(self.sample_num)
-            self.tx1_plot.set_ydata(self.data_array[1])
-        if self.tx2_plot_bool:
-            self.tx2_plot.set_xdata(self.sample_num)
-            self.tx2_plot.set_ydata(self.data_array[2])
-        if self.tx3_plot_bool:
-            self.tx3_plot.set_xdata(self.sample_num)
-            self.tx3_plot.set_ydata(self.data_array[3])
-        if self.tx4_plot_bool:
-            self.tx4_plot.set_xdata(self.sample_num)
-            self.tx4_plot.set_ydata(self.data_array[4])
-        if self.tx5_plot_bool:
-            self.tx5_plot.set_xdata(self.sample_num)
-            self.tx5_plot.set_ydata(self.data_array[5])
-        if self.tx6_plot_bool:
-            self.tx6_plot.set_xdata(self.sample_num)
-            self.tx6_plot.set_ydata(self.data_array[6])
+                self.update_rx_graph()
 
-        self.tx_axes.relim()
-        self.tx_axes.autoscale_view()
-
-        self.trans_plot.set_xticks([self.sample_num[0],self.sample_num[int(len(self.sample_num)/3)],\
-            self.sample_num[int(2*len(self.sample_num)/3)],self.sample_num[-1]])
+    def load_backfill(self, output_arrays):
+        '''
+        Puts samples taken before the graph was opened in front of the data already shown.
+        output_arrays are oldest first and already converted to the current units.
+        '''
 
-        self.trans_plot.set_xticklabels([self.data_array[0][0].split('.')[0], \
-            self.data_array[0][int(len(self.sample_num)/3)].split('.')[0], \
-            self.data_array[0][int(2*len(self.sample_num)/3)].split('.')[0], \
-            self.data_array[0][-1].split('.')[0]])
+        self.buffer.prepend(output_arrays)
 
-        # show a legend
-        self.trans_plot.legend(loc='center left', bbox_to_anchor=(1, 0.5), fancybox=True)
+    def update_tx_graph(self):
 
-        self.trans_canvas.draw()
-        self.trans_canvas.flush_events()
+        # the lines are given views of the buffer, not copies
+        times, values = self.buffer.views()
+        self.tx_live.update(times, values)
 
     def update_rx_graph(self):
 
-        if self.rx1_plot_bool:
-            self.rx1_plot.set_xdata(self.sample_num)
-            self.rx1_plot.set_ydata(self.data_array[7])
-        if self.rx2_plot_bool:
-            self.rx1_plot.set_xdata(self.sample_num)
-            self.rx1_plot.set_ydata(self.data_array[8])
-        if self.rx3_plot_bool:
-            self.rx1_plot.set_xdata(self.sample_num)
-            self.rx1_plot.set_ydata(self.data_array[9])
-        if self.rx4_plot_bool:
-            self.rx1_plot.set_xdata(self.sample_num)
-            self.rx1_plot.set_ydata(self.data_array[10])
-        if self.rx5_plot_bool:
-            self.rx1_plot.set_xdata(self.sample_num)
-            self.rx1_plot.set_ydata(self.data_array[11])
-        if self.rx6_plot_bool:
-            self.rx1_plot.set_xdata(self.sample_num)
-            self.rx1_plot.set_ydata(self.data_array[12])
-
-        self.rx_axes.relim()
-        self.rx_axes.autoscale_view()
-
-        self.ref_plot.set_xticks([self.sample_num[0],self.sample_num[int(len(self.sample_num)/3)],\
-            self.sample_num[int(2*len(self.sample_num)/3)],self.sample_num[-1]])
-
-        self.ref_plot.set_xticklabels([self.data_array[0][0].split('.')[0], \
-            self.data_array[0][int(len(self.sample_num)/3)].split('.')[0], \
-            self.data_array[0][int(2*len(self.sample_num)/3)].split('.')[0], \
-            self.data_array[0][-1].split('.')[0]])
-
-        self.ref_plot.legend(loc='center left', bbox_to_anchor=(1, 0.5), fancybox=True)
-
-        self.ref_canvas.draw()
+        times, values = self.buffer.views()
+        self.rx_live.update(times, values)
 
     def graph_settings_pressed(self):
         '''
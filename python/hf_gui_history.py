@@ -0,0 +1,497 @@
+#!usr/bin/env python3
+
+'''
+    File: hf_gui_history.py
+    Description: Class for the GUI window for browsing recorded data. Opens a .data or
+        _filtered.data file, or a range of days from the local data folder, and plots the
+        transmitted and reflected power with the same lines as the graph window. Only the
+        time range in view is loaded, from the rollups (rollup.py) at the coarsest level
+        that still gives a point per pixel or from the rows themselves when zoomed in,
+        and it is loaded again as the plot is panned or zoomed.
+    Author: Lucas McDonald
+    Date created: October 18, 2026
+    Date modified: October 18, 2026
+    Python version: 3.6.1
+'''
+
+import tkinter
+from tkinter import filedialog, messagebox
+import matplotlib
+matplotlib.use("TKAgg")
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2TkAgg
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+from datetime import datetime, timedelta
+import os
+import queue
+import threading
+import numpy
+import error_filter
+import rollup
+from hf_graph_plot import CHANNEL_COLORS, bin_min_max, min_max_points
+from hf_loader import CHANNEL_NAMES
+
+# time to wait after the view stops changing before loading it, in milliseconds
+LOAD_DELAY_MS = 200
+
+# how often the window checks whether a load has finished, in milliseconds
+LOAD_CHECK_MS = 50
+
+# data is loaded this far either side of the view, as a fraction of the time in view,
+# so small pans don't need a new load
+LOAD_MARGIN = 0.5
+
+def parse_time(text, end = False):
+    '''
+    Reads a time typed as YYYYMMDD, YYYYMMDD HH:MM or YYYYMMDD HH:MM:SS. A day on its
+    own is the start of that day, or the end of it if end is set.
+    '''
+
+    text = text.strip()
+    for time_format in ["%Y%m%d %H:%M:%S", "%Y%m%d %H:%M"]:
+        try:
+            return datetime.strptime(text, time_format)
+        except ValueError:
+            pass
+
+    day = datetime.strptime(text, "%Y%m%d")
+    return day + timedelta(days = 1) if end else day
+
+def rollup_label(width):
+    if width >= 3600:
+        return str(width // 3600) + ' h'
+    if width >= 60:
+        return str(width // 60) + ' min'
+    return str(width) + ' s'
+
+class HistorySource():
+    '''
+    Recorded data opened in the history window: a single file (file_path) or the days
+    from start to end in data_dir, read from the files named [date][suffix]. Times are
+    in seconds since origin, midnight of the first day, and extent is the (start, end)
+    of the data in those seconds.
+    '''
+
+    def __init__(self, origin, extent, file_path = None, data_dir = None, suffix = ".data"):
+        self.origin = origin
+        self.extent = extent
+        self.file_path = file_path
+        self.data_dir = data_dir
+        self.suffix = suffix
+
+    def read(self, start_secs, end_secs, pixels):
+        '''
+        Returns the data from start_secs to end_secs at the resolution of a plot pixels
+        wide, as (width, times, minimum, maximum): width is the bin width of the rollup
+        level used, or None for the rows themselves, and minimum and maximum are
+        (bins x 12) in Tx1..Rx6 order.
+        '''
+
+        if self.file_path is not None:
+            width = rollup.choose_level(end_secs - start_secs, pixels)
+            level = rollup.file_level(self.file_path, width)
+            if level is None:
+                return None
+            part = level.between(start_secs, end_secs)
+            return width, part.start, part.minimum, part.maximum
+
+        start = self.origin + timedelta(seconds = start_secs)
+        end = self.origin + timedelta(seconds = end_secs)
+        width, times, minimum, maximum, mean, count = rollup.read_range(self.data_dir, start, end, pixels, self.suffix)
+
+        # read_range gives times from midnight of the first day read
+        first_day = datetime(start.year, start.month, start.day)
+        return width, times + (first_day - self.origin).total_seconds(), minimum, maximum
+
+    def title(self):
+        if self.file_path is not None:
+            return os.path.basename(self.file_path)
+        last_day = self.origin + timedelta(seconds = self.extent[1] - 1)
+        return self.origin.strftime("%Y%m%d") + " to " + last_day.strftime("%Y%m%d")
+
+def file_source(file_path):
+    '''
+    Returns a HistorySource for a single file, or None if it can't be read. Its date is
+    taken from the name, e.g. 20170715_filtered.data, and its extent from the rollup.
+    '''
+
+    try:
+        origin = datetime.strptime(os.path.basename(file_path)[:8], "%Y%m%d")
+    except ValueError:
+        origin = datetime(1970, 1, 1)
+
+    levels = rollup.load_rollup(file_path)
+    if levels is None or not len(levels[rollup.LEVELS[0]].start):
+        return None
+
+    starts = levels[rollup.LEVELS[0]].start
+    return HistorySource(origin, (starts[0], starts[-1] + rollup.LEVELS[0]), file_path = file_path)
+
+class HFHistoryGUI():
+
+    def __init__(self, parent):
+        '''
+        Called when the View History button on the main window is pressed. Loads a new
+        window with a plot of transmitted power above one of reflected power, sharing a
+        time axis, and controls for choosing the data shown.
+        '''
+
+        # parent is the main window
+        self.parent = parent
+
+        # the data shown; None until a file or range is opened
+        self.source = None
+
+        # results of loads done in the background, put here for the Tk thread to show
+        self.loaded_queue = queue.Queue()
+        # files opened in the background, as (file path, HistorySource or None)
+        self.opened_queue = queue.Queue()
+        # the file being opened, if any
+        self.opening = None
+        self.loading = False
+        self.load_pending = False
+        self.load_after = None
+        # the range, and rollup level, of the data last shown
+        self.loaded = None
+        self.fit_power = False
+        self.closed = False
+
+        self.start_text = tkinter.StringVar()
+        self.end_text = tkinter.StringVar()
+        self.filtered_enabled = tkinter.IntVar()
+        self.status_text = tkinter.StringVar()
+        self.status_text.set('Open a file or a range of days.')
+
+        today = datetime.now().strftime("%Y%m%d")
+        self.start_text.set(today)
+        self.end_text.set(today)
+
+        # create the history window
+        self.history_view = tkinter.Toplevel(master=self.parent.form)
+        self.history_view.wm_title('HF Power History')
+
+        self.create_plots()
+
+        # controls for choosing what's shown
+        self.history_control_box = tkinter.LabelFrame(self.history_view, text=" Data Shown ", font=(None,self.parent.font_size))
+        self.history_control_box.grid(row = 2, column = 0, padx = 10, pady = 10, ipadx = 5, ipady = 5)
+
+        self.open_file_button = tkinter.Button(self.history_control_box, text = "Open File", font = (None,self.parent.font_size), \
+            command = self.open_file_pressed)
+        self.open_file_button.grid(row = 0, column = 0, padx = self.parent.x_padding-15, pady = self.parent.y_padding)
+
+        self.start_label = tkinter.Label(self.history_control_box, text = "From:", font=(None,self.parent.font_size))
+        self.start_label.grid(row = 0, column = 1, padx = 5, pady = self.parent.y_padding)
+
+        self.start_entry = tkinter.Entry(self.history_control_box, textvariable = self.start_text, width = 17, font=(None,self.parent.font_size))
+        self.start_entry.grid(row = 0, column = 2, padx = 5, pady = self.parent.y_padding)
+
+        self.end_label = tkinter.Label(self.history_control_box, text = "To:", font=(None,self.parent.font_size))
+        self.end_label.grid(row = 0, column = 3, padx = 5, pady = self.parent.y_padding)
+
+        self.end_entry = tkinter.Entry(self.history_control_box, textvariable = self.end_text, width = 17, font=(None,self.parent.font_size))
+        self.end_entry.grid(row = 0, column = 4, padx = 5, pady = self.parent.y_padding)
+
+        self.filtered = tkinter.Checkbutton(self.history_control_box, text = 'Filtered', font=(None,self.parent.font_size), \
+            variable = self.filtered_enabled)
+        self.filtered.grid(row = 0, column = 5, padx = 5, pady = self.parent.y_padding)
+
+        self.open_range_button = tkinter.Button(self.history_control_box, text = "Show Range", font = (None,self.parent.font_size), \
+            command = self.open_range_pressed)
+        self.open_range_button.grid(row = 0, column = 6, padx = self.parent.x_padding-15, pady = self.parent.y_padding)
+
+        self.status = tkinter.Label(self.history_control_box, textvariable = self.status_text, font=(None,self.parent.font_size), \
+            foreground='gray')
+        self.status.grid(row = 1, column = 0, columnspan = 7, padx = 5, pady = self.parent.y_padding, sticky = 'W')
+
+        self.history_view.after(LOAD_CHECK_MS, self.check_loaded)
+
+    def create_plots(self):
+        self.history_figure = Figure(facecolor='white')
+        self.history_figure.set_size_inches(12, 8, forward=True)
+
+        self.tx_plot = self.history_figure.add_subplot(211)
+        self.rx_plot = self.history_figure.add_subplot(212, sharex = self.tx_plot)
+
+        self.tx_plot.set_title('Transmitted Power')
+        self.rx_plot.set_title('Reflected Power')
+
+        # the line of each channel, with the channel's index in the loaded arrays
+        self.lines = []
+
+        for plot, names in [(self.tx_plot, CHANNEL_NAMES[:6]), (self.rx_plot, CHANNEL_NAMES[6:])]:
+            plot.set_ylabel('Power (W)')
+            plot.grid(b=True, which='major', color='b', alpha=.3, linestyle='-')
+            plot.grid(b=True, which='minor', color='b', alpha=.3, linestyle='--')
+            for name, color in zip(names, CHANNEL_COLORS):
+                line, = plot.plot([],[], color = color, label = name)
+                self.lines.append((CHANNEL_NAMES.index(name), line))
+            plot.legend(loc='center left', bbox_to_anchor=(1, 0.5), fancybox=True)
+            plot.xaxis.set_major_formatter(FuncFormatter(self.time_label))
+
+        self.rx_plot.set_xlabel('Time')
+
+        # load the data in view whenever the view changes
+        self.tx_plot.callbacks.connect('xlim_changed', self.view_changed)
+
+        # a tk.DrawingArea
+        self.history_canvas = FigureCanvasTkAgg(self.history_figure, master=self.history_view)
+        self.history_canvas.show()
+        self.history_canvas.get_tk_widget().grid(row = 0, column = 0, padx=0)
+
+        # toolbar for panning and zooming; it packs itself, so it gets a frame of its own
+        self.toolbar_frame = tkinter.Frame(self.history_view)
+        self.toolbar_frame.grid(row = 1, column = 0, sticky = 'W')
+        self.toolbar = NavigationToolbar2TkAgg(self.history_canvas, self.toolbar_frame)
+        self.toolbar.update()
+
+    def time_label(self, seconds, position = None):
+        '''
+        Labels an x value, in seconds since the start of the first day shown, with the
+        time of day, and the date when more than a day is in view.
+        '''
+
+        if self.source is None:
+            return ''
+        try:
+            label_time = self.source.origin + timedelta(seconds = float(seconds))
+        except OverflowError:
+            return ''
+
+        left, right = self.tx_plot.get_xlim()
+        if right - left > 86400:
+            return label_time.strftime("%m/%d %H:%M")
+        return label_time.strftime("%H:%M:%S")
+
+    def open_file_pressed(self):
+        '''
+        Called when the Open File button is pressed. Shows a .data or _filtered.data file.
+        '''
+
+        file_path = filedialog.askopenfilename(parent = self.history_view, \
+            initialdir = os.path.join(self.parent.data_filepath.get(), "data"), \
+            filetypes = [("HF power data", "*.data"), ("All files", "*")])
+        if not file_path:
+            return
+
+        self.status_text.set('Loading ' + os.path.basename(file_path) + '...')
+
+        # building the rollup of a whole day takes a while, so it's done in the background
+        # and shown by check_loaded
+        self.opening = file_path
+        open_thread = threading.Thread(target = self.open_file, args = [file_path])
+        open_thread.start()
+
+    def open_file(self, file_path):
+        '''
+        Runs in the background. Reads a file's rollup and puts the source on the queue
+        for check_loaded.
+        '''
+
+        try:
+            source = file_source(file_path)
+        except Exception as e:
+            print("Error opening " + file_path + ": " + str(e))
+            source = None
+
+        self.opened_queue.put((file_path, source))
+
+    def show_opened(self, file_path, source):
+        # another file or a range may have been opened since
+        if file_path != self.opening:
+            return
+        self.opening = None
+
+        if source is None:
+            messagebox.showwarning(
+                    "File Error",
+                    "Unable to read " + file_path + "."
+                )
+            self.status_text.set('Open a file or a range of days.')
+            return
+
+        self.show_source(source)
+
+    def open_range_pressed(self):
+        '''
+        Called when the Show Range button is pressed. Shows the days in the local data
+        folder (or its filtered folder) between the From and To times.
+        '''
+
+        try:
+            start = parse_time(self.start_text.get())
+            end = parse_time(self.end_text.get(), end = True)
+        except ValueError:
+            messagebox.showwarning(
+                    "Field Error",
+                    "Enter times as YYYYMMDD or YYYYMMDD HH:MM."
+                )
+            return
+
+        if end <= start:
+            messagebox.showwarning(
+                    "Field Error",
+                    "The To time must be after the From time."
+                )
+            return
+
+        # a file still being opened isn't shown once a range has been chosen
+        self.opening = None
+
+        data_dir = os.path.join(self.parent.data_filepath.get(), "data")
+        suffix = ".data"
+        if self.filtered_enabled.get() == 1:
+            data_dir = os.path.join(data_dir, os.path.basename(os.path.normpath(error_filter.FILTERED_DIR)))
+            suffix = "_filtered.data"
+
+        origin = datetime(start.year, start.month, start.day)
+        self.show_source(HistorySource(origin, ((start - origin).total_seconds(), (end - origin).total_seconds()), \
+            data_dir = data_dir, suffix = suffix))
+
+    def show_source(self, source):
+        self.source = source
+        self.loaded = None
+        self.fit_power = True
+
+        for channel, line in self.lines:
+            line.set_data([], [])
+
+        self.history_view.wm_title('HF Power History - ' + source.title())
+
+        # forget the views of the previous data so the toolbar's home button comes back here
+        self.toolbar.update()
+
+        # setting the limits loads the data in view
+        self.tx_plot.set_xlim(source.extent[0], source.extent[1])
+
+    def view_changed(self, axes):
+        '''
+        Called whenever the x limits change. Loads the view once it has stopped changing,
+        so dragging the plot doesn't start a load for every step.
+        '''
+
+        if self.load_after is not None:
+            self.history_view.after_cancel(self.load_after)
+        self.load_after = self.history_view.after(LOAD_DELAY_MS, self.load_visible)
+
+    def load_visible(self):
+        '''
+        Starts loading the data in view, with a margin either side, unless it is already
+        loaded at the right resolution.
+        '''
+
+        self.load_after = None
+        if self.source is None:
+            return
+
+        # one load at a time; the latest view is loaded when it finishes
+        if self.loading:
+            self.load_pending = True
+            return
+
+        left, right = self.tx_plot.get_xlim()
+        pixels = max(int(self.tx_plot.bbox.width), 1)
+        width = rollup.choose_level(right - left, pixels)
+
+        if self.loaded is not None and self.loaded[0] <= left and right <= self.loaded[1] and \
+            self.loaded[2] == width and self.loaded[3] == pixels:
+            return
+
+        # the margins are loaded at the same resolution as the view
+        margin = (right - left) * LOAD_MARGIN
+        start = left - margin
+        end = right + margin
+        load_pixels = int(pixels * (end - start) / (right - left))
+
+        self.loading = True
+        self.status_text.set('Loading...')
+        load_thread = threading.Thread(target = self.load_range, args = [self.source, start, end, load_pixels, pixels])
+        load_thread.start()
+
+    def load_range(self, source, start, end, load_pixels, pixels):
+        '''
+        Runs in the background. Reads the data and puts it on the queue for check_loaded.
+        '''
+
+        try:
+            result = source.read(start, end, load_pixels)
+        except Exception as e:
+            print("Error loading history: " + str(e))
+            result = None
+
+        self.loaded_queue.put((source, start, end, load_pixels, pixels, result))
+
+    def check_loaded(self):
+        '''
+        Runs on the Tk thread every LOAD_CHECK_MS while the window is open, and shows
+        files that have finished opening and data that has finished loading.
+        '''
+
+        if self.closed:
+            return
+
+        try:
+            file_path, source = self.opened_queue.get_nowait()
+        except queue.Empty:
+            pass
+        else:
+            self.show_opened(file_path, source)
+
+        try:
+            source, start, end, load_pixels, pixels, result = self.loaded_queue.get_nowait()
+        except queue.Empty:
+            pass
+        else:
+            self.loading = False
+            # a different file or range may have been opened since the load started
+            if source is self.source:
+                self.show_loaded(start, end, load_pixels, pixels, result)
+            if self.load_pending or source is not self.source:
+                self.load_pending = False
+                self.load_visible()
+
+        self.history_view.after(LOAD_CHECK_MS, self.check_loaded)
+
+    def show_loaded(self, start, end, load_pixels, pixels, result):
+        if result is None:
+            self.status_text.set('Unable to read ' + self.source.title() + '.')
+            return
+
+        width, times, minimum, maximum = result
+        self.loaded = (start, end, width, pixels)
+
+        if width is None:
+            if len(times) > 2 * load_pixels:
+                # more rows than pixels; plot the min and max over each pixel instead
+                secs_per_pixel = (end - start) / float(load_pixels)
+                bins, first_times, minimum, maximum = bin_min_max(times, minimum.T, secs_per_pixel)
+                times, values = min_max_points(bins * secs_per_pixel, secs_per_pixel, minimum, maximum)
+                self.status_text.set('Showing the min and max of the rows over each pixel.')
+            else:
+                values = minimum.T
+                self.status_text.set('Showing every row.')
+        else:
+            times, values = min_max_points(times, width, minimum.T, maximum.T)
+            self.status_text.set('Showing the min and max over each ' + rollup_label(width) + '.')
+
+        for channel, line in self.lines:
+            line.set_data(times, values[channel])
+
+        # fit the power axes to the data when it is first shown; after that they are
+        # left as the user zoomed them
+        if self.fit_power:
+            self.fit_power = False
+            for plot, channels in [(self.tx_plot, slice(0, 6)), (self.rx_plot, slice(6, 12))]:
+                shown = values[channels]
+                if numpy.isnan(shown).all():
+                    continue
+                low = numpy.nanmin(shown)
+                high = numpy.nanmax(shown)
+                margin = (high - low) * 0.05 or 1.0
+                plot.set_ylim(low - margin, high + margin)
+
+        self.history_canvas.draw_idle()
+
+    def close(self):
+        self.closed = True
+        self.history_view.destroy()
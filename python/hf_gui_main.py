@@ -8,7 +8,7 @@
         with the Raspberry Pi and loading the main settings for the program.
     Author: Lucas McDonald
     Date created: June 6, 2017
-    Date modified: August 2, 2017
+    Date modified: October 18, 2026
     Python version: 3.6.1
 '''
 
@@ -20,10 +20,20 @@ import threading
 import math
 from hf_gui_settings import HFSettingsGUI
 from hf_gui_graph import HFGraphGUI
+from hf_gui_history import HFHistoryGUI
 import pickle
-import subprocess
+import hf_protocol
+import data_sync
+import os
+import queue
 import sys
 
+# most samples waiting to be shown; when the UI falls behind, the oldest are dropped
+SAMPLE_QUEUE_SIZE = 500
+
+# how often the UI shows the samples that have arrived, in milliseconds
+UI_UPDATE_MS = 50
+
 class HFMainGUI():
 
     def __init__(self):
@@ -77,6 +87,10 @@ class HFMainGUI():
         # initalized for class scope; allows graph to be called or not called as needed
         self.graph_enabled = False
         self.settings_open = False
+        self.history_open = False
+
+        # samples received from the RPi, waiting to be shown by show_samples on the Tk thread
+        self.sample_queue = queue.Queue(maxsize = SAMPLE_QUEUE_SIZE)
 
         # set all initial text to '---'
         self.tx1_text = tkinter.StringVar()
@@ -291,8 +305,59 @@ class HFMainGUI():
             command = self.graph_pressed)
         self.graph_button.grid(row = 0, column = 2, padx = self.x_padding-15, pady = self.y_padding)
 
+        # button to browse recorded data
+        self.history_button = tkinter.Button(self.program_control_box, text = "View History", font = (None,self.font_size), \
+            command = self.history_pressed)
+        self.history_button.grid(row = 0, column = 3, padx = self.x_padding-15, pady = self.y_padding)
+
+        self.form.after(UI_UPDATE_MS, self.show_samples)
+
         self.form.mainloop()
 
+    def queue_sample(self, sample):
+        '''
+        Called from the thread receiving samples. Queues a sample to be shown, dropping the
+        oldest waiting sample if the UI has fallen too far behind.
+        '''
+
+        while True:
+            try:
+                self.sample_queue.put_nowait(sample)
+                return
+            except queue.Full:
+                try:
+                    self.sample_queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def show_samples(self):
+        '''
+        Runs on the Tk thread every UI_UPDATE_MS. Takes the samples that have arrived since
+        the last call, shows the newest one in the labels and adds them all to the graph,
+        which is drawn at most once.
+        '''
+
+        samples = []
+        # only take what was already waiting, so a fast stream can't keep this from returning
+        for _ in range(self.sample_queue.qsize()):
+            try:
+                samples.append(self.sample_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        if samples:
+            try:
+                output_array, total_transmitted, total_reflected = samples[-1]
+                self.update_ui(output_array, total_transmitted, total_reflected)
+
+                # if the graph window is visible, graph the results
+                if self.graph_enabled:
+                    self.graph_window.update_graph([sample[0] for sample in samples])
+            except Exception as e:
+                print("Error showing samples: " + str(e))
+
+        self.form.after(UI_UPDATE_MS, self.show_samples)
+
     def update_ui(self, output_array, total_transmitted, total_reflected):
         '''
         Updates UI elements based on the output from take_data.py. Sets the text
@@ -546,21 +611,42 @@ class HFMainGUI():
         args = [cmd, self.timeout_secs_variable.get(), \
         self.sample_time_variable.get(), self.decoder_pins, self.transmitted_ip_variable.get(), \
         self.reflected_ip_variable.get(), self.transmitted_enabled_variable.get(), \
-        self.reflect_enabled_variable.get()]
+        self.reflect_enabled_variable.get(), self.graph_history_secs()]
+
+        # transfer the arguments as a command frame and send them
+        sock.sendall(hf_protocol.encode_command(args))
 
-        # transfer the arguments via a pickle file and send them
-        pickled_args = pickle.dumps(args)
-        sock.sendall(pickled_args)
+        decoder = hf_protocol.FrameDecoder()
 
         # do while indicating recording
         while self.monitor_title.get() == 'Stop Monitoring' or self.take_data_title.get() == 'Stop Recording':
 
-            # receive data file from the server
-            received = sock.recv(1024)
-
-            # unpack data file into array
+            # receive the next sample from the server
             try:
-                output_array = pickle.loads(received)
+                frame = hf_protocol.recv_frame(sock, decoder)
+            except socket.timeout:
+                continue
+            except hf_protocol.ProtocolError:
+                print("The data stream from the RPi was corrupted. Stopping.")
+                frame = None
+
+            # the server closed the connection
+            if frame is None:
+                self.monitor_title.set('Monitor Power')
+                self.take_data_title.set('Record Power')
+                break
+
+            # recent samples sent by the RPi before the live data
+            if frame[0] == hf_protocol.FRAME_BACKFILL:
+                self.load_graph_backfill(hf_protocol.decode_backfill(frame[1]))
+                continue
+
+            if frame[0] != hf_protocol.FRAME_SAMPLE:
+                continue
+
+            # unpack the sample into an array
+            try:
+                output_array = hf_protocol.decode_sample(frame[1])
 
                 # convert the power to the requested units
                 total_power = self.convert_units(output_array)
@@ -569,22 +655,81 @@ class HFMainGUI():
                 total_transmitted = total_power[0]
                 total_reflected = total_power[1]
 
-                # update the UI according to the power and units
-                ui_thread = threading.Thread(target = self.update_ui, args = [output_array, \
-                    total_transmitted, total_reflected])
-                ui_thread.start()
-
-                # if the graph window is visible, graph the results
-                if self.graph_enabled:
-                    graph_thread = threading.Thread(target = self.graph_window.update_graph, args = [output_array])
-                    graph_thread.start()
-            except EOFError:
-                print("The previous data output was corrupted. Only the last output was corrupted; future outputs should be successful.")
-                if cmd == "rec_all":
-                    print("The data array was written to file successfully.")
+                # the UI and graph are updated on the Tk thread by show_samples
+                self.queue_sample((output_array, total_transmitted, total_reflected))
             except:
                 pass
 
+        sock.close()
+
+    def graph_history_secs(self):
+        '''
+        Returns how many seconds of recent samples the graph window can show, or 0 if
+        the graph window isn't open.
+        '''
+
+        if not self.graph_enabled:
+            return 0
+
+        try:
+            return float(self.graph_window.time_shown_variable.get())
+        except:
+            return 0
+
+    def load_graph_backfill(self, output_arrays):
+        '''
+        Converts samples from the RPi's recent history to the current units and puts
+        them on the graph.
+        '''
+
+        if not self.graph_enabled or not output_arrays:
+            return
+
+        for output_array in output_arrays:
+            self.convert_units(output_array)
+
+        self.graph_window.load_backfill(output_arrays)
+
+    def request_graph_backfill(self):
+        '''
+        Asks the RPi for the samples the graph window has room for, so a graph opened
+        while monitoring doesn't start empty.
+        '''
+
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(3)
+            sock.connect((self.rpi_ip_variable.get(), 12345))
+            sock.sendall(hf_protocol.encode_command(['backfill', self.graph_history_secs()]))
+            frame = hf_protocol.recv_frame(sock, hf_protocol.FrameDecoder())
+            sock.close()
+        except Exception as e:
+            print("Error getting recent samples from the RPi: " + str(e))
+            return
+
+        if frame is not None and frame[0] == hf_protocol.FRAME_BACKFILL:
+            self.load_graph_backfill(hf_protocol.decode_backfill(frame[1]))
+
+    def send_command(self, args):
+        '''
+        Sends a single command to the Raspberry Pi and waits for its status reply.
+        Returns True if the command succeeded.
+        '''
+
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(3)
+            sock.connect((self.rpi_ip_variable.get(), 12345))
+            sock.sendall(hf_protocol.encode_command(args))
+            frame = hf_protocol.recv_frame(sock, hf_protocol.FrameDecoder())
+            sock.close()
+        except Exception as e:
+            print("Error sending " + args[0] + " to the RPi: " + str(e))
+            return False
+
+        return frame is not None and frame[0] == hf_protocol.FRAME_STATUS and \
+            hf_protocol.decode_status(frame[1]) == 'success'
+
     def monitor_power_pressed(self):
         '''
         Called when the "Record Power" button is pressed. Gets power from each power meter
@@ -622,10 +767,14 @@ class HFMainGUI():
             t = threading.Thread(target = self.get_power_array, args = ['rec_all'])
             t.start()
 
-        # if already recording or monitoring, do nothing or stop monitoring
-        else:
+        # if already recording, stop recording on the RPi
+        elif self.take_data_title.get() == 'Stop Recording':
             self.take_data_title.set('Record Power')
 
+            # recording carries on without a client, so it has to be stopped explicitly
+            t = threading.Thread(target = self.send_command, args = [['stop_rec']])
+            t.start()
+
     def graph_pressed(self):
         '''
         Called when the graph button is pressed. Opens a graph window.
@@ -645,6 +794,11 @@ class HFMainGUI():
             # call graph_closed on close to ensure proper closure
             self.graph_window.graph_view.protocol("WM_DELETE_WINDOW", self.graph_closed)
 
+            # fill the graph with what the RPi has seen recently
+            if self.monitor_title.get() == 'Stop Monitoring' or self.take_data_title.get() == 'Stop Recording':
+                t = threading.Thread(target = self.request_graph_backfill)
+                t.start()
+
     def graph_closed(self):
         '''
         Called when the graph window is closed.
@@ -663,19 +817,48 @@ class HFMainGUI():
 
         
 
+    def history_pressed(self):
+        '''
+        Called when the history button is pressed. Opens a window for browsing recorded data.
+        '''
+
+        # if a history window is already open, bring it into the top view but don't open a new window
+        if self.history_open:
+            self.history_window.history_view.focus()
+        else:
+            self.history_window = HFHistoryGUI(self)
+            self.history_open = True
+            self.history_window.history_view.protocol("WM_DELETE_WINDOW", self.history_closed)
+
+    def history_closed(self):
+        '''
+        Called when the history window is closed.
+        '''
+
+        self.history_open = False
+        self.history_window.close()
+
     def get_data_pressed(self):
+        '''
+        Copies any data recorded since the last copy from the Raspberry Pi into the
+        "data" folder in the local data filepath.
+        '''
 
-        tkinter.messagebox.showwarning(
-                    "Check Terminal",
-                    "Check the terminal.\n\nYou may need to enter the root password and the " + \
-                    "Raspberry Pi password (\"raspberry\" by default)."
-                )
+        local_dir = os.path.join(self.data_filepath.get(), "data")
 
-        subprocess.call(['sudo', 'scp', '-r', "pi@" + self.rpi_ip_variable.get()+":/home/pi/hfmon/data", self.data_filepath.get()])
+        try:
+            files_updated, bytes_received = data_sync.sync_data(self.rpi_ip_variable.get(), local_dir)
+        except Exception as e:
+            tkinter.messagebox.showwarning(
+                    "Copy Error",
+                    "Error copying data from the Raspberry Pi:\n\n" + str(e)
+                )
+            return
 
-        tkinter.messagebox.showwarning(
+        tkinter.messagebox.showinfo(
                     "Data Copied",
-                    "Check the terminal and the local file location to ensure data was successfully copied."
+                    "Updated " + str(files_updated) + " files (" + str(bytes_received) + " bytes) in " + \
+                    local_dir + "."
                 )
 
     def settings_pressed(self):
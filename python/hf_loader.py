@@ -0,0 +1,336 @@
+#!usr/bin/env python3
+
+'''
+	File: hf_loader.py
+	Description: Shared loader for the daily .data files. Works out the layout of each
+		file once (how many header lines it has and which column holds each channel,
+		since older files list the channels as Tx1, Rx1, Tx2, Rx2, ...) and loads the rows
+		into NumPy arrays with the channels in Tx1..Tx6, Rx1..Rx6 order. Finding the
+		layout doesn't need NumPy, so the RPi and error_filter.py can use it too.
+	Author: Lucas McDonald
+	Date created: October 18, 2026
+	Date modified: October 18, 2026
+	Python version: 3.6.1
+'''
+
+from collections import OrderedDict
+import csv
+import os
+import threading
+from sample_log import CHANNEL_NAMES, TIMEOUT_STR, seconds_from_str, text_column_order
+
+try:
+	import numpy
+except:
+	# only needed to load the rows, not to find the layout
+	pass
+
+# most bytes read looking for the end of the header
+MAX_HEADER_BYTES = 1 << 16
+
+# number of files whose arrays are kept in memory by load_channels
+CHANNEL_CACHE_SIZE = 8
+
+class Layout():
+	'''
+	Layout of a data file.
+		header: the lines before the first data row, split into fields
+		header_rows: the number of those lines
+		data_start: the offset of the first data row
+		columns: the column of each channel, in Tx1..Tx6, Rx1..Rx6 order
+	'''
+
+	def __init__(self, header, data_start, columns):
+		self.header = header
+		self.header_rows = len(header)
+		self.data_start = data_start
+		self.columns = columns
+
+	def interleaved(self):
+		return self.columns != list(range(1, 13))
+
+def read_layout(path):
+	'''
+	Reads the layout of a data file. The header is every line at the top of the file that
+	starts with '#' or is blank. Returns None if the file doesn't have a complete data row
+	yet, since the header may not be finished.
+	'''
+
+	with open(path, 'rb') as f:
+		data = f.read(MAX_HEADER_BYTES)
+
+	header = []
+	columns = list(range(1, 13))
+	offset = 0
+
+	while True:
+		line_end = data.find(b'\n', offset)
+		if line_end == -1:
+			return None
+
+		line = data[offset:line_end + 1]
+		if not (line.startswith(b'#') or not line.strip()):
+			break
+
+		row = next(csv.reader([line.decode('ascii', 'replace')], delimiter=','), [])
+		if line.startswith(b'#HH'):
+			columns = text_column_order(row)
+		header.append(row)
+		offset = line_end + 1
+
+	return Layout(header, offset, columns)
+
+# layouts of the files seen so far, by path, with the file's (device, inode)
+layouts = {}
+layouts_lock = threading.Lock()
+
+def detect_layout(path):
+	'''
+	Returns the Layout of a data file, reading it the first time the file is seen.
+	Returns None if the file doesn't have a data row yet.
+	'''
+
+	stat = os.stat(path)
+	with layouts_lock:
+		cached = layouts.get(path)
+	if cached is not None and cached[0] == (stat.st_dev, stat.st_ino):
+		return cached[1]
+
+	layout = read_layout(path)
+	if layout is not None:
+		with layouts_lock:
+			layouts[path] = ((stat.st_dev, stat.st_ino), layout)
+	return layout
+
+class DayData():
+	'''
+	One data file loaded into arrays.
+		header: the lines before the first data row, split into fields
+		columns: the column of each channel, in Tx1..Tx6, Rx1..Rx6 order
+		timeouts: bool array, True where the meter timed out, in the file's column order
+		values: float array of the powers, NaN for timeouts; parsed by load_values()
+	The rows themselves are kept either as a uint8 array of the bytes of each row, when
+	every row has the same layout (which is how take_data writes them), or as a string
+	array of the fields of each row. cells(col) returns a view of one column either way.
+	'''
+
+	def __init__(self, layout, block = None, field_bounds = None, fields = None):
+		self.header = layout.header
+		self.columns = layout.columns
+		self.block = block
+		self.field_bounds = field_bounds
+		self.fields = fields
+
+		self.timeouts = numpy.zeros((self.row_count(), 12), dtype = bool)
+		for col in range(1, 13):
+			self.timeouts[:, col - 1] = self.column_timeouts(col)
+		self.values = None
+
+	def row_count(self):
+		return len(self.block) if self.block is not None else len(self.fields)
+
+	def cells(self, col):
+		'''
+		Returns a view of column col: a (rows x width) array of bytes, or an array of strings.
+		'''
+
+		if self.block is not None:
+			start, end = self.field_bounds[col]
+			return self.block[:, start:end]
+		return self.fields[:, col]
+
+	def column_timeouts(self, col):
+		if self.block is not None:
+			return (self.cells(col) == ord(' ')).all(axis = 1)
+		return self.cells(col) == TIMEOUT_STR
+
+	def seconds(self):
+		'''
+		Returns the time of each row in seconds since midnight, NaN where it can't be read.
+		'''
+
+		cells = self.cells(0)
+		if self.block is not None and cells.shape[1] == 12:
+			digits = cells.astype(numpy.int64) - ord('0')
+			# HH:MM:SS.SSS
+			if (cells[:, [2, 5]] == ord(':')).all() and (cells[:, 8] == ord('.')).all() and \
+				((digits[:, [0, 1, 3, 4, 6, 7, 9, 10, 11]] >= 0) & (digits[:, [0, 1, 3, 4, 6, 7, 9, 10, 11]] <= 9)).all():
+				return digits[:, [0, 1, 3, 4, 6, 7, 9, 10, 11]].dot( \
+					[36000, 3600, 600, 60, 10, 1, 0.1, 0.01, 0.001])
+			cells = numpy.array([bytes(row).decode('ascii', 'replace') for row in cells])
+
+		times = numpy.full(len(cells), numpy.nan)
+		for row, time_str in enumerate(cells):
+			try:
+				times[row] = seconds_from_str(time_str)
+			except ValueError:
+				pass
+		return times
+
+	def load_values(self):
+		if self.values is None:
+			self.values = numpy.full((self.row_count(), 12), numpy.nan)
+			for col in range(1, 13):
+				self.values[:, col - 1] = self.parse_column(col)
+		return self.values
+
+	def channel_values(self):
+		'''
+		Returns the powers with the channels in Tx1..Tx6, Rx1..Rx6 order.
+		'''
+
+		return self.load_values()[:, [col - 1 for col in self.columns]]
+
+	def parse_column(self, col):
+		'''
+		Returns the values of column col as floats, with NaN for timeouts.
+		'''
+
+		cells = self.cells(col)
+		timeouts = self.timeouts[:, col - 1]
+
+		if self.block is not None:
+			digits = cells.astype(numpy.int64) - ord('0')
+			if ((digits >= 0) & (digits <= 9)).all(axis = 1)[~timeouts].all():
+				# the powers are whole numbers of watts padded with zeros
+				values = digits.dot(10 ** numpy.arange(cells.shape[1] - 1, -1, -1)).astype(float)
+				values[timeouts] = numpy.nan
+				return values
+			cells = numpy.array([bytes(row).decode('ascii', 'replace') for row in cells])
+
+		values = numpy.full(len(cells), numpy.nan)
+		for row in numpy.flatnonzero(~timeouts):
+			try:
+				values[row] = float(cells[row])
+			except ValueError:
+				pass
+		return values
+
+	def set_values(self, col, values):
+		'''
+		Writes values (watts, NaN for a timeout) into column col the way take_data does.
+		'''
+
+		cells = self.cells(col)
+		missing = numpy.isnan(values)
+		powers = numpy.nan_to_num(values).astype(numpy.int64)
+
+		if self.block is not None and (powers < 10 ** cells.shape[1]).all() and (powers >= 0).all():
+			places = 10 ** numpy.arange(cells.shape[1] - 1, -1, -1)
+			cells[:] = (powers.reshape(-1, 1) // places % 10 + ord('0')).astype(numpy.uint8)
+			cells[missing] = ord(' ')
+			return
+
+		if self.block is not None:
+			# doesn't fit in the fixed layout
+			self.to_fields()
+			cells = self.cells(col)
+		cells[:] = numpy.where(missing, TIMEOUT_STR, numpy.char.zfill(powers.astype(str), 6))
+
+	def to_fields(self):
+		lines = self.block.tobytes().decode('ascii', 'replace').split('\n')[:-1]
+		self.fields = numpy.array([line.split(',') for line in lines], dtype = object)
+		self.block = None
+
+def fixed_layout(data):
+	'''
+	If every row in data (bytes ending with a newline) has the same length with the commas
+	in the same places, returns the rows as a (rows x length) uint8 array and the (start,
+	end) of each field. Otherwise returns None, None.
+	'''
+
+	row_length = data.find(b'\n') + 1
+	if row_length <= 0 or len(data) % row_length or b'\r' in data or b'"' in data:
+		return None, None
+
+	block = numpy.frombuffer(data, dtype = numpy.uint8).reshape(-1, row_length).copy()
+	commas = numpy.flatnonzero(block[0] == ord(','))
+	if len(commas) < 13 or not (block[:, -1] == ord('\n')).all() or \
+		not ((block == ord(',')).sum(axis = 1) == len(commas)).all() or \
+		not (block[:, commas] == ord(',')).all():
+		return None, None
+
+	starts = [0] + list(commas + 1)
+	ends = list(commas) + [row_length - 1]
+	return block, list(zip(starts, ends))
+
+def load_day(path, drop_short_rows = False):
+	'''
+	Loads a data file. Returns a DayData, or None if the file has no data rows or they
+	don't all have the same number of fields (e.g. a row cut short by a power failure).
+	If drop_short_rows is set, rows with fewer fields than most rows are left out instead.
+	'''
+
+	layout = detect_layout(path)
+	if layout is None:
+		return None
+
+	with open(path, 'rb') as f:
+		f.seek(layout.data_start)
+		data = f.read()
+
+	if not data:
+		return None
+	# older files don't end with a newline
+	if not data.endswith(b'\n'):
+		data += b'\n'
+
+	block, field_bounds = fixed_layout(data)
+	if block is not None:
+		return DayData(layout, block = block, field_bounds = field_bounds)
+
+	rows = list(csv.reader(data.decode('ascii', 'replace').splitlines(), delimiter=','))
+	if drop_short_rows:
+		lengths = [len(row) for row in rows]
+		row_length = max(set(lengths), key = lengths.count)
+		rows = [row[:row_length] for row in rows if len(row) >= row_length]
+	if not rows or any(len(row) != len(rows[0]) for row in rows) or len(rows[0]) < 13:
+		return None
+	return DayData(layout, fields = numpy.array(rows, dtype = object))
+
+# arrays returned by load_channels, by path, with the file's size and modification time
+channel_cache = OrderedDict()
+channel_cache_lock = threading.Lock()
+
+def load_channels(path):
+	'''
+	Returns (times, values) for a data file: the time of each row in seconds since
+	midnight, in order, and a (rows x 12) array of the powers in Tx1..Tx6, Rx1..Rx6
+	order with NaN for timeouts. Rows cut short or with an unreadable time are left
+	out. The arrays are read-only and are kept for the files loaded most recently, so
+	loading a file again costs nothing until it changes. Returns None if the file can't
+	be read.
+	'''
+
+	stat = os.stat(path)
+	key = (stat.st_size, stat.st_mtime_ns)
+
+	with channel_cache_lock:
+		cached = channel_cache.get(path)
+		if cached is not None and cached[0] == key:
+			channel_cache.move_to_end(path)
+			return cached[1]
+
+	day = load_day(path, drop_short_rows = True)
+	if day is None:
+		return None
+
+	times = day.seconds()
+	values = day.channel_values()
+
+	readable = ~numpy.isnan(times)
+	times = times[readable]
+	values = values[readable]
+	order = numpy.argsort(times, kind = 'mergesort')
+	times = times[order]
+	values = values[order]
+	times.flags.writeable = False
+	values.flags.writeable = False
+
+	with channel_cache_lock:
+		channel_cache[path] = (key, (times, values))
+		channel_cache.move_to_end(path)
+		while len(channel_cache) > CHANNEL_CACHE_SIZE:
+			channel_cache.popitem(last = False)
+
+	return times, values
@@ -0,0 +1,326 @@
+#!usr/bin/env python3
+
+'''
+    File: hf_protocol.py
+    Description: Wire format used between the RPi server and the GUI/terminal clients.
+        Every message is a frame: an 8-byte header (magic, protocol version, frame type,
+        payload length) followed by a struct-packed payload. FrameDecoder reassembles
+        frames from however the bytes arrive on the socket.
+    Author: Lucas McDonald
+    Date created: October 18, 2026
+    Date modified: October 18, 2026
+    Python version: 3.6.1
+'''
+
+import math
+import struct
+from sample_log import CHANNEL_NAMES, TIMEOUT_STR, seconds_from_str, str_from_seconds
+
+MAGIC = b'HF'
+VERSION = 1
+
+HEADER_STRUCT = struct.Struct('!2sBBI')
+HEADER_SIZE = HEADER_STRUCT.size
+
+# largest payload accepted from the network
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+# frame types
+FRAME_COMMAND = 1
+FRAME_SAMPLE = 2
+FRAME_STATUS = 3
+FRAME_BACKFILL = 4
+FRAME_FILE_LIST = 5
+FRAME_FILE_CHUNK = 6
+FRAME_QUERY_RESULT = 7
+
+'''
+Sample payload: time the sample started in seconds since midnight, Tx1..Tx6 and
+Rx1..Rx6 in dBm (NaN where the meter timed out), and the time taken for the cycle.
+'''
+SAMPLE_STRUCT = struct.Struct('!d12ff')
+
+class ProtocolError(ValueError):
+    pass
+
+def pack_frame(frame_type, payload):
+    return HEADER_STRUCT.pack(MAGIC, VERSION, frame_type, len(payload)) + payload
+
+class FrameDecoder():
+    '''
+    Incremental decoder. Bytes from the socket are passed to feed() as they arrive,
+    and complete frames are taken out with next_frame().
+    '''
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+
+    def next_frame(self):
+        '''
+        Returns the next (frame type, payload) or None if a whole frame hasn't arrived yet.
+        '''
+
+        if len(self.buffer) < HEADER_SIZE:
+            return None
+
+        magic, version, frame_type, length = HEADER_STRUCT.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ProtocolError("bad frame header")
+        if version != VERSION:
+            raise ProtocolError("unsupported protocol version " + str(version))
+        if length > MAX_PAYLOAD:
+            raise ProtocolError("frame too large")
+
+        end = HEADER_SIZE + length
+        if len(self.buffer) < end:
+            return None
+
+        payload = bytes(self.buffer[HEADER_SIZE:end])
+        del self.buffer[:end]
+        return frame_type, payload
+
+def recv_frame(sock, decoder):
+    '''
+    Blocks until a whole frame has been received on sock. Returns (frame type, payload),
+    or None if the connection was closed.
+    '''
+
+    while True:
+        frame = decoder.next_frame()
+        if frame is not None:
+            return frame
+
+        data = sock.recv(65536)
+        if not data:
+            return None
+        decoder.feed(data)
+
+'''
+Commands are lists of values, e.g.
+['mon_all', timeout, sample time, decoder pins, transmitted ip, reflected ip, trans enabled, ref enabled].
+Each value is written as a one-byte type tag followed by its data.
+'''
+
+# deepest nesting of lists accepted from the network
+MAX_DEPTH = 8
+
+def encode_values(values):
+    out = [struct.pack('!H', len(values))]
+
+    for value in values:
+        if value is None:
+            out.append(b'n')
+        elif isinstance(value, bool):
+            out.append(b'b' + struct.pack('!?', value))
+        elif isinstance(value, int):
+            out.append(b'i' + struct.pack('!q', value))
+        elif isinstance(value, float):
+            out.append(b'f' + struct.pack('!d', value))
+        elif isinstance(value, str):
+            encoded = value.encode('utf-8')
+            out.append(b's' + struct.pack('!I', len(encoded)) + encoded)
+        elif isinstance(value, bytes):
+            out.append(b'y' + struct.pack('!I', len(value)) + value)
+        elif isinstance(value, (list, tuple)):
+            out.append(b'l' + encode_values(value))
+        else:
+            raise TypeError("can't encode " + type(value).__name__)
+
+    return b''.join(out)
+
+def decode_values(payload, offset = 0, depth = 0):
+    '''
+    Returns (values, offset just past the values).
+    '''
+
+    if depth > MAX_DEPTH:
+        raise ProtocolError("values nested too deeply")
+
+    try:
+        count, = struct.unpack_from('!H', payload, offset)
+        offset += 2
+
+        values = []
+        for _ in range(count):
+            tag = payload[offset:offset + 1]
+            offset += 1
+
+            if tag == b'n':
+                values.append(None)
+            elif tag == b'b':
+                values.append(struct.unpack_from('!?', payload, offset)[0])
+                offset += 1
+            elif tag == b'i':
+                values.append(struct.unpack_from('!q', payload, offset)[0])
+                offset += 8
+            elif tag == b'f':
+                values.append(struct.unpack_from('!d', payload, offset)[0])
+                offset += 8
+            elif tag == b's' or tag == b'y':
+                length, = struct.unpack_from('!I', payload, offset)
+                offset += 4
+                data = payload[offset:offset + length]
+                if len(data) != length:
+                    raise ProtocolError("truncated value")
+                values.append(data.decode('utf-8') if tag == b's' else data)
+                offset += length
+            elif tag == b'l':
+                value, offset = decode_values(payload, offset, depth + 1)
+                values.append(value)
+            else:
+                raise ProtocolError("unknown value type " + repr(tag))
+
+    except struct.error:
+        raise ProtocolError("truncated value")
+
+    return values, offset
+
+def encode_command(args):
+    return pack_frame(FRAME_COMMAND, encode_values(args))
+
+def decode_command(payload):
+    return decode_values(payload)[0]
+
+def encode_status(status):
+    return pack_frame(FRAME_STATUS, status.encode('utf-8'))
+
+def decode_status(payload):
+    return payload.decode('utf-8')
+
+def sample_values(output_array):
+    '''
+    Converts an output array from take_data,
+    [time started, Tx1, ..., Tx6, Rx1, ..., Rx6, time taken], into the numbers sent in a frame.
+    '''
+
+    values = [seconds_from_str(output_array[0])]
+
+    for element in output_array[1:13]:
+        try:
+            values.append(float(element))
+        except ValueError:
+            values.append(float('nan'))
+
+    try:
+        values.append(float(output_array[-1]))
+    except ValueError:
+        values.append(float('nan'))
+
+    return values
+
+def output_array_from_values(values):
+    '''
+    Converts the numbers from a sample frame back into the output array used by the clients.
+    Powers are given to three decimal places and timeouts are '      '.
+    '''
+
+    output_array = [str_from_seconds(values[0])]
+
+    for power in values[1:13]:
+        if math.isnan(power):
+            output_array.append(TIMEOUT_STR)
+        else:
+            output_array.append("%.3f" % power)
+
+    output_array.append("%.5f" % values[13])
+
+    return output_array
+
+def encode_sample(output_array):
+    return pack_frame(FRAME_SAMPLE, SAMPLE_STRUCT.pack(*sample_values(output_array)))
+
+def decode_sample(payload):
+    return output_array_from_values(SAMPLE_STRUCT.unpack(payload))
+
+'''
+Backfill payload: the number of samples followed by that many sample payloads,
+oldest first. Sent once to a client that asks for recent history.
+'''
+
+def encode_backfill(samples):
+    '''
+    samples is a list of the numbers from sample_values(), oldest first.
+    '''
+
+    payload = [struct.pack('!I', len(samples))]
+    for values in samples:
+        payload.append(SAMPLE_STRUCT.pack(*values))
+
+    return pack_frame(FRAME_BACKFILL, b''.join(payload))
+
+def decode_backfill(payload):
+    '''
+    Returns the samples as a list of output arrays, oldest first.
+    '''
+
+    count, = struct.unpack_from('!I', payload)
+    if len(payload) != 4 + count * SAMPLE_STRUCT.size:
+        raise ProtocolError("bad backfill frame")
+
+    return [output_array_from_values(values) for values in SAMPLE_STRUCT.iter_unpack(payload[4:])]
+
+'''
+Data file sync. The file list payload is a value list of [name, size, mtime] entries.
+Each file chunk payload is a value list of [name, offset, zlib-compressed bytes], where
+offset is the position in the file the bytes start at.
+'''
+
+def encode_file_list(entries):
+    return pack_frame(FRAME_FILE_LIST, encode_values(entries))
+
+def decode_file_list(payload):
+    return decode_values(payload)[0]
+
+def encode_file_chunk(name, offset, compressed):
+    return pack_frame(FRAME_FILE_CHUNK, encode_values([name, offset, compressed]))
+
+def decode_file_chunk(payload):
+    name, offset, compressed = decode_values(payload)[0]
+    return name, offset, compressed
+
+'''
+Query results. The payload starts with the date (YYYYMMDD), the channel mask and the
+number of rows. Each row is the time in seconds since midnight followed by the power in
+watts of each channel in the mask (bit 0 is Tx1, bit 5 is Tx6, bit 6 is Rx1, bit 11 is Rx6),
+with NaN for timeouts.
+'''
+
+QUERY_HEADER_STRUCT = struct.Struct('!IHI')
+
+def mask_channels(mask):
+    '''
+    Returns the channel numbers (0-11) selected by a channel mask.
+    '''
+
+    return [channel for channel in range(12) if mask & (1 << channel)]
+
+def query_row_struct(mask):
+    return struct.Struct('!d%df' % len(mask_channels(mask)))
+
+def encode_query_result(todays_date, mask, rows):
+    '''
+    rows is a list of [time, power for each channel in the mask].
+    '''
+
+    row_struct = query_row_struct(mask)
+    payload = [QUERY_HEADER_STRUCT.pack(int(todays_date), mask, len(rows))]
+    for row in rows:
+        payload.append(row_struct.pack(*row))
+
+    return pack_frame(FRAME_QUERY_RESULT, b''.join(payload))
+
+def decode_query_result(payload):
+    '''
+    Returns (date as YYYYMMDD, mask, rows).
+    '''
+
+    todays_date, mask, count = QUERY_HEADER_STRUCT.unpack_from(payload)
+    row_struct = query_row_struct(mask)
+    if len(payload) != QUERY_HEADER_STRUCT.size + count * row_struct.size:
+        raise ProtocolError("bad query result frame")
+
+    rows = [list(row) for row in row_struct.iter_unpack(payload[QUERY_HEADER_STRUCT.size:])]
+    return str(todays_date), mask, rows
@@ -4,41 +4,67 @@
     File: hf_server_socket.py
     Description: File to be run on the RPi. Handles send/receive requests to
         read the power meters/write data. Server is hosted on port 12345.
+        Any number of clients can be connected; they all receive samples from
+        the same acquisition loop. Recording runs in the background and is
+        resumed at boot from the saved recording settings.
     Author: Lucas McDonald
     Date created: June 26, 2017
-    Date modified: August 2, 2017
+    Date modified: October 18, 2026
     Python version: 3.6.1
 '''
 
 import socketserver
-import socket
 import set_switches
 import pickle
-import time
-import threading
-import take_data
+import hf_protocol
+import data_writer
+import data_index
+from acquisition_loop import AcquisitionLoop
+import os
+import zlib
+from datetime import datetime, timedelta
 import sys
 
+# uncompressed size of each chunk sent when syncing data files
+SYNC_CHUNK_SIZE = 256 * 1024
+
+# only the day files are synced: they are only ever appended to. The .idx and .hfsl
+# files can be rewritten or truncated, so resuming them from the local size would
+# corrupt the copies
+SYNC_SUFFIX = '.data'
+
+# rows sent in each query result frame
+QUERY_ROWS_PER_FRAME = 4096
+
+# shared by every client connection
+acquisition = AcquisitionLoop()
+
 class RPiServer(socketserver.BaseRequestHandler):
 
     def receive_data(self):
-        # receive data file from the server
+        '''
+        Receives the command frame sent by the client and returns it as an array.
+        '''
+
         try:
+            frame = hf_protocol.recv_frame(self.request, hf_protocol.FrameDecoder())
+            if frame is None or frame[0] != hf_protocol.FRAME_COMMAND:
+                print("No data received")
+                return ["none"]
 
-            received = self.request.recv(1024).strip()
-            print(str(received))
+            data_arr = hf_protocol.decode_command(frame[1])
+        except (OSError, hf_protocol.ProtocolError, UnicodeDecodeError) as e:
+            print("Error receiving command: " + str(e))
+            return ["none"]
 
-            # unpack data file into array
-            output_array = pickle.loads(received)
-            for element in output_array:
-                print(element)
+        if not data_arr:
+            print("Empty command received")
+            return ["none"]
 
-            return received
+        for element in data_arr:
+            print(element)
 
-        except EOFError:
-            print("No data received")
-            return 
-        
+        return data_arr
 
     def handle(self):
         '''
@@ -46,20 +72,25 @@ class RPiServer(socketserver.BaseRequestHandler):
         calls the approprite method.
         '''
 
-        # put the data from the transmitted pickle file into an array
-        self.data = self.receive_data()
+        # put the command from the client into an array
+        self.data_arr = self.receive_data()
         self.sock_open = True
 
-        try:
-            self.data_arr = pickle.loads(self.data)
-        except:
-            self.data_arr = ["none"]
-
         # call the appropriate method from the command. The command is sent in the 0th element of the array.
         if(self.data_arr[0] == 'mon_all'):
             self.rpi_monitor()
         elif(self.data_arr[0] == 'rec_all'):
             self.rpi_record()
+        elif(self.data_arr[0] == 'backfill'):
+            self.rpi_backfill()
+        elif(self.data_arr[0] == 'sync_list'):
+            self.rpi_sync_list()
+        elif(self.data_arr[0] == 'sync_fetch'):
+            self.rpi_sync_fetch()
+        elif(self.data_arr[0] == 'query'):
+            self.rpi_query()
+        elif(self.data_arr[0] == 'stop_rec'):
+            self.rpi_stop_record()
         elif(self.data_arr[0] == 'set_switch'):
             self.rpi_switch()
         else:
@@ -67,129 +98,159 @@ class RPiServer(socketserver.BaseRequestHandler):
         print("Request handled")
 
     def send_output(self, output_array):
-        # send the array as a pickle file
-        self.pickled_output = pickle.dumps(self.output_array)
+        # send the array as a sample frame
         try:
-            self.request.sendall(self.pickled_output)
+            self.request.sendall(hf_protocol.encode_sample(output_array))
         except:
             self.sock_open = False
         return
 
-        
+    def stream_samples(self):
+        '''
+        Subscribes to the acquisition loop and sends each sample to the client until the
+        client disconnects.
+        '''
+
+        # optional ninth argument: seconds of recent history to send first
+        backfill_secs = 0
+        if len(self.data_arr) > 8:
+            backfill_secs = float(self.data_arr[8])
+
+        subscriber, backfill = acquisition.subscribe(self.data_arr[1:8], backfill_secs)
+
+        try:
+            if backfill:
+                self.request.sendall(hf_protocol.encode_backfill(backfill))
+
+            while self.sock_open:
+                output_array = subscriber.get(timeout = 1.0)
+                if output_array is None:
+                    # the loop stopped
+                    if subscriber.closed:
+                        break
+                    continue
+
+                self.send_output(output_array)
+
+        finally:
+            acquisition.unsubscribe(subscriber)
+
     def rpi_monitor(self):
         '''
         Monitors the power from the power meters and sends the data to the client.
         '''
 
-        # put the power meters into fast sampling mode
-        take_data.open_PM_URL("http://" + str(self.data_arr[4]) + '/:MODE:1', 2.0, True)
-        take_data.open_PM_URL("http://" + str(self.data_arr[5]) + '/:MODE:1', 2.0, True)
-
-        pi_to_tx_tn = []
-        pi_to_rx_tn = []
-
-        if(self.data_arr[6]):
-            pi_to_tx_tn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            pi_to_tx_tn.settimeout(.5)
-            # connect to server
-            pi_to_tx_tn.connect((str(self.data_arr[4]), 23))
-            # clear the input to the telnet console (tends to start with some input)
-            pi_to_tx_tn.sendall(b':POWER?\n\r')
-
-        if(self.data_arr[7]):
-            pi_to_rx_tn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            pi_to_rx_tn.settimeout(.5)
-            # connect to server
-            pi_to_rx_tn.connect((str(self.data_arr[5]), 23))
-            # clear the input to the telnet console (tends to start with some input)
-            pi_to_rx_tn.sendall(b':POWER?\n\r')
-
-        while self.sock_open:
-
-            try:
-                # get the output from monitor_power
-                self.output_array = take_data.monitor_power(self.data_arr[1], self.data_arr[2], \
-                    self.data_arr[3], pi_to_tx_tn, pi_to_rx_tn, self.data_arr[6], self.data_arr[7])
-
-                for element in self.output_array:
-                    print(element)
-
-                # update the UI according to the power and units
-                send_thread = threading.Thread(target = self.send_output, args = [self.output_array])
-                send_thread.start()
-
-                # sleep for the designated time
-                sample_period = float(self.data_arr[2])
-                time_for_cycle = float(self.output_array[-1])
-                if sample_period > time_for_cycle - .02:
-                    time.sleep(sample_period - time_for_cycle - .02)
-                if not self.sock_open:
-                    return
-            
-            except:
-                print("Socket closed unexpectedly")
-                pi_to_tx_tn.close()
-                pi_to_rx_tn.close()
-                return
-
-        pi_to_tx_tn.close()
-        pi_to_rx_tn.close()
-                
+        self.stream_samples()
+
     def rpi_record(self):
         '''
-        Monitors the power from the power meters and sends the data to the client. Also writes the
-        data to a file stored on the RPi in /home/pi/hfmon/data.
-        '''
-
-        # put the power meters into 'faster' sampling mode
-        take_data.open_PM_URL("http://" + str(self.data_arr[4]) + '/:MODE:1', 2.0, True)
-        take_data.open_PM_URL("http://" + str(self.data_arr[5]) + '/:MODE:1', 2.0, True)
-
-        # telnet socket variables
-        pi_to_tx_tn = []
-        pi_to_rx_tn = []
-
-        # open socket if the devices should connected
-        if(self.data_arr[6]):
-            pi_to_tx_tn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            pi_to_tx_tn.settimeout(.5)
-            # connect to server
-            pi_to_tx_tn.connect((str(self.data_arr[4]), 23))
-            # clear the input to the telnet console (tends to start with some input)
-            pi_to_tx_tn.sendall(b':POWER?\n\r')
-
-        if(self.data_arr[7]):
-            pi_to_rx_tn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            pi_to_rx_tn.settimeout(.5)
-            # connect to server
-            pi_to_rx_tn.connect((str(self.data_arr[5], 23)))
-            pi_to_rx_tn.sendall(b':POWER?\n\r')
-
-        while self.sock_open:
-            try:
-                # get the output from monitor_power
-                self.output_array = take_data.record_power(self.data_arr[1], self.data_arr[2], \
-                    self.data_arr[3], pi_to_tx_tn, pi_to_rx_tn, self.data_arr[6], self.data_arr[7])
-
-                # update the UI according to the power and units
-                send_thread = threading.Thread(target = self.send_output, args = [self.output_array])
-                send_thread.start()
-
-                # sleep for the designated time
-                sample_period = float(self.data_arr[2])
-                time_for_cycle = float(self.output_array[-1])
-                if sample_period > time_for_cycle - .02:
-                    time.sleep(sample_period - time_for_cycle - .019)
-                if not self.sock_open:
-                    return
-            except:
-                print("Socket closed unexpectedly")
-                pi_to_tx_tn.close()
-                pi_to_rx_tn.close()
-                return
-
-        pi_to_tx_tn.close()
-        pi_to_rx_tn.close()
+        Turns on recording to /home/pi/hfmon/data with the client's settings, then sends
+        the data to the client. Recording carries on after the client disconnects,
+        until a stop_rec command is received.
+        '''
+
+        acquisition.start_recording(self.data_arr[1:8])
+        self.stream_samples()
+
+    def rpi_backfill(self):
+        '''
+        Sends the samples from the last data_arr[1] seconds as one frame.
+        '''
+
+        self.request.sendall(hf_protocol.encode_backfill(acquisition.backfill(float(self.data_arr[1]))))
+
+    def rpi_sync_list(self):
+        '''
+        Sends the name, size and modification time of each day file in the data directory.
+        '''
+
+        entries = []
+        for name in sorted(os.listdir(data_writer.DATA_DIR)):
+            path = os.path.join(data_writer.DATA_DIR, name)
+            if name.endswith(SYNC_SUFFIX) and os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append([name, stat.st_size, stat.st_mtime])
+
+        self.request.sendall(hf_protocol.encode_file_list(entries))
+
+    def rpi_sync_fetch(self):
+        '''
+        Sends the bytes after the given offset of each requested file, compressed, in
+        chunks of SYNC_CHUNK_SIZE bytes. data_arr[1] is a list of [name, offset] pairs.
+        '''
+
+        for name, offset in self.data_arr[1]:
+            # only plain file names in the data directory can be requested
+            if os.path.basename(name) != name or name.startswith('.') or not name.endswith(SYNC_SUFFIX):
+                continue
+            path = os.path.join(data_writer.DATA_DIR, name)
+            if not os.path.isfile(path):
+                continue
+
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                while True:
+                    data = f.read(SYNC_CHUNK_SIZE)
+                    if not data:
+                        break
+                    self.request.sendall(hf_protocol.encode_file_chunk(name, offset, zlib.compress(data)))
+                    offset += len(data)
+
+        self.request.sendall(hf_protocol.encode_status("success"))
+
+    def rpi_query(self):
+        '''
+        Sends the recorded rows in a time range. data_arr is
+        ['query', channel mask, start date (YYYYMMDD), start time (s since midnight),
+        end date, end time, decimation], where a decimation of n sends every nth row.
+        Rows are sent in frames of up to QUERY_ROWS_PER_FRAME rows, followed by a status.
+        '''
+
+        mask, start_date, start_secs, end_date, end_secs, decimation = self.data_arr[1:7]
+        channels = hf_protocol.mask_channels(mask)
+        decimation = max(1, int(decimation))
+
+        first_day = datetime.strptime(str(start_date), '%Y%m%d')
+        last_day = datetime.strptime(str(end_date), '%Y%m%d')
+
+        day = first_day
+
+        while day <= last_day:
+            todays_date = day.strftime('%Y%m%d')
+            path = os.path.join(data_writer.DATA_DIR, todays_date + '.data')
+
+            if os.path.isfile(path):
+                index = data_index.get_index(path)
+
+                # the range only covers part of the first and last days
+                first_secs = start_secs if day == first_day else 0
+                last_secs = end_secs if day == last_day else 86400
+
+                rows = []
+                for i, (seconds, line) in enumerate(index.read_rows(first_secs, last_secs)):
+                    if i % decimation:
+                        continue
+                    values = data_index.row_values(line, index.columns)
+                    rows.append([seconds] + [values[channel] for channel in channels])
+
+                    if len(rows) == QUERY_ROWS_PER_FRAME:
+                        self.request.sendall(hf_protocol.encode_query_result(todays_date, mask, rows))
+                        rows = []
+
+                if rows:
+                    self.request.sendall(hf_protocol.encode_query_result(todays_date, mask, rows))
+
+            day += timedelta(days = 1)
+
+        self.request.sendall(hf_protocol.encode_status("success"))
+
+    def rpi_stop_record(self):
+        '''
+        Turns off recording. Clients that are watching keep receiving samples.
+        '''
+
+        acquisition.stop_recording()
+        self.request.sendall(hf_protocol.encode_status("success"))
 
     def rpi_switch(self):
         '''
@@ -197,9 +258,7 @@ class RPiServer(socketserver.BaseRequestHandler):
         '''
         
         set_switches.set_switch(self.data_arr[1], self.data_arr[2], self.data_arr[3], self.data_arr[4])
-        output_array = ["success"]
-        self.pickled_output = pickle.dumps(output_array)
-        self.request.sendall(self.pickled_output)
+        self.request.sendall(hf_protocol.encode_status("success"))
 
 if __name__ == "__main__":
 
@@ -220,7 +279,13 @@ if __name__ == "__main__":
 
         rpi_ip = "192.168.100.153"
 
-    server = socketserver.TCPServer((rpi_ip, 12345), RPiServer)
+    # resume recording if it was on before the RPi restarted
+    acquisition.load_settings()
+
+    # each client gets its own thread; they all share one acquisition loop
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    socketserver.ThreadingTCPServer.daemon_threads = True
+    server = socketserver.ThreadingTCPServer((rpi_ip, 12345), RPiServer)
 
     # activate the server
     server.serve_forever()
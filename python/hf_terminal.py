@@ -7,7 +7,7 @@
         power monitoring, recording, and copying.
     Author: Lucas McDonald
     Date created: July 12, 2017
-    Date modified: July 13, 2017
+    Date modified: October 18, 2026
     Python version: 3.6.1
 '''
 
@@ -18,7 +18,10 @@ import socket
 import sys
 import threading
 import math
-import subprocess
+import hf_protocol
+import data_sync
+from datetime import datetime, timedelta
+from sample_log import seconds_from_str, str_from_seconds
 
 class hf_terminal():
 
@@ -80,10 +83,9 @@ class hf_terminal():
 
 
     def sock_send(self, args):
-        # transfer the arguments via a pickle file and send them
+        # transfer the arguments as a command frame and send them
         try:
-            pickled_args = pickle.dumps(args)
-            self.sock.sendall(pickled_args)
+            self.sock.sendall(hf_protocol.encode_command(args))
             return True
         
         # handle server software not running on Raspberry Pi
@@ -107,9 +109,11 @@ class hf_terminal():
         print("\nCommands:\n")
         print("\trecord [units]".ljust(20) + "Monitor and write data from each transmitter.\n\t\t\t\tIf units are ommitted, kW is used by default.")
         print("\tmonitor [units]".ljust(20) + "Monitor the power of each transmitter, \n\t\t\t\tbut don't write data.")
+        print("\tstop".ljust(20) + "Stop recording on the Raspberry Pi. Recording \n\t\t\t\tcontinues after record is closed until stopped.")
         print("\tswitch [t/r] [n]".ljust(20) + "Set the transmitted or reflected \n\t\t\t\tswitch to the nth input.")
+        print("\thistory [date] [start] [end] [n]".ljust(20) + "\n\t\t\t\tShow the data recorded on [date] (YYYYMMDD) between \n\t\t\t\t[start] and [end] (HH:MM:SS). If [n] is given, \n\t\t\t\tonly every nth row is shown.")
         print("\tsettings".ljust(20) + "View and modify program settings.")
-        print("\tcopy".ljust(20) + "Copy all data files from the Raspberry Pi \n\t\t\t\tto this computer.")
+        print("\tcopy".ljust(20) + "Copy new data from the Raspberry Pi \n\t\t\t\tto this computer.")
         print("\thelp".ljust(20) + "Display this menu again.")
         print("\tquit".ljust(20) + "Quit the program.")
     
@@ -203,6 +207,30 @@ class hf_terminal():
             except IndexError:
                 self.open_settings()
 
+        # checks for history input
+        elif self.choice.split(' ')[0] == 'history':
+
+            # sanitize inputs
+            try:
+                args = self.choice.split(' ')
+                query_date = datetime.strptime(args[1], '%Y%m%d')
+                start_secs = seconds_from_str(args[2])
+                end_secs = seconds_from_str(args[3])
+                decimation = int(args[4]) if len(args) > 4 else 1
+            except:
+                print("\nEnter the date as YYYYMMDD and the times as HH:MM:SS.")
+                return
+
+            end_date = query_date
+            # an end time before the start time runs into the next day
+            if end_secs < start_secs:
+                end_date = query_date + timedelta(days = 1)
+
+            self.history(query_date.strftime('%Y%m%d'), start_secs, end_date.strftime('%Y%m%d'), end_secs, decimation)
+
+        # checks for stop input
+        elif self.choice == 'stop':
+            self.stop_recording()
         # checks for copy input
         elif self.choice == 'copy':
             self.copy_recorded_data()
@@ -221,6 +249,62 @@ class hf_terminal():
         # called when record is typed
         self.get_power_array("rec_all", units)
 
+    def history(self, start_date, start_secs, end_date, end_secs, decimation):
+        '''
+        Asks the Raspberry Pi for the rows recorded in a time range and prints them in watts.
+        '''
+
+        mask = (1 << 12) - 1
+        args = ['query', mask, start_date, start_secs, end_date, end_secs, decimation]
+
+        if not (self.sock_connect() and self.sock_send(args)):
+            print("Error communicating")
+            return
+
+        print("\nDate       HH:MM:SS.SSS  " + "".join(name.rjust(8) for name in hf_protocol.CHANNEL_NAMES))
+
+        decoder = hf_protocol.FrameDecoder()
+        row_count = 0
+
+        try:
+            while True:
+                frame = hf_protocol.recv_frame(self.sock, decoder)
+                if frame is None or frame[0] == hf_protocol.FRAME_STATUS:
+                    break
+                if frame[0] != hf_protocol.FRAME_QUERY_RESULT:
+                    continue
+
+                todays_date, mask, rows = hf_protocol.decode_query_result(frame[1])
+                for row in rows:
+                    powers = ["" if math.isnan(power) else "%.0f" % power for power in row[1:]]
+                    print(todays_date + "   " + str_from_seconds(row[0]) + "  " + \
+                        "".join(power.rjust(8) for power in powers))
+                row_count += len(rows)
+
+        except KeyboardInterrupt:
+            pass
+        except socket.timeout:
+            print("\nCONNECTION TIMEOUT")
+
+        self.sock.close()
+        print("\n" + str(row_count) + " rows")
+
+    def stop_recording(self):
+        '''
+        Tells the Raspberry Pi to stop recording.
+        '''
+
+        if self.sock_connect() and self.sock_send(['stop_rec']):
+            frame = hf_protocol.recv_frame(self.sock, hf_protocol.FrameDecoder())
+            self.sock.close()
+
+            if frame is not None and frame[0] == hf_protocol.FRAME_STATUS and \
+                hf_protocol.decode_status(frame[1]) == 'success':
+                print("\nRecording stopped")
+                return
+
+        print("Error communicating")
+
     def monitor(self, units):
         # called when monitor is typed
         self.get_power_array("mon_all", units)
@@ -244,14 +328,27 @@ class hf_terminal():
                 print("HH:MM:SS.SSS   |   Tx1   ,   Rx1     |   Tx2  ,   Rx2     |   Tx3  ,   Rx3     |   " + \
                     "Tx4  ,   Rx4     |   Tx5  ,  Rx5     |    Tx6  ,   Rx6     | sample duration")
 
+                decoder = hf_protocol.FrameDecoder()
+
                 # do while indicating recording
                 while True:
                     try:
-                        # receive data file from the server
-                        received = self.sock.recv(1024)
+                        # receive the next sample from the server
+                        try:
+                            frame = hf_protocol.recv_frame(self.sock, decoder)
+                        except socket.timeout:
+                            continue
+
+                        if frame is None:
+                            print("\nCONNECTION CLOSED\n\nThe Raspberry Pi closed the connection.")
+                            self.sock.close()
+                            return
+
+                        if frame[0] != hf_protocol.FRAME_SAMPLE:
+                            continue
 
-                        # unpack data file into array
-                        output_array = pickle.loads(received)
+                        # unpack the sample into an array
+                        output_array = hf_protocol.decode_sample(frame[1])
 
                         # convert the power to the requested units
                         total_power = self.convert_units(output_array, units)
@@ -274,6 +371,13 @@ class hf_terminal():
 
                     # on Ctrl+C pressed, close socket and goto main
                     except KeyboardInterrupt:
+                        self.sock.close()
+                        if cmd == 'rec_all':
+                            print("\n\nRecording continues on the Raspberry Pi. Type \"stop\" to stop recording.")
+                        return
+
+                    except hf_protocol.ProtocolError:
+                        print("\nThe data stream from the Raspberry Pi was corrupted.")
                         self.sock.close()
                         return
 
@@ -291,13 +395,13 @@ class hf_terminal():
                 dir_str = "Reflected"
                 args = ['set_switch', transmitter, 15, 16, 18]
 
-            # transfer the arguments via a pickle file and send them
+            # transfer the arguments as a command frame and send them
             if self.sock_send(args):
 
-                received = self.sock.recv(1024)
-                output_array = pickle.loads(received)
+                frame = hf_protocol.recv_frame(self.sock, hf_protocol.FrameDecoder())
 
-                if output_array[0] == 'success':
+                if frame is not None and frame[0] == hf_protocol.FRAME_STATUS and \
+                    hf_protocol.decode_status(frame[1]) == 'success':
                     print("\n" + dir_str + " switch set to " + str(transmitter))
                 else:
                     print("\nError setting switch")
@@ -451,14 +555,19 @@ class hf_terminal():
     def copy_recorded_data(self):
         '''
         Copies data stored on the Raspberry Pi at /home/pi/hfmon/data to a directory specified
-        on the user's computer via an scp call.
+        on the user's computer. Only data recorded since the last copy is transferred.
         '''
 
-        print("\nYou may need to enter the system password and/or the Raspberry Pi password (\"raspberry\" by default).")
+        local_dir = os.path.join(self.data_filepath, "data")
 
-        subprocess.call(['sudo', 'scp', '-r', "pi@" + self.rpi_ip +":/home/pi/hfmon/data", self.data_filepath])
+        try:
+            files_updated, bytes_received = data_sync.sync_data(self.rpi_ip, local_dir)
+        except Exception as e:
+            print("\nError copying data from the Raspberry Pi: " + str(e))
+            return
 
-        print("\n\nData Copied to " + self.data_filepath + "data.")
+        print("\n\nData Copied to " + local_dir + ". " + str(files_updated) + " files updated, " + \
+            str(bytes_received) + " bytes received.")
 
     def convert_units(self, output_array, units):
         '''
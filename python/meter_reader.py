@@ -0,0 +1,77 @@
+#!usr/bin/env python3
+
+'''
+	File: meter_reader.py
+	Description: Buffered reader for the Telnet replies sent by the power meters.
+		Splits the byte stream into replies on the meter's line terminator and
+		parses the power straight from bytes.
+	Author: Lucas McDonald
+	Date created: October 18, 2026
+	Date modified: October 18, 2026
+	Python version: 3.6.1
+'''
+
+# the meters end each reply with "\n\r", so lines are split on the newline and
+# the carriage return is stripped from whichever side of the split it lands on
+TERMINATOR = b'\n'
+
+class MeterReader():
+	'''
+	Accumulates bytes received from a power meter and hands back complete replies,
+	e.g. b'-99.000 dBm'. Replies that were already waiting before a request was sent
+	(a late answer to a timed out request, or the reply to the priming request) are
+	stale and are counted and dropped rather than being returned as the new reading.
+	'''
+
+	def __init__(self):
+		self.buffer = bytearray()
+		self.stale_count = 0
+
+	def feed(self, data):
+		self.buffer += data
+
+	def pop_reply(self):
+		'''
+		Returns the next complete reply without its terminator, or None if only
+		part of a reply has been received so far.
+		'''
+
+		while True:
+			end = self.buffer.find(TERMINATOR)
+			if end == -1:
+				return None
+
+			reply = bytes(self.buffer[:end]).strip(b'\r ')
+			del self.buffer[:end + 1]
+
+			# the "\r" of the previous reply shows up as an empty line
+			if reply:
+				return reply
+
+	def drop_stale(self):
+		'''
+		Discards everything received before a new request is sent. Returns the number
+		of stale replies that were dropped (a trailing partial reply counts as one).
+		'''
+
+		dropped = 0
+		while self.pop_reply() is not None:
+			dropped += 1
+
+		if self.buffer.strip(b'\r '):
+			dropped += 1
+		del self.buffer[:]
+
+		self.stale_count += dropped
+		return dropped
+
+def parse_power(reply):
+	'''
+	Converts a reply such as b'-99.000 dBm' into the power in dBm as a float.
+	Returns None if the reply doesn't start with a number.
+	'''
+
+	try:
+		return float(reply.partition(b' ')[0])
+	except ValueError:
+		return None
@@ -0,0 +1,251 @@
+#!usr/bin/env python3
+
+'''
+	File: rollup.py
+	Description: Builds and reads rollups of the daily .data files: the min, max, mean
+		and number of readings of each channel over 10 second, 1 minute and 1 hour bins.
+		Each day's rollup is kept in rollups/[todaysdate].npz next to the data files, so
+		plotting or summarising a long range reads a few kilobytes per day instead of
+		every row. Can be run to build the rollups of every file in the data folder:
+			python3 rollup.py
+			python3 rollup.py 20170715
+	Author: Lucas McDonald
+	Date created: October 18, 2026
+	Date modified: October 18, 2026
+	Python version: 3.6.1
+'''
+
+import argparse
+import datetime
+import glob
+import os
+import sys
+import numpy
+import error_filter
+from hf_loader import CHANNEL_NAMES, load_channels
+
+# bin widths in seconds, finest first
+LEVELS = [10, 60, 3600]
+
+ROLLUP_FOLDER = "rollups"
+
+# version of the layout of the arrays in the .npz files
+ROLLUP_VERSION = 1
+
+def rollup_path(data_path):
+	'''
+	Returns where the rollup of a .data file is kept, e.g. ../data/rollups/20170715.npz.
+	'''
+
+	return os.path.join(os.path.dirname(data_path), ROLLUP_FOLDER, error_filter.file_name(data_path) + ".npz")
+
+def bin_stats(times, values, width):
+	'''
+	Groups the rows into bins of width seconds. Returns the index of each bin that has
+	any rows (bin i starts at i * width seconds after midnight), and the min, max, mean
+	and number of readings of each channel in each bin. Timeouts (NaN) aren't counted.
+	'''
+
+	bins = numpy.floor(times / width).astype(numpy.int64)
+	order = numpy.argsort(bins, kind = 'mergesort')
+	bins = bins[order]
+	values = values[order]
+
+	starts = numpy.flatnonzero(numpy.r_[True, bins[1:] != bins[:-1]])
+	valid = ~numpy.isnan(values)
+
+	count = numpy.add.reduceat(valid, starts, axis = 0)
+	total = numpy.add.reduceat(numpy.where(valid, values, 0), starts, axis = 0)
+	with numpy.errstate(invalid = 'ignore', divide = 'ignore'):
+		mean = total / count
+	minimum = numpy.fmin.reduceat(values, starts, axis = 0)
+	maximum = numpy.fmax.reduceat(values, starts, axis = 0)
+
+	return bins[starts], minimum, maximum, mean, count
+
+def build_rollup(data_path, path = None):
+	'''
+	Builds the rollup of a .data file and saves it to path, or rollup_path(data_path).
+	Returns the path, or None if the file has no rows that could be read.
+	'''
+
+	if path is None:
+		path = rollup_path(data_path)
+
+	loaded = load_channels(data_path)
+	if loaded is None or not len(loaded[0]):
+		return None
+	times, values = loaded
+
+	arrays = {"version": numpy.array(ROLLUP_VERSION), "date": numpy.array(error_filter.file_name(data_path))}
+	for width in LEVELS:
+		bins, minimum, maximum, mean, count = bin_stats(times, values, width)
+		prefix = "l" + str(width) + "_"
+		arrays[prefix + "bin"] = bins.astype(numpy.int32)
+		arrays[prefix + "min"] = minimum.astype(numpy.float32)
+		arrays[prefix + "max"] = maximum.astype(numpy.float32)
+		arrays[prefix + "mean"] = mean.astype(numpy.float32)
+		arrays[prefix + "count"] = count.astype(numpy.uint32)
+
+	os.makedirs(os.path.dirname(path), exist_ok = True)
+	# savez adds .npz to names that don't end with it
+	temp_path = path[:-len(".npz")] + ".tmp.npz"
+	numpy.savez_compressed(temp_path, **arrays)
+	os.replace(temp_path, path)
+
+	return path
+
+def needs_rollup(data_path):
+	try:
+		return os.path.getmtime(rollup_path(data_path)) < os.path.getmtime(data_path)
+	except OSError:
+		return True
+
+class Level():
+	'''
+	One level of a day's rollup. start is the time each bin starts at in seconds since
+	midnight; minimum, maximum, mean and count are (bins x 12) in Tx1..Rx6 order.
+	'''
+
+	def __init__(self, width, start, minimum, maximum, mean, count):
+		self.width = width
+		self.start = start
+		self.minimum = minimum
+		self.maximum = maximum
+		self.mean = mean
+		self.count = count
+
+	def between(self, start_secs, end_secs):
+		'''
+		Returns the part of the level whose bins overlap start_secs to end_secs.
+		'''
+
+		first = numpy.searchsorted(self.start, start_secs - self.width, side = 'right' if self.width else 'left')
+		last = numpy.searchsorted(self.start, end_secs, side = 'right')
+		return Level(self.width, self.start[first:last], self.minimum[first:last], self.maximum[first:last], \
+			self.mean[first:last], self.count[first:last])
+
+def load_rollup(data_path, build = True):
+	'''
+	Returns a dict of Level by bin width for a .data file, building the rollup first
+	if it is missing or older than the file (unless build is False). Returns None if
+	there isn't a rollup.
+	'''
+
+	path = rollup_path(data_path)
+	if build and needs_rollup(data_path):
+		if build_rollup(data_path) is None:
+			return None
+
+	try:
+		with numpy.load(path) as arrays:
+			if int(arrays["version"]) != ROLLUP_VERSION:
+				return None
+			levels = {}
+			for width in LEVELS:
+				prefix = "l" + str(width) + "_"
+				levels[width] = Level(width, arrays[prefix + "bin"] * float(width), arrays[prefix + "min"], \
+					arrays[prefix + "max"], arrays[prefix + "mean"], arrays[prefix + "count"])
+			return levels
+	except (OSError, KeyError, ValueError):
+		return None
+
+def choose_level(span_secs, pixels):
+	'''
+	Returns the coarsest bin width that still gives at least one bin per pixel when
+	span_secs seconds are drawn across pixels pixels, or None if even the finest
+	level is too coarse and the rows themselves should be used.
+	'''
+
+	secs_per_pixel = span_secs / float(max(pixels, 1))
+	widths = [width for width in LEVELS if width <= secs_per_pixel]
+	if not widths:
+		return None
+	return widths[-1]
+
+def file_level(data_path, width):
+	'''
+	Returns the Level of a .data file with bins of width seconds, or its rows if width
+	is None. Returns None if the file can't be read.
+	'''
+
+	if width is None:
+		return raw_level(data_path)
+	levels = load_rollup(data_path)
+	return levels[width] if levels is not None else None
+
+def read_range(data_dir, start, end, pixels, suffix = ".data"):
+	'''
+	Returns the data between two datetimes at the coarsest level that meets the
+	resolution of a plot pixels wide, as (width, times, minimum, maximum, mean, count).
+	times is the start of each bin in seconds since midnight of start's date, and the
+	arrays are (bins x 12) in Tx1..Rx6 order. width is None if the rows themselves are
+	returned, in which case minimum, maximum and mean are all the readings and count is
+	1 where there is a reading. The files read are [date][suffix] in data_dir, e.g.
+	suffix "_filtered.data" for the filtered folder.
+	'''
+
+	width = choose_level((end - start).total_seconds(), pixels)
+	first_day = datetime.datetime(start.year, start.month, start.day)
+
+	parts = []
+	day = first_day
+	while day <= end:
+		data_path = os.path.join(data_dir, day.strftime("%Y%m%d") + suffix)
+		offset = (day - first_day).total_seconds()
+		start_secs = (start - day).total_seconds()
+		end_secs = (end - day).total_seconds()
+
+		if os.path.isfile(data_path):
+			part = file_level(data_path, width)
+			if part is not None:
+				part = part.between(start_secs, end_secs)
+				parts.append((offset + part.start, part))
+
+		day += datetime.timedelta(days = 1)
+
+	if not parts:
+		empty = numpy.zeros((0, len(CHANNEL_NAMES)))
+		return width, numpy.zeros(0), empty, empty, empty, empty
+
+	return width, numpy.concatenate([times for times, part in parts]), \
+		numpy.concatenate([part.minimum for times, part in parts]), \
+		numpy.concatenate([part.maximum for times, part in parts]), \
+		numpy.concatenate([part.mean for times, part in parts]), \
+		numpy.concatenate([part.count for times, part in parts])
+
+def raw_level(data_path):
+	'''
+	Returns the rows of a .data file as a Level with one bin per row.
+	'''
+
+	loaded = load_channels(data_path)
+	if loaded is None:
+		return None
+	times, values = loaded
+
+	return Level(0, times, values, values, values, (~numpy.isnan(values)).astype(numpy.uint32))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Builds the rollups of HF power data files. " + \
+		"Builds them for every file in " + error_filter.DATA_DIR + " that has changed if no file is given.")
+	parser.add_argument("file", nargs = "?", help = "data file to roll up, e.g. 20170715 or 20170715.data")
+	parser.add_argument("-f", "--force", action = "store_true", help = "build rollups even if they are up to date")
+	args = parser.parse_args()
+
+	if args.file is not None:
+		file_list = [error_filter.input_path(args.file)]
+		if not os.path.isfile(file_list[0]):
+			print("Could not locate file")
+			sys.exit(1)
+	else:
+		file_list = sorted(glob.glob(os.path.join(error_filter.DATA_DIR, '*.data')))
+
+	for file_path in file_list:
+		if not args.force and not needs_rollup(file_path):
+			continue
+		path = build_rollup(file_path)
+		if path is None:
+			print("Unable to read " + error_filter.file_name(file_path))
+		else:
+			print("built " + path + " (" + str(os.path.getsize(path)) + " bytes)")
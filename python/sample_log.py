@@ -0,0 +1,300 @@
+#!usr/bin/env python3
+
+'''
+	File: sample_log.py
+	Description: Fixed-size binary record format for recorded samples, written next
+		to the text .data files. Each file has a small header followed by one record
+		per sample, so a day can be loaded with numpy.memmap instead of being parsed.
+		Can also be run to convert files in either direction:
+			python3 sample_log.py 20170713.data
+			python3 sample_log.py 20170713.hfsl
+	Author: Lucas McDonald
+	Date created: October 18, 2026
+	Date modified: October 18, 2026
+	Python version: 3.6.1
+'''
+
+import csv
+import math
+import os
+import struct
+import sys
+
+MAGIC = b'HFSL'
+VERSION = 1
+NUM_CHANNELS = 12
+
+'''
+Header: magic, format version, record size in bytes, number of channels, and the
+date of the file as a YYYYMMDD integer.
+'''
+HEADER_STRUCT = struct.Struct('<4sHHHxxI')
+HEADER_SIZE = HEADER_STRUCT.size
+
+'''
+Record: time the sample started in seconds since midnight, Tx1..Tx6 and Rx1..Rx6 in
+watts (NaN where the meter timed out), and the time taken to take the sample.
+The time is taken from time.monotonic() and anchored to the wall clock when the file
+is opened, so it doesn't jump if the system clock is changed while recording.
+'''
+RECORD_STRUCT = struct.Struct('<d%dff' % NUM_CHANNELS)
+RECORD_SIZE = RECORD_STRUCT.size
+
+LOG_EXTENSION = '.hfsl'
+
+# the channels in the order they're kept everywhere except older text files
+CHANNEL_NAMES = ['Tx1', 'Tx2', 'Tx3', 'Tx4', 'Tx5', 'Tx6', 'Rx1', 'Rx2', 'Rx3', 'Rx4', 'Rx5', 'Rx6']
+
+# what take_data gives, and the text files hold, in place of a power when the meter timed out
+TIMEOUT_STR = "      "
+
+TEXT_HEADER = '#HH:MM:SS.SSS, Tx1 , Tx2  , Tx3  , Tx4  , Tx5  , Tx6  , Rx1  , Rx2  , Rx3  , Rx4  , Rx5  , Rx6  , time to take sample\n'
+
+# width of the time to take sample field in the text files, e.g. 0.40000
+CYCLE_TIME_WIDTH = 7
+
+def format_cycle_time(seconds):
+	'''
+	Returns the time taken for a cycle as a field of CYCLE_TIME_WIDTH characters, so every
+	row of a data file has the same width. Cycles of 10 s or more keep fewer decimal
+	places (12.3456); times too long to fit are clamped. Returns spaces if the time
+	isn't a number.
+	'''
+
+	try:
+		seconds = min(max(float(seconds), 0.0), 999999.0)
+	except ValueError:
+		return ' ' * CYCLE_TIME_WIDTH
+
+	if math.isnan(seconds):
+		return ' ' * CYCLE_TIME_WIDTH
+
+	return ('%.5f' % seconds)[:CYCLE_TIME_WIDTH].rstrip('.').rjust(CYCLE_TIME_WIDTH)
+
+def record_dtype():
+	'''
+	numpy dtype matching RECORD_STRUCT. numpy is only needed to read logs, not to write them.
+	'''
+
+	import numpy
+
+	return numpy.dtype([('time', '<f8'), ('power', '<f4', (NUM_CHANNELS,)), ('cycle', '<f4')])
+
+def pack_header(todays_date):
+	return HEADER_STRUCT.pack(MAGIC, VERSION, RECORD_SIZE, NUM_CHANNELS, int(todays_date))
+
+def read_header(log_file):
+	'''
+	Reads and checks the header of an open log file. Returns the date as a YYYYMMDD string.
+	'''
+
+	header = log_file.read(HEADER_SIZE)
+	if len(header) != HEADER_SIZE:
+		raise ValueError("file is too short to be a sample log")
+
+	magic, version, record_size, num_channels, todays_date = HEADER_STRUCT.unpack(header)
+	if magic != MAGIC:
+		raise ValueError("not a sample log")
+	if version != VERSION or record_size != RECORD_SIZE or num_channels != NUM_CHANNELS:
+		raise ValueError("unsupported sample log version " + str(version))
+
+	return str(todays_date)
+
+def watts_from_dBm(element):
+	'''
+	Converts a power reading in dBm from take_data into watts, or NaN if the reading errored.
+	'''
+
+	try:
+		return pow(10, float(element) / 10) / 1000
+	except:
+		return float('nan')
+
+def seconds_from_str(time_str):
+	'''
+	Converts HH:MM:SS.SSS into seconds since midnight.
+	'''
+
+	hours, minutes, seconds = time_str.split(':')
+	return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def str_from_seconds(seconds):
+	'''
+	Converts seconds since midnight into HH:MM:SS.SSS.
+	'''
+
+	ms = int(round(seconds * 1000))
+	return '%02d:%02d:%02d.%03d' % (ms // 3600000, ms // 60000 % 60, ms // 1000 % 60, ms % 1000)
+
+class SampleLogWriter():
+	'''
+	Appends records to a single day's sample log. Used by DataWriter, which handles
+	buffering and daily rotation.
+	'''
+
+	def __init__(self, path, todays_date, cycle_start_time, cycle_start):
+		self.log_file = open(path, 'ab')
+
+		if self.log_file.tell() == 0:
+			self.log_file.write(pack_header(todays_date))
+		else:
+			# drop any partial record left by a power cut
+			extra = (self.log_file.tell() - HEADER_SIZE) % RECORD_SIZE
+			if extra:
+				self.log_file.truncate(self.log_file.tell() - extra)
+
+		# anchor the monotonic clock to the time of day
+		midnight = cycle_start_time.replace(hour = 0, minute = 0, second = 0, microsecond = 0)
+		self.time_offset = (cycle_start_time - midnight).total_seconds() - cycle_start
+
+		self.records = []
+
+	def add_sample(self, cycle_start, output):
+		'''
+		Packs an output array from take_data whose cycle started at time.monotonic() == cycle_start.
+		'''
+
+		powers = [watts_from_dBm(element) for element in output[1:13]]
+
+		try:
+			time_for_cycle = float(output[-1])
+		except:
+			time_for_cycle = float('nan')
+
+		self.records.append(RECORD_STRUCT.pack(cycle_start + self.time_offset, *(powers + [time_for_cycle])))
+
+	def flush(self):
+		if self.records:
+			self.log_file.write(b''.join(self.records))
+			self.records = []
+		self.log_file.flush()
+
+	def fileno(self):
+		return self.log_file.fileno()
+
+	def close(self):
+		self.flush()
+		self.log_file.close()
+
+def load_sample_log(path):
+	'''
+	Maps a sample log into memory. Returns (date as YYYYMMDD, records), where records is a
+	numpy structured array with fields 'time', 'power' (n x 12) and 'cycle'.
+	'''
+
+	import numpy
+
+	with open(path, 'rb') as log_file:
+		todays_date = read_header(log_file)
+
+	count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_SIZE
+	if count == 0:
+		return todays_date, numpy.zeros(0, dtype = record_dtype())
+
+	return todays_date, numpy.memmap(path, dtype = record_dtype(), mode = 'r', offset = HEADER_SIZE, shape = (count,))
+
+def text_column_order(header_row):
+	'''
+	Returns, for Tx1..Tx6 then Rx1..Rx6, the column of the text file that holds each
+	channel. Older files list the channels as Tx1, Rx1, Tx2, Rx2, ...
+	'''
+
+	names = [name.strip() for name in header_row[1:13]]
+	try:
+		return [names.index(name) + 1 for name in CHANNEL_NAMES]
+	except ValueError:
+		return list(range(1, 13))
+
+def text_to_log(text_path, log_path):
+	'''
+	Converts a text .data file into a sample log. Timeouts ('      ') become NaN.
+	Returns the number of records written.
+	'''
+
+	# hf_loader uses this module, so it can't be imported at the top
+	from hf_loader import detect_layout
+
+	todays_date = os.path.basename(text_path)[0:8]
+	layout = detect_layout(text_path)
+	columns = layout.columns if layout is not None else list(range(1, 13))
+	count = 0
+
+	with open(text_path, 'r') as text_file, open(log_path, 'wb') as log_file:
+		log_file.write(pack_header(todays_date))
+
+		for row in csv.reader(text_file):
+			if len(row) == 0:
+				continue
+			if row[0].startswith('#'):
+				continue
+			if len(row) < 14:
+				continue
+
+			try:
+				values = [seconds_from_str(row[0])]
+			except ValueError:
+				continue
+
+			for col in columns:
+				try:
+					values.append(float(row[col]))
+				except ValueError:
+					values.append(float('nan'))
+
+			try:
+				values.append(float(row[13]))
+			except ValueError:
+				values.append(float('nan'))
+
+			log_file.write(RECORD_STRUCT.pack(*values))
+			count += 1
+
+	return count
+
+def log_to_text(log_path, text_path):
+	'''
+	Converts a sample log into a text .data file in the format written by DataWriter.
+	Returns the number of rows written.
+	'''
+
+	count = 0
+
+	with open(log_path, 'rb') as log_file, open(text_path, 'w') as text_file:
+		todays_date = read_header(log_file)
+
+		text_file.write('#HF transmitted power data for ' + todays_date[0:4] + '-' + todays_date[4:6] + \
+			'-' + todays_date[6:8] + '\n')
+		text_file.write(TEXT_HEADER)
+		text_file.write('\n')
+
+		while True:
+			record = log_file.read(RECORD_SIZE)
+			if len(record) < RECORD_SIZE:
+				break
+
+			values = RECORD_STRUCT.unpack(record)
+
+			fields = [str_from_seconds(values[0])]
+			for power in values[1:13]:
+				if math.isnan(power):
+					fields.append(TIMEOUT_STR)
+				else:
+					fields.append(str(int(power)).zfill(6))
+			fields.append(format_cycle_time(values[13]))
+
+			text_file.write(','.join(fields) + '\n')
+			count += 1
+
+	return count
+
+if __name__ == "__main__":
+
+	for file_name in sys.argv[1:]:
+		base_name = os.path.splitext(file_name)[0]
+
+		if file_name.endswith(LOG_EXTENSION):
+			count = log_to_text(file_name, base_name + '.data')
+			print("converted " + file_name + " to " + base_name + ".data (" + str(count) + " rows)")
+		else:
+			count = text_to_log(file_name, base_name + LOG_EXTENSION)
+			print("converted " + file_name + " to " + base_name + LOG_EXTENSION + " (" + str(count) + " rows)")
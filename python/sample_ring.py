@@ -0,0 +1,71 @@
+#!usr/bin/env python3
+
+'''
+    File: sample_ring.py
+    Description: Fixed-size ring buffer of the most recent samples, kept by the RPi
+        server so clients can be sent recent history as soon as they connect.
+    Author: Lucas McDonald
+    Date created: October 18, 2026
+    Date modified: October 18, 2026
+    Python version: 3.6.1
+'''
+
+from array import array
+
+# 10 hours at one sample per second
+RING_CAPACITY = 36000
+
+# values stored per sample: time of day, Tx1..Tx6, Rx1..Rx6, time taken
+SAMPLE_WIDTH = 14
+
+class SampleRing():
+    '''
+    Holds the last capacity samples in preallocated arrays. Each sample is stored as the
+    numbers sent in a sample frame (see hf_protocol.sample_values), together with the
+    time.monotonic() value it was added at, which is used to find the recent samples.
+    Not thread safe; the acquisition loop guards it with its own lock.
+    '''
+
+    def __init__(self, capacity = RING_CAPACITY):
+        self.capacity = capacity
+        self.added_at = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity * SAMPLE_WIDTH))
+        # index the next sample is written to, and number of samples held
+        self.head = 0
+        self.count = 0
+
+    def append(self, added_at, values):
+        start = self.head * SAMPLE_WIDTH
+        self.values[start:start + SAMPLE_WIDTH] = array('d', values)
+        self.added_at[self.head] = added_at
+
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def slot(self, i):
+        # slot of the ith oldest sample held
+        return (self.head - self.count + i) % self.capacity
+
+    def since(self, added_after):
+        '''
+        Returns the samples added at or after time.monotonic() == added_after, oldest first,
+        as lists of SAMPLE_WIDTH numbers.
+        '''
+
+        # binary search for the oldest sample that is recent enough
+        low = 0
+        high = self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self.added_at[self.slot(mid)] < added_after:
+                low = mid + 1
+            else:
+                high = mid
+
+        samples = []
+        for i in range(low, self.count):
+            start = self.slot(i) * SAMPLE_WIDTH
+            samples.append(self.values[start:start + SAMPLE_WIDTH].tolist())
+
+        return samples
@@ -0,0 +1,61 @@
+#!usr/bin/env python3
+
+'''
+	File: scheduler.py
+	Description: Deadline scheduler for the sampling loop. Samples are started on
+		absolute time.monotonic() deadlines, so the sample period doesn't drift with
+		the time taken by each cycle.
+	Author: Lucas McDonald
+	Date created: October 18, 2026
+	Date modified: October 18, 2026
+	Python version: 3.6.1
+'''
+
+import time
+
+class DeadlineScheduler():
+	'''
+	Fires every sample_period seconds, measured from the time start() was called.
+	If a cycle runs past one or more deadlines, those deadlines are counted in
+	missed and skipped, and the next sample starts on the following deadline.
+	'''
+
+	def __init__(self, sample_period):
+		self.sample_period = float(sample_period)
+		self.next_deadline = None
+		self.missed = 0
+
+	def start(self):
+		'''
+		Sets the first deadline to now.
+		'''
+
+		self.next_deadline = time.monotonic()
+		self.missed = 0
+
+	def wait(self):
+		'''
+		Sleeps until the next deadline. Returns the number of deadlines that were
+		missed since the previous call.
+		'''
+
+		if self.next_deadline is None:
+			self.start()
+
+		self.next_deadline += self.sample_period
+		now = time.monotonic()
+
+		skipped = 0
+		if now > self.next_deadline:
+			# move to the first deadline that is still in the future
+			skipped = int((now - self.next_deadline) // self.sample_period) + 1
+			self.next_deadline += skipped * self.sample_period
+			self.missed += skipped
+
+		# time.sleep() can wake early on some platforms, so check the clock again
+		remaining = self.next_deadline - now
+		while remaining > 0:
+			time.sleep(remaining)
+			remaining = self.next_deadline - time.monotonic()
+
+		return skipped
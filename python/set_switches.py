@@ -3,6 +3,78 @@ try:
 except:
 	pass
 
+import threading
+
+'''
+Decoder bits (A, B, C) for each input of the HMC252, where 0 is GPIO.LOW and 1 is
+GPIO.HIGH. 7 and 8 both correspond to the ALL OFF state (i.e. nothing connected
+to the output).
+'''
+DECODER_TABLE = {
+	1: (0, 0, 0),
+	2: (1, 0, 0),
+	3: (0, 1, 0),
+	4: (1, 1, 0),
+	5: (0, 0, 1),
+	6: (1, 0, 1),
+	7: (1, 1, 1),
+	8: (1, 1, 1),
+}
+
+class SwitchController():
+	'''
+	Drives any number of HMC252 switch banks. Each bank is identified by its three
+	decoder pins, which are set up the first time the bank is used. The input each
+	bank is on is remembered so a request for the current input doesn't touch the pins.
+	'''
+
+	def __init__(self):
+		self.mode_set = False
+		# maps (decoderBitA, decoderBitB, decoderBitC) to the input the bank is on
+		self.bank_inputs = {}
+		self.lock = threading.Lock()
+
+	def setup_bank(self, pins):
+		if not self.mode_set:
+			GPIO.setmode(GPIO.BOARD)
+			self.mode_set = True
+
+		GPIO.setup(list(pins), GPIO.OUT)
+		self.bank_inputs[pins] = None
+
+	def set_switch(self, num, decoderBitA = 11, decoderBitB = 12, decoderBitC = 13):
+		'''
+		Sets the bank on the given pins to the selected input.
+		'''
+
+		pins = (decoderBitA, decoderBitB, decoderBitC)
+		bits = DECODER_TABLE[num]
+
+		with self.lock:
+			if pins not in self.bank_inputs:
+				self.setup_bank(pins)
+
+			# already on this input (7 and 8 are the same state)
+			current = self.bank_inputs[pins]
+			if current is not None and DECODER_TABLE[current] == bits:
+				return
+
+			# write all three bits in one call
+			GPIO.output(list(pins), bits)
+			self.bank_inputs[pins] = num
+
+	def reset(self):
+		'''
+		Forgets the state of every bank, e.g. after GPIO.cleanup().
+		'''
+
+		with self.lock:
+			self.mode_set = False
+			self.bank_inputs = {}
+
+# shared by everything running in the server process
+controller = SwitchController()
+
 # default pins are for transmitted meter
 def set_switch(num, decoderBitA = 11, decoderBitB = 12, decoderBitC = 13):
 	'''
@@ -10,39 +82,4 @@ def set_switch(num, decoderBitA = 11, decoderBitB = 12, decoderBitC = 13):
 	to control the decoder on the HMC252.
 	'''
 
-	GPIO.setmode(GPIO.BOARD)
-	GPIO.setup(decoderBitA, GPIO.OUT)                        
-	GPIO.setup(decoderBitB, GPIO.OUT)
-	GPIO.setup(decoderBitC, GPIO.OUT)
-
-	if num == 1:
-		GPIO.output(decoderBitA, GPIO.LOW)         
-		GPIO.output(decoderBitB, GPIO.LOW)
-		GPIO.output(decoderBitC, GPIO.LOW)
-	# Set the second input (etc.)
-	elif num == 2:
-		GPIO.output(decoderBitA, GPIO.HIGH)
-		GPIO.output(decoderBitB, GPIO.LOW)
-		GPIO.output(decoderBitC, GPIO.LOW)
-	elif num == 3:
-		GPIO.output(decoderBitA, GPIO.LOW)
-		GPIO.output(decoderBitB, GPIO.HIGH)
-		GPIO.output(decoderBitC, GPIO.LOW)
-	elif num == 4:
-		GPIO.output(decoderBitA, GPIO.HIGH)
-		GPIO.output(decoderBitB, GPIO.HIGH)
-		GPIO.output(decoderBitC, GPIO.LOW)
-	elif num == 5:
-		GPIO.output(decoderBitA, GPIO.LOW)
-		GPIO.output(decoderBitB, GPIO.LOW)
-		GPIO.output(decoderBitC, GPIO.HIGH)
-	elif num == 6:
-		GPIO.output(decoderBitA, GPIO.HIGH)
-		GPIO.output(decoderBitB, GPIO.LOW)
-		GPIO.output(decoderBitC, GPIO.HIGH)
-	# 7 and 8 both correspond to the ALL OFF state (i.e. nothing connected
-	# to the output)
-	elif num == 7 or num == 8:
-		GPIO.output(decoderBitA, GPIO.HIGH)
-		GPIO.output(decoderBitB, GPIO.HIGH)
-		GPIO.output(decoderBitC, GPIO.HIGH)
\ No newline at end of file
+	controller.set_switch(num, decoderBitA, decoderBitB, decoderBitC)
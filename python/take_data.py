@@ -6,20 +6,33 @@
 		from each of the 6 HF transmitters.
 	Author: Lucas McDonald
 	Date created: June 2, 2017
-	Date modified: August 2, 2017
+	Date modified: October 18, 2026
 	Python version: 3.6.1
 '''
 
 from urllib.request import urlopen
 from datetime import datetime, timedelta
 from set_switches import set_switch
-import os.path
+from meter_reader import MeterReader, parse_power
+from sample_log import TIMEOUT_STR
 import time
-from socket import timeout
-import threading
-import telnetlib
+import asyncio
+import socket
 import sys
 
+'''
+Correction factors for each transmitter in dB.
+First element is the transmitted power correction, second element is reflected power correction.
+Each transmitted input has a 10 dB attenuator.
+Reflected inputs 1, 2, and 3 have 8 dB attenuators, while 4, 5, and 6 have 5 dB attenuators.
+'''
+CORRECTION_DICT = {1: [73, 61], 2: [73, 61], 3: [73, 61], 4: [73, 51.157], 5: [73, 61], 6: [73, 61]}
+
+# seconds to wait before reconnecting to a meter that couldn't be reached, doubled
+# after each failed attempt up to MAX_RECONNECT_SECONDS
+RECONNECT_SECONDS = 1.0
+MAX_RECONNECT_SECONDS = 60.0
+
 def str_To_dBm(input_str, correction):
 	'''
 	Converts the received power in dBm from HTML format to
@@ -33,7 +46,7 @@ def str_To_dBm(input_str, correction):
 		power_dbm = str(float(power_dbm) + correction)
 	# if there are any errors, return the error string of spaces
 	except:
-		power_dbm = "      "
+		power_dbm = TIMEOUT_STR
 
 	return power_dbm
 
@@ -53,214 +66,266 @@ def open_PM_URL(url, given_timeout, enabled):
 			return "      "
 			enabled = False
 
-def get_PM_power_tn(tn, timeout, enabled):
+class MeterSession():
 	'''
-	Sends the power request to the power meter via Telnet. Retrieves a bytestring and
-	returns its ASCII representation.
+	A long-lived Telnet connection to a single power meter and the pins of the
+	HMC252 switch bank in front of it. The socket is kept open between cycles and
+	is only reopened if the meter drops the connection. If the meter can't be reached,
+	the next attempt is put off (with backoff) so an unreachable meter only costs one
+	connection timeout per cycle at most.
 	'''
 
-	tn.sendall(b':POWER?\n\r')
-	output = tn.recv(1024).decode()
-	print(output)
-	return output
-
+	def __init__(self, ip, direction, timeout_secs, decoderBitA, decoderBitB, decoderBitC):
+		self.ip = ip
+		self.direction = direction
+		self.timeout_secs = float(timeout_secs)
+		self.decoder_pins = (decoderBitA, decoderBitB, decoderBitC)
+		self.sock = None
+		self.reader = MeterReader()
+		self.reconnect_secs = RECONNECT_SECONDS
+		self.reconnect_at = 0.0
+
+	def can_reconnect(self):
+		return time.monotonic() >= self.reconnect_at
+
+	async def open(self):
+		'''
+		Connects to the meter's Telnet port. Returns True if the session is usable.
+		'''
+
+		loop = asyncio.get_event_loop()
+
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		# the event loop needs a non-blocking socket
+		self.sock.setblocking(False)
+		try:
+			await asyncio.wait_for(loop.sock_connect(self.sock, (str(self.ip), 23)), self.timeout_secs)
+			# clear the input to the telnet console (tends to start with some input)
+			await loop.sock_sendall(self.sock, b':POWER?\n\r')
+		except (OSError, asyncio.TimeoutError):
+			print("Unable to connect to the power meter with IP " + str(self.ip) + \
+				"; trying again in " + str(self.reconnect_secs) + " s")
+			self.close()
+			self.reconnect_at = time.monotonic() + self.reconnect_secs
+			self.reconnect_secs = min(self.reconnect_secs * 2, MAX_RECONNECT_SECONDS)
+			return False
+
+		self.reconnect_secs = RECONNECT_SECONDS
+
+		# wait for the priming reply so it isn't mistaken for the first reading.
+		# if it comes late, the first request drops it as stale.
+		try:
+			while self.reader.pop_reply() is None:
+				data = await asyncio.wait_for(loop.sock_recv(self.sock, 1024), self.timeout_secs)
+				if not data:
+					break
+				self.reader.feed(data)
+		except (OSError, asyncio.TimeoutError):
+			pass
+		self.reader.drop_stale()
+
+		return True
+
+	def close(self):
+		if self.sock is not None:
+			self.sock.close()
+			self.sock = None
+		self.reader.drop_stale()
+
+	def drain(self):
+		'''
+		Moves any bytes already waiting on the socket into the reader without blocking.
+		'''
+
+		while True:
+			try:
+				data = self.sock.recv(4096)
+			except (BlockingIOError, InterruptedError):
+				return
+			if not data:
+				raise ConnectionResetError("power meter closed the connection")
+			self.reader.feed(data)
+
+class AcquisitionEngine():
 	'''
-	tn.write(":POWER?\r\n".encode("ascii"))
-	output = tn.read_eager().decode()
-	print(output)
-	return output
+	Owns one MeterSession per enabled power meter and an event loop used to read
+	both meters at once. Each call to sample() runs a single 6-channel cycle, with
+	the forward and reflected banks stepped through as concurrent coroutines.
 	'''
 
-def record_power(timeout_secs, sample_time, decoder_pins, transmitted_tn, reflected_tn, \
-	trans_enabled, reflect_enabled):
-	'''
-	Writes to a file located at ../data/[todaysdate].data and returns an array
-	containing [time measurement started, Tx1, Rx1, Tx2, Rx2, .... Rx6, time taken to sample all 6].
-	'''
+	def __init__(self, timeout_secs, decoder_pins, transmitted_ip, reflected_ip, \
+		trans_enabled, reflect_enabled):
 
-	# YMD format for dating
-	# start the line with the current time in HH:MM:SS.SSS
-	cycle_start_time = datetime.now() - timedelta(hours = 4)
-	cur_time = str(cycle_start_time).split(' ')[1][0:12]
+		self.loop = asyncio.new_event_loop()
 
-	todays_date = str(cycle_start_time).split(' ')[0].replace('-', '')
+		self.trans_session = None
+		self.ref_session = None
 
-	# if there isn't already a data file, make a new file
-	if not os.path.isfile('/home/pi/hfmon/data/' + todays_date + '.data'):
+		if trans_enabled:
+			self.trans_session = MeterSession(transmitted_ip, 'forward', timeout_secs, \
+				decoder_pins[0], decoder_pins[1], decoder_pins[2])
+		if reflect_enabled:
+			self.ref_session = MeterSession(reflected_ip, 'reflected', timeout_secs, \
+				decoder_pins[3], decoder_pins[4], decoder_pins[5])
 
-		#create a new file
-		data_file = open('/home/pi/hfmon/data/' + todays_date + '.data', 'w+')
+	def sessions(self):
+		return [s for s in (self.trans_session, self.ref_session) if s is not None]
 
-		# write some header info
-		data_file.write('#HF transmitted power data for ' + str(cycle_start_time).split(' ')[0] + '\n')
-		data_file.write('#HH:MM:SS.SSS, Tx1 , Tx2  , Tx3  , Tx4  , Tx5  , Tx6  , Rx1  , Rx2  , Rx3  , Rx4  , Rx5  , Rx6  , time to take sample\n')
+	def open(self):
+		'''
+		Puts the power meters into fast sampling mode and opens a session to each one.
+		'''
 
-	# open file with today's date in format YY:MM:DD
-	data_file = open('/home/pi/hfmon/data/' + todays_date + '.data', 'a')
+		for session in self.sessions():
+			open_PM_URL("http://" + str(session.ip) + '/:MODE:1', 2.0, True)
 
-	# get output array
-	output = []
+		self.loop.run_until_complete(self.open_sessions())
 
-	data_file.write('\n')
+	async def open_sessions(self):
+		await asyncio.gather(*[s.open() for s in self.sessions()])
 
-	data_file.write(cur_time + ',')
-	output.append(cur_time)
+	def close(self):
+		for session in self.sessions():
+			session.close()
+		self.loop.close()
 
-	# get forward and reflected power from individal threads
-	threads = []
+	def sample(self):
+		'''
+		Runs one acquisition cycle and returns
+		[time started, Tx1, Tx2, ..., Tx6, Rx1, Rx2, ..., Rx6, time taken to sample power].
+		'''
 
-	trans_out = []
-	if trans_enabled:
-		transmitted_thread = threading.Thread(target = get_direction_power_array, args = [cycle_start_time, trans_out, 'forward', \
-			timeout_secs, decoder_pins[0], decoder_pins[1], decoder_pins[2], transmitted_tn])
-		threads.append(transmitted_thread)
-		transmitted_thread.start()
-	else:
-		trans_out = ['      ', '      ', '      ', '      ', '      ', '      ', ]
-
-	ref_out = []
-	if reflect_enabled:
-		reflected_thread = threading.Thread(target = get_direction_power_array, args = [cycle_start_time, ref_out, 'reflected', \
-			timeout_secs, decoder_pins[3], decoder_pins[4], decoder_pins[5], reflected_tn])
-		threads.append(reflected_thread)
-		reflected_thread.start()
-	else:
-		ref_out = ['      ', '      ', '      ', '      ', '      ', '      ', ]
+		return self.loop.run_until_complete(self.take_sample())
 
-	# check to see if both forward and reflected power threads are done
-	while len(threads) != 0:
-		for t in threads:
-			if not t.isAlive():
-				threads.remove(t)
+	async def take_sample(self):
 
-	# put each element into the output array
-	for element in trans_out:
-		output.append(element)
-		try:
-			power_watts = int(pow(10, float(element) / 10) / 1000)
-			data_file.write(str(power_watts).zfill(6) + ',')
-		except:
-			data_file.write('      ,')
+		cycle_start = time.monotonic()
+		cycle_start_time = datetime.now() - timedelta(hours = 4)
+		cur_time = str(cycle_start_time).split(' ')[1][0:12]
 
-	for element in ref_out:
-		output.append(element)
-		try:
-			power_watts = int(pow(10, float(element) / 10) / 1000)
-			data_file.write(str(power_watts).zfill(6) + ',')
-		except:
-			data_file.write('      ,')
+		# read the forward and reflected banks at the same time
+		trans_out, ref_out = await asyncio.gather( \
+			get_direction_power_array(cycle_start_time, self.trans_session), \
+			get_direction_power_array(cycle_start_time, self.ref_session))
 
-	# add the amount of time needed to complete the cycle
-	time_for_cycle = str(datetime.now() - timedelta(hours = 4) - cycle_start_time)[6:13]
-	print(str(datetime.now() - timedelta(hours = 4) - cycle_start_time)[6:13])
-	output.append(time_for_cycle)
-	data_file.write(time_for_cycle)
+		output = [cur_time] + trans_out + ref_out
 
-	return output
+		# add the amount of time needed to complete the cycle
+		time_for_cycle = "%.5f" % (time.monotonic() - cycle_start)
+		output.append(time_for_cycle)
 
-def monitor_power(timeout_secs, sample_time, decoder_pins, transmitted_tn, \
-			reflected_tn, trans_enabled, reflect_enabled):
+		return output
+
+async def get_PM_power_tn(session):
 	'''
-	Called by the monitor power button. Gets the power from each transmitter (and reflected)
-	and returns an array containing
-	[time started, Tx1, Tx2, ..., Tx6, Rx1, Rx2, ..., Rx6, time taken to sample power].
+	Sends the power request to the power meter over the session's Telnet socket and
+	waits for one complete reply. Returns the power in dBm as a float, or None if the
+	meter doesn't answer in time. Replies left over from earlier requests are dropped.
 	'''
 
-	cycle_start_time = datetime.now() - timedelta(hours = 4)
-	cur_time = str(cycle_start_time).split(' ')[1][0:12]
-
-	# get output array
-	output = []
-
-	output.append(cur_time)
+	loop = asyncio.get_event_loop()
 
-	# get forward and reflected power from individal threads
-	threads = []
+	# reconnect if the meter dropped the previous connection. While a failed meter is
+	# waiting to be retried, its channels time out straight away.
+	if session.sock is None:
+		if not session.can_reconnect() or not await session.open():
+			return None
 
-	trans_out = []
-	if trans_enabled:
-		transmitted_thread = threading.Thread(target = get_direction_power_array, args = [cycle_start_time, trans_out,'forward', \
-			timeout_secs, decoder_pins[0], decoder_pins[1], decoder_pins[2], transmitted_tn])
-		threads.append(transmitted_thread)
-		transmitted_thread.start()
-	else:
-		trans_out = ['      ', '      ', '      ', '      ', '      ', '      ', ]
-
-	ref_out = []
-	if reflect_enabled:
-		reflected_thread = threading.Thread(target = get_direction_power_array, args = [cycle_start_time, ref_out, 'reflected', \
-			timeout_secs, decoder_pins[3], decoder_pins[4], decoder_pins[5], reflected_tn])
-		threads.append(reflected_thread)
-		reflected_thread.start()
-	else:
-		ref_out = ['      ', '      ', '      ', '      ', '      ', '      ', ]
-
-	# check to see if both forward and reflected power threads are done
-	while len(threads) != 0:
-		for t in threads:
-			if not t.isAlive():
-				threads.remove(t)
+	try:
+		# anything received before this request was sent is not the answer to it
+		session.drain()
+		dropped = session.reader.drop_stale()
+		if dropped:
+			print("Dropped " + str(dropped) + " stale replies from the power meter with IP " + str(session.ip))
+
+		await loop.sock_sendall(session.sock, b':POWER?\n\r')
+
+		deadline = loop.time() + session.timeout_secs
+		while True:
+			reply = session.reader.pop_reply()
+			if reply is not None:
+				power = parse_power(reply)
+				if power is not None:
+					return power
+				# the tail of a partially dropped reply; keep waiting for ours
+				session.reader.stale_count += 1
+				continue
+
+			data = await asyncio.wait_for(loop.sock_recv(session.sock, 1024), deadline - loop.time())
+			if not data:
+				raise ConnectionResetError("power meter closed the connection")
+			session.reader.feed(data)
+
+	except asyncio.TimeoutError:
+		return None
+	except OSError:
+		session.close()
+		return None
+
+def record_power(engine, writer):
+	'''
+	Writes to a file located at ../data/[todaysdate].data through the DataWriter and returns
+	an array containing [time measurement started, Tx1, Tx2, ..., Tx6, Rx1, Rx2, ..., Rx6,
+	time taken to sample all 6].
+	'''
 
-	# put each element into the output array
-	for element in trans_out:
-		output.append(element)
-	for element in ref_out:
-		output.append(element)
+	cycle_start = time.monotonic()
+	cycle_start_time = datetime.now() - timedelta(hours = 4)
 
-	# add the amount of time needed to complete the cycle
-	time_for_cycle = str(datetime.now() - timedelta(hours = 4) - cycle_start_time)[6:13]
-	output.append(time_for_cycle)
+	output = engine.sample()
+	writer.write_sample(cycle_start_time, cycle_start, output)
 
 	return output
 
-def get_direction_power(cycle_start_time, transmitter, direction, timeout_secs, decoderBitA, decoderBitB, \
-	decoderBitC, tn):
+def monitor_power(engine):
 	'''
-	Takes in the number of the transmitter as an argument and returns the power at that transmitter.
-	Returns an array containing [forward power for transmitter, reflected power for transmitter] in dBm,
-	or if there is an error taking the reading, returns '      ' (6 spaces (for formatting)).
+	Called by the monitor power button. Gets the power from each transmitter (and reflected)
+	and returns an array containing
+	[time started, Tx1, Tx2, ..., Tx6, Rx1, Rx2, ..., Rx6, time taken to sample power].
 	'''
 
+	return engine.sample()
+
+async def get_direction_power(cycle_start_time, transmitter, session):
 	'''
-	Correction factors for each transmitter in dB.
-	First element is the transmitted power correction, second element is reflected power correction.
-	Each transmitted input has a 10 dB attenuator.
-	Reflected inputs 1, 2, and 3 have 8 dB attenuators, while 4, 5, and 6 have 5 dB attenuators.
+	Takes in the number of the transmitter as an argument and returns the power at that transmitter
+	in dBm for the session's direction, or if there is an error taking the reading,
+	returns '      ' (6 spaces (for formatting)).
 	'''
-	correction_dict = {1: [73, 61], 2: [73, 61], 3: [73, 61], 4: [73, 51.157], 5: [73, 61], 6: [73, 61]}
 
 	# set the HMC252 to the correct transmitter
-	set_switch(transmitter, decoderBitA, decoderBitB, decoderBitC)
-
-	# sleeping briefly reduces errors due to switches taking a while to switch
-	# time.sleep(.01)
+	set_switch(transmitter, session.decoder_pins[0], session.decoder_pins[1], session.decoder_pins[2])
 
 	# get the correction factor for the transmitter/direction
-	if direction == 'forward':
-		correction = correction_dict[transmitter][0]
+	if session.direction == 'forward':
+		correction = CORRECTION_DICT[transmitter][0]
 	else:
-		correction = correction_dict[transmitter][1]
+		correction = CORRECTION_DICT[transmitter][1]
 
-	# open the URL to the power meter whose HTML contains the power in dBm
-	#url = open_PM_URL(ip + '/:POWER?', timeout_secs, True)
-	output = get_PM_power_tn(tn, timeout_secs, True)
-	print(output)
+	# wait for the meter without holding up the other bank
+	power = await get_PM_power_tn(session)
 
 	'''
 	If the reading errored, '      ' is produced. This is due to consistency in formatting
 	with the recording file.
 	'''
+	if power is None:
+		return TIMEOUT_STR
 
-	# convert the HTML to a value in dBm
-	return str_To_dBm(output, correction)
+	return str(power + correction)
 
-def get_direction_power_array(cycle_start_time, output, direction, timeout_secs, decoderBitA, decoderBitB, \
-	decoderBitC, tn):
+async def get_direction_power_array(cycle_start_time, session):
 	'''
 	Returns an array containing the power in a single direction for each transmitter.
-	i.e., if direction == 'transmitted', returns [Tx1, Tx2, Tx3, Tx4, Tx5, Tx6].
+	i.e., if the session is 'forward', returns [Tx1, Tx2, Tx3, Tx4, Tx5, Tx6].
+	Disabled meters (no session) return an array of error strings.
 	'''
 
+	if session is None:
+		return [TIMEOUT_STR] * 6
+
+	output = []
 	for transmitter in range (1, 7):
-		output.append(get_direction_power(cycle_start_time, transmitter, direction, timeout_secs, \
-		  decoderBitA, decoderBitB, decoderBitC, tn))
+		output.append(await get_direction_power(cycle_start_time, transmitter, session))
+
+	return output
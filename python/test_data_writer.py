@@ -0,0 +1,63 @@
+#!usr/bin/env python3
+
+'''
+	File: test_data_writer.py
+	Description: Tests for data_writer.py. Run with:
+			python3 -m unittest test_data_writer
+	Author: Lucas McDonald
+	Date created: October 18, 2026
+	Date modified: October 18, 2026
+	Python version: 3.6.1
+'''
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+import data_writer
+import hf_loader
+
+def output_array(time_str, cycle_time):
+	'''
+	Returns an output array as take_data makes it, with every reading at 60 dBm (1000 W).
+	'''
+
+	return [time_str] + ['60.0'] * 12 + [cycle_time]
+
+class FormatRowTest(unittest.TestCase):
+
+	def test_row(self):
+		row = data_writer.format_row(['01:00:00.000'] + ['60.0'] * 11 + ['      ', '0.40000'])
+		self.assertEqual(row, '01:00:00.000,' + '001000,' * 11 + '      ,0.40000\n')
+
+	def test_slow_cycle(self):
+		# a cycle of 10 s or more keeps the same width as a fast one
+		fast = data_writer.format_row(output_array('01:00:00.000', '0.40000'))
+		for cycle_time in ['10.00000', '12.34567', '123.45678', '1234567.00000']:
+			slow = data_writer.format_row(output_array('01:00:00.000', cycle_time))
+			self.assertEqual(len(slow), len(fast))
+			self.assertAlmostEqual(float(slow.split(',')[-1]), min(float(cycle_time), 999999), places = 0)
+
+class DataWriterTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+
+	def test_slow_cycle_keeps_fixed_layout(self):
+		writer = data_writer.DataWriter(self.folder)
+		start = datetime(2017, 7, 15, 1, 0, 0)
+		for i, cycle_time in enumerate(['0.40000', '0.41000', '12.34567', '0.40000']):
+			writer.write_sample(start, time.monotonic(), output_array('01:00:%02d.000' % i, cycle_time))
+		writer.close()
+
+		day = hf_loader.load_day(os.path.join(self.folder, '20170715.data'))
+		self.assertIsNotNone(day)
+		self.assertIsNotNone(day.block)
+
+if __name__ == "__main__":
+	unittest.main()
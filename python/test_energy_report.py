@@ -0,0 +1,76 @@
+#!usr/bin/env python3
+
+'''
+	File: test_energy_report.py
+	Description: Tests for energy_report.py. Run with:
+			python3 -m unittest test_energy_report
+	Author: Lucas McDonald
+	Date created: October 18, 2026
+	Date modified: October 18, 2026
+	Python version: 3.6.1
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+import energy_report
+
+HEADER = "#HF transmitted power data for 2017-07-15\n" + \
+	"#HH:MM:SS.SSS, Tx1 , Rx1  , Tx2  , Rx2  , Tx3  , Rx3  , Tx4  , Rx4  , Tx5  , Rx5  , Tx6  , Rx6  , time to take sample\n\n"
+
+def data_row(seconds, tx1):
+	'''
+	Returns a row as take_data writes it, with Tx1 at tx1 watts (None for a timeout) and
+	every other channel at 0 W.
+	'''
+
+	time_str = "%02d:%02d:%06.3f" % (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+	fields = [time_str, "      " if tx1 is None else "%06d" % tx1] + ["000000"] * 11 + ["0.40000"]
+	return ",".join(fields) + "\n"
+
+class DayTotalsTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+
+	def write_day(self, rows):
+		data_path = os.path.join(self.folder, "20170715.data")
+		with open(data_path, 'w') as data_file:
+			data_file.write(HEADER + "".join(rows))
+		return data_path
+
+	def test_timeout_in_a_run(self):
+		# 1000 W for 10 s, with the meter timing out on the 5th row
+		powers = [1000] * 11
+		powers[4] = None
+		totals = energy_report.day_totals(self.write_day([data_row(3600 + i, p) for i, p in enumerate(powers)]))
+
+		self.assertAlmostEqual(totals.recorded_secs, 10)
+		self.assertAlmostEqual(totals.energy_kwh[0], 1000 * 10 / 3.6e6)
+		self.assertAlmostEqual(totals.on_secs[0], 10)
+
+	def test_timeout_after_a_gap(self):
+		# the reading before the gap isn't carried past it
+		rows = [data_row(3600 + i, 1000) for i in range(5)] + \
+			[data_row(7200, None)] + [data_row(7200 + i, 1000) for i in range(1, 5)]
+		totals = energy_report.day_totals(self.write_day(rows))
+
+		self.assertAlmostEqual(totals.recorded_secs, 8)
+		self.assertAlmostEqual(totals.energy_kwh[0], 1000 * 7 / 3.6e6)
+		self.assertAlmostEqual(totals.on_secs[0], 7)
+
+	def test_fill_timeouts(self):
+		nan = numpy.nan
+		values = numpy.array([[1.0, nan], [nan, 2.0], [nan, nan], [nan, 3.0], [4.0, nan]])
+		run_starts = numpy.array([True, False, False, True, False])
+		filled = energy_report.fill_timeouts(values, run_starts)
+
+		numpy.testing.assert_array_equal(filled, [[1.0, nan], [1.0, 2.0], [1.0, 2.0], [nan, 3.0], [4.0, 3.0]])
+
+if __name__ == "__main__":
+	unittest.main()